@@ -14,6 +14,10 @@ class KaliAIAssistant:
         """Process a generic query using the specified AI provider."""
         return await self.agent.process_query(query, provider)
 
+    def stream_query(self, query: str, context: dict, provider: str = None):
+        """Stream a generic query's answer as text deltas."""
+        return self.agent.stream_query(query, provider)
+
     async def translate_command(self, nl_command: str, provider: str = None) -> str:
         """Translate a natural language command to a shell command."""
         return await self.agent.translate_command(nl_command, provider)
@@ -0,0 +1,131 @@
+"""
+COMMAND CACHE - Single-Flight Command Result Cache
+Reuses results of idempotent reconnaissance commands the policy marks cacheable
+"""
+
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from utils.logger import setup_logger
+from .command_model import normalize_command
+
+logger = setup_logger(__name__)
+
+class CommandResultCache:
+    """Bounded TTL cache of successful command results
+
+    Keys are whitespace-normalized command lines; the TTL of each entry comes
+    from the policy verdict. Concurrent requests for the same command share
+    one execution: the first caller runs it and the others wait on its
+    result instead of spawning their own subprocess. If the first caller is
+    cancelled or its execution raises, a waiter runs the command instead.
+    A cached result that no longer passes the caller's ``is_valid`` check
+    (say, its spilled output has since been deleted) is dropped and the
+    command runs again.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, enabled: Optional[bool] = None):
+        self.max_entries = max_entries or int(os.getenv("COMMAND_CACHE_MAX_ENTRIES", "256"))
+        self.enabled = enabled if enabled is not None else os.getenv("COMMAND_CACHE_ENABLED", "true").lower() != "false"
+        self._entries: "OrderedDict[str, Tuple[float, float, Dict[str, Any]]]" = OrderedDict()  # key -> (stored, expires, result)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.counters = {"hits": 0, "shared": 0, "misses": 0, "stores": 0, "evictions": 0, "stale": 0}
+
+    async def run(self, command: str, ttl: float,
+                  execute: Callable[[], Awaitable[Dict[str, Any]]],
+                  is_valid: Optional[Callable[[Dict[str, Any]], bool]] = None) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Return ``(result, cache_info)`` for ``command``, executing it only if needed
+
+        ``cache_info`` has ``cache_hit`` and ``cache_age`` (seconds since the
+        reused result was produced, None for a fresh execution).
+        """
+        key = normalize_command(command)
+        while True:
+            cached = self._lookup(key)
+            if cached is not None and is_valid is not None and not is_valid(cached[1]):
+                del self._entries[key]
+                self.counters["stale"] += 1
+                cached = None
+            if cached is not None:
+                stored, result = cached
+                self.counters["hits"] += 1
+                return result, {'cache_hit': True, 'cache_age': time.time() - stored}
+
+            leader = self._inflight.get(key)
+            if leader is None:
+                break
+            try:
+                stored, result = await asyncio.shield(leader)
+            except asyncio.CancelledError:
+                if leader.cancelled():
+                    continue  # the running caller went away; try again ourselves
+                raise
+            except Exception:
+                continue
+            self.counters["shared"] += 1
+            return result, {'cache_hit': True, 'cache_age': time.time() - stored}
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        self.counters["misses"] += 1
+        try:
+            result = await execute()
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                future.cancel()
+            else:
+                future.set_exception(e)
+                future.exception()  # waiters retry; nobody else needs to see it
+            raise
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+        stored = time.time()
+        # Concurrent callers share even a failed run; only successes are kept
+        future.set_result((stored, result))
+        if result.get('success'):
+            self._store(key, stored, ttl, result)
+        return result, {'cache_hit': False, 'cache_age': None}
+
+    def _lookup(self, key: str) -> Optional[Tuple[float, Dict[str, Any]]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stored, expires, result = entry
+        if time.monotonic() >= expires:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return stored, result
+
+    def _store(self, key: str, stored: float, ttl: float, result: Dict[str, Any]):
+        self._entries[key] = (stored, time.monotonic() + ttl, result)
+        self._entries.move_to_end(key)
+        self.counters["stores"] += 1
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    def invalidate(self, command: Optional[str] = None):
+        """Drop one command's cached result, or everything"""
+        if command is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(normalize_command(command), None)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.counters["hits"] + self.counters["shared"] + self.counters["misses"]
+        return {
+            **self.counters,
+            "enabled": self.enabled,
+            "hit_rate": (self.counters["hits"] + self.counters["shared"]) / lookups if lookups else 0.0,
+            "size": len(self._entries),
+            "inflight": len(self._inflight),
+            "max_entries": self.max_entries
+        }
+
+# Process-wide cache shared by every command engine instance
+command_cache = CommandResultCache()
@@ -4,68 +4,49 @@ Advanced command processing with AI enhancement
 """
 
 import asyncio
+import codecs
 import subprocess
 import os
 import json
+import re
+import signal
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, List, Optional, AsyncGenerator
-import psutil
+from typing import Dict, List, Optional, AsyncGenerator, Tuple
 import logging
+from .command_cache import CommandResultCache, command_cache
+from .command_history import CommandHistoryStore, command_history
+from .command_model import CommandModel, command_model
+from .command_policy import CommandPolicy
+from .output_store import output_store
+from .process_accounting import (AccountedProcess, ResourceLimits, ResourceStats,
+                                 resource_limits, resource_stats, signal_name)
+from .process_sampler import process_sampler
+from .process_supervisor import AdmissionRejected, CommandPriority, process_supervisor
+from .shell_session import ShellSessionManager, shell_sessions
 
 logger = logging.getLogger(__name__)
 
+# Large outputs are analyzed here, one chunk after another, off the event loop
+_analysis_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="output-analyzer")
+
 class SecurityValidator:
     """Validates command security"""
     
-    DANGEROUS_COMMANDS = [
-        'rm -rf /', 'del /f /s /q', 'format', 'fdisk', 'dd if=', 'shutdown', 'reboot',
-        'powershell.exe', 'wget', 'curl', ':(){ :|: & };:','mkfs', 'curl | sh'
-    ]
-    
-    ALLOWED_SECURITY_TOOLS = [
-        'nmap', 'ncat', 'netstat', 'ss', 'ping', 'traceroute', 'dig', 'nslookup',
-        'sqlmap', 'dirb', 'gobuster', 'nikto', 'hydra', 'john', 'hashcat',
-        'metasploit', 'msfconsole', 'msfvenom', 'aircrack-ng', 'airodump-ng',
-        'burpsuite', 'zaproxy', 'wireshark', 'tshark', 'tcpdump'
-    ]
-    
-    def __init__(self):
+    def __init__(self, policy: Optional[CommandPolicy] = None):
+        self.policy = policy or CommandPolicy()
         self.command_history = []
     
     async def validate_command(self, command: str) -> Dict:
-        """Validate command for security risks"""
-        danger_level = 0
-        warnings = []
-        is_allowed = True
-        
-        # Check for dangerous commands
-        for dangerous in self.DANGEROUS_COMMANDS:
-            if dangerous in command.lower():
-                danger_level = 10
-                warnings.append(f"Dangerous command detected: {dangerous}")
-                is_allowed = False
-                break
-        
-        # Check if it's a security tool
-        command_parts = command.split()
-        if command_parts:
-            tool = command_parts[0]
-            if tool in self.ALLOWED_SECURITY_TOOLS:
-                danger_level = max(danger_level, 2)  # Security tools have minimal risk
-                warnings.append(f"Security tool: {tool}")
-            elif tool not in ['ls', 'cat', 'grep', 'ps', 'top', 'htop', 'history']:
-                danger_level = max(danger_level, 5)  # Unknown commands have medium risk
-                warnings.append(f"Unknown command: {tool}")
+        """Validate command for security risks
         
-        return {
-            'danger_level': danger_level,
-            'warnings': warnings,
-            'is_allowed': is_allowed,
-            'timestamp': datetime.now().isoformat()
-        }
+        Every segment of pipelines, lists, subshells and substitutions is
+        checked against the compiled command policy.
+        """
+        return self.policy.evaluate(command)
 
 class CommandPredictor:
-    """Predicts likely next commands based on context"""
+    """Predicts likely next commands from learned history, falling back to static patterns"""
     
     COMMAND_PATTERNS = {
         'nmap': ['nmap -sV', 'nmap -sC', 'nmap -A', 'nmap -p-'],
@@ -75,28 +56,105 @@ class CommandPredictor:
         'enumeration': ['enum4linux', 'smbclient', 'showmount']
     }
     
-    def __init__(self):
+    def __init__(self, model: Optional[CommandModel] = None):
+        self.model = model or command_model
         self.context_history = []
     
+    def learn(self, command: str):
+        """Update the model with an executed command"""
+        self.model.observe(command)
+        self.model.maybe_save()
+    
+    def complete(self, prefix: str, limit: int = 5) -> List[str]:
+        """Most used past commands starting with ``prefix``"""
+        return self.model.complete(prefix, limit)
+    
     async def predict_next_commands(self, current_command: str, context: Dict) -> List[str]:
-        """Predict likely next commands"""
-        predictions = []
+        """Predict likely next commands, best first"""
+        predictions = [command for command, _ in self.model.predict(current_command, limit=5)]
         
-        # Simple pattern matching
+        # Static patterns fill in while there is little history
         for pattern, commands in self.COMMAND_PATTERNS.items():
             if pattern in current_command.lower():
-                predictions.extend(commands[:3])  # Top 3 predictions
-        
-        # Remove duplicates and current command
-        predictions = list(set(predictions))
-        if current_command in predictions:
-            predictions.remove(current_command)
+                for command in commands[:3]:  # Top 3 predictions
+                    if command != current_command and command not in predictions:
+                        predictions.append(command)
         
         return predictions[:5]  # Return top 5 predictions
 
+class OutputAnalysis:
+    """Incremental analysis of one command's output
+    
+    Chunks are scanned line by line as they arrive, so a finding split across
+    two chunks is matched once its line is complete; a line longer than
+    ``MAX_LINE`` is cut at whitespace (or 512 characters before its end when
+    it has none) instead of being buffered forever.
+    Findings accumulate in running counters and ``finish()`` only has the
+    final partial line left to scan.
+    """
+    
+    MAX_LINE = 64 * 1024
+    MAX_VALUES = 256  # distinct values kept per pattern
+    
+    def __init__(self, analyzer: "OutputAnalyzer", command: str):
+        self.analyzer = analyzer
+        self.command = command
+        self.output_length = 0
+        self.counts = {name: 0 for name in analyzer.analysis_patterns}
+        self.values = {name: {} for name in analyzer.analysis_patterns}
+        self._carry = ''
+        self._pending: List[asyncio.Future] = []
+        self._offloaded = False
+    
+    def feed(self, text: str):
+        """Scan the complete lines in ``text``, keeping the trailing partial line"""
+        self.output_length += len(text)
+        buffer = self._carry + text
+        cut = buffer.rfind('\n') + 1
+        if len(buffer) - cut > self.MAX_LINE:
+            space = buffer.rfind(' ', cut, len(buffer) - 512)
+            cut = space + 1 if space != -1 else len(buffer) - 512
+        self._scan(buffer[:cut])
+        self._carry = buffer[cut:]
+    
+    async def feed_async(self, text: str):
+        """Feed a chunk, moving the work to the analyzer thread once output gets large"""
+        if not self._offloaded and self.output_length + len(text) <= self.analyzer.OFFLOAD_THRESHOLD:
+            self.feed(text)
+            return
+        # Once offloaded every chunk goes through the single worker, preserving order
+        self._offloaded = True
+        loop = asyncio.get_running_loop()
+        self._pending.append(loop.run_in_executor(_analysis_executor, self.feed, text))
+        if len(self._pending) > 8:
+            await self._pending.pop(0)
+    
+    def _scan(self, text: str):
+        for match in self.analyzer.pattern.finditer(text):
+            name = match.lastgroup
+            self.counts[name] += 1
+            values = self.values[name]
+            value = self.analyzer.normalize(name, match.group(name))
+            if value in values:
+                values[value] += 1
+            elif len(values) < self.MAX_VALUES:
+                values[value] = 1
+    
+    async def finish(self) -> Dict:
+        """Scan what is left and build the insights"""
+        if self._pending:
+            await asyncio.gather(*self._pending)
+            self._pending = []
+        if self._carry:
+            self._scan(self._carry)
+            self._carry = ''
+        return self.analyzer.build_insights(self)
+
 class OutputAnalyzer:
     """Analyzes command output for insights"""
     
+    OFFLOAD_THRESHOLD = 64 * 1024  # characters analyzed inline before moving to a thread
+    
     def __init__(self):
         self.analysis_patterns = {
             'open_ports': r'(\d+/tcp\s+open)',
@@ -104,32 +162,72 @@ class OutputAnalyzer:
             'credentials': r'(password|username|login)',
             'network_info': r'(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})'
         }
+        # One alternation, so each chunk is scanned once for every pattern
+        self.pattern = re.compile(
+            '|'.join(f'(?P<{name}>{pattern})' for name, pattern in self.analysis_patterns.items()),
+            re.IGNORECASE
+        )
+    
+    def start(self, command: str) -> OutputAnalysis:
+        """Begin analyzing a command whose output arrives in chunks"""
+        return OutputAnalysis(self, command)
     
     async def analyze_output(self, output: str, command: str) -> Dict:
         """Analyze command output for security insights"""
+        analysis = self.start(command)
+        await analysis.feed_async(output)
+        return await analysis.finish()
+    
+    @staticmethod
+    def normalize(name: str, value: str) -> str:
+        if name == 'open_ports':
+            return value.split()[0].lower()
+        if name == 'vulnerabilities':
+            return value.upper()
+        if name == 'credentials':
+            return value.lower()
+        return value
+    
+    def build_insights(self, analysis: OutputAnalysis) -> Dict:
+        counts = analysis.counts
+        values = analysis.values
         insights = {
             'findings': [],
             'recommendations': [],
             'risk_level': 'low',
+            'patterns': {
+                name: {'count': counts[name], 'values': list(values[name])}
+                for name in self.analysis_patterns if counts[name]
+            },
             'metadata': {
-                'command': command,
-                'output_length': len(output),
+                'command': analysis.command,
+                'output_length': analysis.output_length,
                 'timestamp': datetime.now().isoformat()
             }
         }
         
-        # Simple analysis - look for common patterns
-        if 'open' in output.lower() and 'port' in output.lower():
-            insights['findings'].append('Open ports detected')
+        if counts['open_ports']:
+            insights['findings'].append(f"Open ports detected: {', '.join(list(values['open_ports'])[:20])}")
             insights['recommendations'].append('Investigate open services')
             insights['risk_level'] = 'medium'
         
-        if 'vulnerable' in output.lower():
-            insights['findings'].append('Potential vulnerabilities found')
+        if counts['credentials']:
+            insights['findings'].append('Credential-related output found')
+            insights['recommendations'].append('Review output for exposed credentials')
+            insights['risk_level'] = 'medium'
+        
+        if counts['vulnerabilities']:
+            cves = [value for value in values['vulnerabilities'] if value.startswith('CVE-')]
+            insights['findings'].append(
+                f"Potential vulnerabilities found: {', '.join(cves[:20])}" if cves else 'Potential vulnerabilities found'
+            )
             insights['recommendations'].append('Perform detailed vulnerability assessment')
             insights['risk_level'] = 'high'
         
-        if len(output) > 10000:
+        if counts['network_info']:
+            insights['findings'].append(f"{len(values['network_info'])} distinct IP addresses in output")
+        
+        if analysis.output_length > 10000:
             insights['findings'].append('Large output detected')
             insights['recommendations'].append('Consider filtering output')
         
@@ -138,19 +236,35 @@ class OutputAnalyzer:
 class IntelligentCommandEngine:
     """AI-enhanced command processing engine"""
     
+    COMMAND_TIMEOUT = 30.0  # seconds
+    STREAM_CHUNK_SIZE = 64 * 1024  # max bytes per pipe read
+    
     def __init__(self):
         self.security_validator = SecurityValidator()
         self.command_predictor = CommandPredictor()
         self.output_analyzer = OutputAnalyzer()
+        self.supervisor = process_supervisor
+        self.process_sampler = process_sampler
+        self.result_cache: CommandResultCache = command_cache
+        self.shell_sessions: ShellSessionManager = shell_sessions
+        self.resource_limits: ResourceLimits = resource_limits
+        self.resource_stats: ResourceStats = resource_stats
+        self.output_store = output_store
         self.active_processes = {}
-        self.command_history = []
+        self.command_history: CommandHistoryStore = command_history
     
     def is_ready(self) -> bool:
         """Check if command engine is ready"""
         return True
     
-    async def process_command(self, command: str, context: Dict = None) -> Dict:
-        """Process command with AI enhancement"""
+    async def process_command(self, command: str, context: Dict = None,
+                              priority: CommandPriority = CommandPriority.INTERACTIVE,
+                              session_id: Optional[str] = None) -> Dict:
+        """Process command with AI enhancement
+        
+        With a ``session_id`` the command runs in that client's persistent
+        shell (see ``ShellSession``) instead of a fresh ``bash -c``.
+        """
         if context is None:
             context = {}
         
@@ -161,138 +275,487 @@ class IntelligentCommandEngine:
             security_check = await self.security_validator.validate_command(command)
             
             if not security_check['is_allowed']:
-                return {
-                    'success': False,
-                    'output': f"Command blocked for security: {', '.join(security_check['warnings'])}",
-                    'error': 'Security violation',
-                    'security_check': security_check,
-                    'predictions': [],
-                    'insights': {}
-                }
+                return self._blocked_result(security_check)
             
-            # Execute command
-            result = await self._execute_command_async(command)
+            # Execute command, or reuse a recent result of an idempotent lookup.
+            # Session commands depend on shell state (cwd, env) and are never reused.
+            cache_ttl = security_check.get('cache_ttl')
+            if cache_ttl and self.result_cache.enabled and session_id is None:
+                result, cache_info = await self.result_cache.run(
+                    command, cache_ttl, lambda: self._execute_command_async(command, priority),
+                    is_valid=self._output_available
+                )
+            else:
+                result = await self._execute_command_async(command, priority, session_id)
+                cache_info = {'cache_hit': False, 'cache_age': None}
             
-            # Predict next commands
-            predictions = await self.command_predictor.predict_next_commands(command, context)
+            final = await self._finalize_result(command, context, security_check, result, result['insights'],
+                                                from_cache=cache_info['cache_hit'])
+            final.update(cache_info)
+            return final
             
-            # Analyze output
-            insights = await self.output_analyzer.analyze_output(result['output'], command)
+        except Exception as e:
+            logger.error(f"Command processing error: {str(e)}")
+            return self._error_result(e)
+    
+    async def execute_command(self, command: str,
+                              priority: CommandPriority = CommandPriority.WORKFLOW) -> Dict:
+        """Process a command issued by automation (workflow steps) rather than a user"""
+        return await self.process_command(command, {'source': priority.value}, priority)
+    
+    async def process_command_stream(self, command: str, context: Dict = None,
+                                     priority: CommandPriority = CommandPriority.INTERACTIVE,
+                                     session_id: Optional[str] = None) -> AsyncGenerator[Dict, None]:
+        """Process command with AI enhancement, yielding output chunks as they arrive
+        
+        Yields a ``{'type': 'queued', ...}`` event if the command has to wait for
+        a process slot, ``{'type': 'chunk', ...}`` events while it runs and a single
+        ``{'type': 'result', 'result': {...}}`` event once it has exited. The final
+        result has the same shape as ``process_command`` but does not repeat the
+        streamed stdout/stderr text.
+        """
+        if context is None:
+            context = {}
+        
+        logger.info(f"Processing streamed command: {command}")
+        
+        try:
+            security_check = await self.security_validator.validate_command(command)
+            
+            if not security_check['is_allowed']:
+                yield {'type': 'result', 'result': self._blocked_result(security_check)}
+                return
             
-            # Store in history
-            self.command_history.append({
-                'command': command,
-                'timestamp': datetime.now().isoformat(),
-                'success': result['success'],
-                'context': context
-            })
+            capture = self.output_store.capture()
+            analysis = self.output_analyzer.start(command)
+            result = None
+            try:
+                async for event in self._execute_command_streaming(command, priority, session_id):
+                    if event['type'] == 'result':
+                        result = event['result']
+                        continue
+                    if event['type'] == 'chunk':
+                        capture.write(event['stream'], event['data'])
+                        if event['stream'] == 'stdout':
+                            await analysis.feed_async(event['data'])
+                    yield event
+            finally:
+                capture.close()
             
-            return {
-                'success': result['success'],
-                'output': result['output'],
-                'error': result.get('error', ''),
-                'security_check': security_check,
-                'predictions': predictions,
-                'insights': insights,
-                'execution_time': result.get('execution_time', 0)
-            }
+            final = await self._finalize_result(command, context, security_check, result, await analysis.finish())
+            final['output_handle'] = capture.describe()
+            final['streamed'] = True
+            final['chunk_count'] = result['chunk_count']
+            final['output_length'] = result['output_length']
+            final['error_length'] = result['error_length']
+            yield {'type': 'result', 'result': final}
             
         except Exception as e:
-            logger.error(f"Command processing error: {str(e)}")
-            return {
+            logger.error(f"Streamed command processing error: {str(e)}")
+            yield {'type': 'result', 'result': self._error_result(e)}
+    
+    async def _finalize_result(self, command: str, context: Dict, security_check: Dict, result: Dict, insights: Dict,
+                               from_cache: bool = False) -> Dict:
+        """Attach predictions and output insights to an execution result and record it in history"""
+        if result['success']:
+            self.command_predictor.learn(command)
+        
+        # Predict next commands
+        predictions = await self.command_predictor.predict_next_commands(command, context)
+        
+        tool = security_check['segments'][0] if security_check.get('segments') else None
+        if not from_cache:
+            # A cached result's usage was recorded when the command actually ran
+            self.resource_stats.record(tool, result.get('resources'), result.get('execution_time', 0), result.get('signal'))
+        
+        # Store in history
+        self.command_history.record(
+            command,
+            success=result['success'],
+            tool=tool,
+            context=context,
+            execution_time=result.get('execution_time', 0),
+            danger_level=security_check.get('danger_level')
+        )
+        
+        final = {
+            'success': result['success'],
+            'output': result.get('output', ''),
+            'error': result.get('error', ''),
+            'security_check': security_check,
+            'predictions': predictions,
+            'insights': insights,
+            'execution_time': result.get('execution_time', 0),
+            'admission': result.get('admission'),
+            'resources': result.get('resources'),
+            'output_handle': result.get('output_handle')
+        }
+        if result.get('signal'):
+            final['signal'] = result['signal']
+        if result.get('rejected'):
+            final['rejected'] = True
+        if result.get('session_id'):
+            final['session_id'] = result['session_id']
+        return final
+    
+    def _output_available(self, result: Dict) -> bool:
+        """Whether a cached result's spilled output (if any) can still be paged"""
+        handle = result.get('output_handle')
+        return handle is None or handle['handle'] in self.output_store
+    
+    def _blocked_result(self, security_check: Dict) -> Dict:
+        """Build the result returned for a command rejected by the security validator"""
+        return {
+            'success': False,
+            'output': f"Command blocked for security: {', '.join(security_check['warnings'])}",
+            'error': 'Security violation',
+            'security_check': security_check,
+            'predictions': [],
+            'insights': {}
+        }
+    
+    def _error_result(self, error: Exception) -> Dict:
+        """Build the result returned when command processing raises"""
+        return {
+            'success': False,
+            'output': '',
+            'error': str(error),
+            'security_check': {'danger_level': 0, 'warnings': [], 'is_allowed': True},
+            'predictions': [],
+            'insights': {}
+        }
+    
+    def _build_shell_command(self, command: str) -> List[str]:
+        """Wrap a command line in the platform shell"""
+        if os.name == 'nt':  # Windows
+            return ['cmd', '/c', command]
+        return ['bash', '-c', command]  # Linux/Unix
+    
+    async def _execute_command_async(self, command: str,
+                                     priority: CommandPriority = CommandPriority.INTERACTIVE,
+                                     session_id: Optional[str] = None) -> Dict:
+        """Execute command asynchronously, buffering its output
+        
+        Output beyond the output store's spill threshold goes to disk; the
+        result then holds only the first page of that stream and an
+        ``output_handle`` for fetching further line ranges. stdout is analyzed
+        chunk by chunk while the command runs, so ``insights`` covers all of it.
+        """
+        capture = self.output_store.capture()
+        analysis = self.output_analyzer.start(command)
+        result = None
+        
+        try:
+            async for event in self._execute_command_streaming(command, priority, session_id):
+                if event['type'] == 'chunk':
+                    capture.write(event['stream'], event['data'])
+                    if event['stream'] == 'stdout':
+                        await analysis.feed_async(event['data'])
+                elif event['type'] == 'result':
+                    result = event['result']
+        finally:
+            capture.close()
+        
+        output = capture.text('stdout')
+        error = capture.text('stderr')
+        
+        logger.info(f"Command result - return_code: {result['return_code']}, output_len: {result['output_length']}, error_len: {result['error_length']}")
+        
+        return {
+            'success': result['success'],
+            'output': output,
+            # Engine-level errors (timeouts, spawn failures) replace stderr
+            'error': result['error'] or error,
+            'return_code': result['return_code'],
+            'execution_time': result['execution_time'],
+            'admission': result.get('admission'),
+            'rejected': result.get('rejected', False),
+            'session_id': result.get('session_id'),
+            'resources': result.get('resources'),
+            'signal': result.get('signal'),
+            'output_handle': capture.describe(),
+            'insights': await analysis.finish()
+        }
+    
+    async def _execute_command_streaming(self, command: str,
+                                         priority: CommandPriority = CommandPriority.INTERACTIVE,
+                                         session_id: Optional[str] = None) -> AsyncGenerator[Dict, None]:
+        """Execute command once the process supervisor grants it a slot
+        
+        Emits a ``{'type': 'queued'}`` event (priority, queue depth) when the
+        command has to wait, then the events of ``_run_process_streaming``. The
+        final result carries an ``admission`` summary with the time spent
+        queued; a command refused by admission control gets a failed result
+        flagged ``rejected`` without ever being spawned.
+        """
+        try:
+            admission = self.supervisor.request(priority)
+        except AdmissionRejected as e:
+            logger.warning(f"Command rejected by admission control: {e}")
+            yield self._rejected_event(e, priority)
+            return
+        
+        try:
+            if not admission.granted:
+                yield {'type': 'queued', **admission.to_dict()}
+                try:
+                    await admission.wait()
+                except AdmissionRejected as e:
+                    logger.warning(f"Queued command rejected by admission control: {e}")
+                    yield self._rejected_event(e, priority, admission.wait_time)
+                    return
+            
+            if session_id is not None:
+                events = self._run_in_session(command, session_id)
+            else:
+                events = self._run_process_streaming(command)
+            try:
+                async for event in events:
+                    if event['type'] == 'result':
+                        event['result']['admission'] = admission.to_dict()
+                    yield event
+            finally:
+                await events.aclose()
+        finally:
+            admission.release()
+    
+    def _rejected_event(self, error: AdmissionRejected, priority: CommandPriority, wait_time: float = 0.0) -> Dict:
+        """Build the result event for a command refused a process slot"""
+        return {
+            'type': 'result',
+            'result': {
                 'success': False,
-                'output': '',
-                'error': str(e),
-                'security_check': {'danger_level': 0, 'warnings': [], 'is_allowed': True},
-                'predictions': [],
-                'insights': {}
+                'error': str(error),
+                'return_code': -1,
+                'execution_time': 0.0,
+                'chunk_count': 0,
+                'output_length': 0,
+                'error_length': 0,
+                'rejected': True,
+                'admission': {
+                    'priority': priority.value,
+                    'queue_depth': error.queue_depth,
+                    'queue_wait': wait_time
+                }
             }
+        }
     
-    async def _execute_command_async(self, command: str) -> Dict:
-        """Execute command asynchronously"""
+    async def _run_process_streaming(self, command: str) -> AsyncGenerator[Dict, None]:
+        """Spawn command, yielding decoded stdout/stderr chunks as soon as they are read
+        
+        Chunks carry a per-command ``sequence`` number. The last event is a
+        ``{'type': 'result'}`` summary with the return code and timing; if the
+        consumer stops iterating early the process is killed.
+        """
         start_time = datetime.now()
+        process = None
+        sequence = 0
+        output_length = 0
+        error_length = 0
         
         try:
-            # Handle Windows vs Linux commands
-            if os.name == 'nt':  # Windows
-                shell_cmd = ['cmd', '/c', command]
-            else:  # Linux/Unix
-                shell_cmd = ['bash', '-c', command]
-            
+            shell_cmd = self._build_shell_command(command)
             logger.info(f"Executing shell command: {shell_cmd}")
             
-            # Execute with timeout
-            process = await asyncio.create_subprocess_exec(
-                *shell_cmd,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
-                limit=1024*1024  # 1MB limit
-            )
+            if os.name == 'nt':
+                process = await asyncio.create_subprocess_exec(
+                    *shell_cmd,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE
+                )
+            else:
+                # Own process group under the resource limits, reaped with rusage
+                process = await AccountedProcess.spawn(command, self.resource_limits)
             
+            deadline = asyncio.get_running_loop().time() + self.COMMAND_TIMEOUT
+            timed_out = False
+            
+            streams = self._read_process_streams(process, deadline)
             try:
-                stdout, stderr = await asyncio.wait_for(
-                    process.communicate(), 
-                    timeout=30.0  # 30 second timeout
-                )
-                
-                execution_time = (datetime.now() - start_time).total_seconds()
-                
-                output = stdout.decode('utf-8', errors='ignore')
-                error = stderr.decode('utf-8', errors='ignore')
-                
-                logger.info(f"Command result - return_code: {process.returncode}, output_len: {len(output)}, error_len: {len(error)}")
-                
-                return {
-                    'success': process.returncode == 0,
-                    'output': output,
-                    'error': error,
-                    'return_code': process.returncode,
-                    'execution_time': execution_time
-                }
-                
+                async for stream_name, data in streams:
+                    sequence += 1
+                    if stream_name == 'stdout':
+                        output_length += len(data)
+                    else:
+                        error_length += len(data)
+                    yield {
+                        'type': 'chunk',
+                        'sequence': sequence,
+                        'stream': stream_name,
+                        'data': data
+                    }
+                await asyncio.wait_for(process.wait(), max(deadline - asyncio.get_running_loop().time(), 0))
             except asyncio.TimeoutError:
-                process.kill()
+                timed_out = True
+                self._kill_process(process)
                 await process.wait()
-                return {
+            finally:
+                await streams.aclose()
+            
+            execution_time = (datetime.now() - start_time).total_seconds()
+            
+            yield {
+                'type': 'result',
+                'result': {
+                    'success': not timed_out and process.returncode == 0,
+                    'error': f'Command timed out after {self.COMMAND_TIMEOUT:g} seconds' if timed_out else '',
+                    'return_code': -1 if timed_out else process.returncode,
+                    'execution_time': execution_time,
+                    'chunk_count': sequence,
+                    'output_length': output_length,
+                    'error_length': error_length,
+                    'resources': getattr(process, 'usage', None),
+                    'signal': None if timed_out else signal_name(process.returncode)
+                }
+            }
+            
+        except Exception as e:
+            execution_time = (datetime.now() - start_time).total_seconds()
+            yield {
+                'type': 'result',
+                'result': {
                     'success': False,
-                    'output': '',
-                    'error': 'Command timed out after 30 seconds',
+                    'error': str(e),
                     'return_code': -1,
-                    'execution_time': 30.0
+                    'execution_time': execution_time,
+                    'chunk_count': sequence,
+                    'output_length': output_length,
+                    'error_length': error_length
                 }
-                
+            }
+        finally:
+            # Consumer went away (cancelled or closed the generator) before exit
+            if process is not None and process.returncode is None:
+                self._kill_process(process)
+                await process.wait()
+    
+    async def _run_in_session(self, command: str, session_id: str) -> AsyncGenerator[Dict, None]:
+        """Run command in the client's persistent shell, with the events of ``_run_process_streaming``
+        
+        The PTY merges stderr into stdout, so every chunk is reported as stdout.
+        """
+        start_time = datetime.now()
+        sequence = 0
+        output_length = 0
+        return_code = -1
+        error = ''
+        
+        try:
+            session = await self.shell_sessions.acquire(session_id)
+            async with session.lock:
+                try:
+                    async for kind, value in session.run(command, self.COMMAND_TIMEOUT):
+                        if kind == 'exit':
+                            return_code = value
+                            continue
+                        sequence += 1
+                        output_length += len(value)
+                        yield {
+                            'type': 'chunk',
+                            'sequence': sequence,
+                            'stream': 'stdout',
+                            'data': value
+                        }
+                except asyncio.TimeoutError:
+                    error = f'Command timed out after {self.COMMAND_TIMEOUT:g} seconds'
         except Exception as e:
-            execution_time = (datetime.now() - start_time).total_seconds()
-            return {
-                'success': False,
-                'output': '',
-                'error': str(e),
-                'return_code': -1,
-                'execution_time': execution_time
+            error = str(e) or type(e).__name__
+        
+        yield {
+            'type': 'result',
+            'result': {
+                'success': not error and return_code == 0,
+                'error': error,
+                'return_code': return_code,
+                'execution_time': (datetime.now() - start_time).total_seconds(),
+                'chunk_count': sequence,
+                'output_length': output_length,
+                'error_length': 0,
+                'session_id': session_id
             }
+        }
     
-    async def get_command_history(self, limit: int = 100) -> List[Dict]:
-        """Get command history"""
-        return self.command_history[-limit:]
+    async def reset_session(self, session_id: str) -> Dict:
+        """Replace a client's persistent shell with a fresh one"""
+        return await self.shell_sessions.reset(session_id)
+    
+    async def close_session(self, session_id: str):
+        await self.shell_sessions.close(session_id)
+    
+    def _kill_process(self, process):
+        """Kill a spawned command together with any children it started"""
+        if process.returncode is not None:
+            return
+        try:
+            if os.name == 'nt':
+                process.kill()
+            else:
+                os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
     
-    async def get_active_processes(self) -> List[Dict]:
-        """Get list of active processes"""
-        processes = []
-        for proc in psutil.process_iter(['pid', 'name', 'cpu_percent', 'memory_percent']):
+    async def _read_process_streams(self, process, deadline: float) -> AsyncGenerator[Tuple[str, str], None]:
+        """Read stdout and stderr concurrently, yielding ``(stream_name, text)`` pairs
+        
+        Raises ``asyncio.TimeoutError`` once the loop time passes ``deadline``.
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        
+        async def pump(stream_name: str, stream: asyncio.StreamReader):
+            # Incremental decoding keeps multi-byte characters split across reads intact
+            decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
             try:
-                proc_info = proc.info
-                proc_info['cpu_percent'] = proc.cpu_percent()
-                processes.append(proc_info)
-            except (psutil.NoSuchProcess, psutil.AccessDenied):
-                pass
+                while True:
+                    data = await stream.read(self.STREAM_CHUNK_SIZE)
+                    if not data:
+                        tail = decoder.decode(b'', final=True)
+                        if tail:
+                            await queue.put((stream_name, tail))
+                        break
+                    text = decoder.decode(data)
+                    if text:
+                        await queue.put((stream_name, text))
+            finally:
+                await queue.put((stream_name, None))
+        
+        readers = [
+            asyncio.create_task(pump('stdout', process.stdout)),
+            asyncio.create_task(pump('stderr', process.stderr))
+        ]
+        open_streams = len(readers)
+        loop = asyncio.get_running_loop()
         
-        return sorted(processes, key=lambda x: x['cpu_percent'], reverse=True)[:20]
+        try:
+            while open_streams:
+                stream_name, text = await asyncio.wait_for(queue.get(), max(deadline - loop.time(), 0))
+                if text is None:
+                    open_streams -= 1
+                    continue
+                yield stream_name, text
+        finally:
+            for reader in readers:
+                reader.cancel()
+    
+    async def get_command_history(self, limit: int = 100) -> List[Dict]:
+        """Get the most recent commands, oldest first"""
+        return self.command_history.recent(limit)
+    
+    async def query_command_history(self, **filters) -> Dict:
+        """Filtered, cursor-paginated history; see CommandHistoryStore.query"""
+        return await self.command_history.query(**filters)
+    
+    async def get_active_processes(self, limit: int = 20) -> List[Dict]:
+        """Get the busiest processes from the background sampler's cached snapshot"""
+        if not self.process_sampler.running:
+            self.process_sampler.start()
+            # First real CPU deltas need two ticks; wait for them off the event loop
+            await asyncio.get_running_loop().run_in_executor(None, self.process_sampler.wait_ready, 5.0)
+        return self.process_sampler.snapshot(limit)
+    
+    async def refresh_processes(self, pids: List[int]) -> List[Dict]:
+        """Re-sample specific processes without rescanning the process table"""
+        return await asyncio.get_running_loop().run_in_executor(None, self.process_sampler.refresh, pids)
     
     async def kill_process(self, pid: int) -> bool:
         """Kill a process by PID"""
-        try:
-            process = psutil.Process(pid)
-            process.terminate()
-            return True
-        except (psutil.NoSuchProcess, psutil.AccessDenied):
-            return False
+        return self.process_sampler.kill(pid)
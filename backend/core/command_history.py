@@ -0,0 +1,257 @@
+"""
+COMMAND HISTORY - Bounded Persistent Command History
+In-memory ring buffer of recent commands backed by an indexed SQLite WAL table
+"""
+
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Union
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+class CommandHistoryStore:
+    """Executed-command log
+
+    The newest ``memory_entries`` records stay in a ring buffer for cheap
+    "recent history" reads. Every record is also appended to a SQLite table
+    (WAL mode, indexed on timestamp, tool and success) in small batches on
+    a worker thread; filtered queries and older pages are served from there.
+    Records get increasing ids, which double as pagination cursors.
+    """
+
+    MAX_CONTEXT_BYTES = 2048
+    FLUSH_DELAY = 0.5  # seconds records may wait before being written
+
+    def __init__(self,
+                 path: Optional[str] = None,
+                 memory_entries: Optional[int] = None,
+                 max_rows: Optional[int] = None):
+        self.path = path or os.getenv("COMMAND_HISTORY_PATH", os.path.join("cache", "command_history.db"))
+        self.memory_entries = memory_entries or int(os.getenv("COMMAND_HISTORY_MEMORY_ENTRIES", "1000"))
+        self.max_rows = max_rows or int(os.getenv("COMMAND_HISTORY_MAX_ROWS", "1000000"))
+        self.recent_entries: deque = deque(maxlen=self.memory_entries)
+        self._pending: List[Dict[str, Any]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._flush_task: Optional[asyncio.Future] = None
+        self._db_lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._next_id = 1
+        self._opened = False
+
+    def _open(self):
+        """Open the store and reload the newest records into the ring buffer"""
+        self._opened = True
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.row_factory = sqlite3.Row
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS history ("
+                "id INTEGER PRIMARY KEY, command TEXT NOT NULL, tool TEXT, success INTEGER NOT NULL, "
+                "timestamp REAL NOT NULL, execution_time REAL, danger_level INTEGER, context TEXT)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS history_timestamp ON history (timestamp)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS history_tool ON history (tool, id)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS history_success ON history (success, id)")
+            self._db.commit()
+            rows = self._db.execute("SELECT * FROM history ORDER BY id DESC LIMIT ?", (self.memory_entries,)).fetchall()
+            for row in reversed(rows):
+                self.recent_entries.append(self._row_to_entry(row))
+            if rows:
+                self._next_id = rows[0]["id"] + 1
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f"Command history store unavailable, keeping memory only: {e}")
+            self._db = None
+
+    def record(self, command: str, success: bool, tool: Optional[str] = None,
+               context: Optional[Dict] = None, execution_time: float = 0.0,
+               danger_level: Optional[int] = None) -> Dict[str, Any]:
+        """Append a command to the history"""
+        if not self._opened:
+            self._open()
+        entry = {
+            'id': self._next_id,
+            'command': command,
+            'tool': tool or (os.path.basename(command.split()[0]) if command.split() else None),
+            'success': success,
+            'timestamp': time.time(),
+            'execution_time': execution_time,
+            'danger_level': danger_level,
+            'context': self._compact_context(context or {})
+        }
+        self._next_id += 1
+        self.recent_entries.append(entry)
+        if self._db is not None:
+            self._pending.append(entry)
+            self._schedule_flush()
+        return self._public(entry)
+
+    def _compact_context(self, context: Dict) -> Dict:
+        """Keep small contexts as-is; large ones are reduced to their keys"""
+        try:
+            encoded = json.dumps(context, default=str)
+        except (TypeError, ValueError):
+            return {'keys': sorted(map(str, context))}
+        if len(encoded) <= self.MAX_CONTEXT_BYTES:
+            return json.loads(encoded)
+        return {'truncated': True, 'keys': sorted(map(str, context))}
+
+    def _schedule_flush(self):
+        if self._flush_handle is None:
+            loop = asyncio.get_running_loop()
+            self._flush_handle = loop.call_later(self.FLUSH_DELAY, lambda: asyncio.ensure_future(self.flush()))
+
+    async def flush(self):
+        """Write pending records now"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        # Writes are serialized so ids reach the table in order
+        while self._flush_task is not None and not self._flush_task.done():
+            await asyncio.shield(self._flush_task)
+        if not self._pending or self._db is None:
+            return
+        batch, self._pending = self._pending, []
+        self._flush_task = asyncio.get_running_loop().run_in_executor(None, self._write, batch)
+        await asyncio.shield(self._flush_task)
+
+    def _write(self, batch: List[Dict[str, Any]]):
+        with self._db_lock:
+            try:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO history (id, command, tool, success, timestamp, execution_time, danger_level, context) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    [(entry['id'], entry['command'], entry['tool'], int(entry['success']), entry['timestamp'],
+                      entry['execution_time'], entry['danger_level'], json.dumps(entry['context']))
+                     for entry in batch]
+                )
+                # Trim the oldest rows beyond the retention bound
+                self._db.execute("DELETE FROM history WHERE id <= ?", (batch[-1]['id'] - self.max_rows,))
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"Command history write failed: {e}")
+
+    def recent(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """The newest ``limit`` records in chronological order, from memory"""
+        if not self._opened:
+            self._open()
+        limit = max(0, min(limit, len(self.recent_entries)))
+        return [self._public(entry) for entry in list(self.recent_entries)[len(self.recent_entries) - limit:]]
+
+    async def query(self,
+                    limit: int = 50,
+                    cursor: Optional[int] = None,
+                    tool: Optional[str] = None,
+                    success: Optional[bool] = None,
+                    since: Union[str, float, None] = None,
+                    until: Union[str, float, None] = None,
+                    search: Optional[str] = None) -> Dict[str, Any]:
+        """Filtered history, newest first
+
+        ``cursor`` is the ``next_cursor`` of the previous page; a page with no
+        ``next_cursor`` is the last one.
+        """
+        if not self._opened:
+            self._open()
+        limit = max(1, min(int(limit), 500))
+        clauses, params = [], []
+        if cursor is not None:
+            clauses.append("id < ?")
+            params.append(int(cursor))
+        if tool:
+            clauses.append("tool = ?")
+            params.append(tool)
+        if success is not None:
+            clauses.append("success = ?")
+            params.append(int(success))
+        if since is not None:
+            clauses.append("timestamp >= ?")
+            params.append(self._to_epoch(since))
+        if until is not None:
+            clauses.append("timestamp <= ?")
+            params.append(self._to_epoch(until))
+        if search:
+            clauses.append("instr(command, ?) > 0")
+            params.append(search)
+
+        if self._db is None:
+            entries = self._query_memory(limit + 1, cursor, tool, success, since, until, search)
+        else:
+            await self.flush()
+            sql = "SELECT * FROM history"
+            if clauses:
+                sql += " WHERE " + " AND ".join(clauses)
+            sql += " ORDER BY id DESC LIMIT ?"
+            entries = await asyncio.get_running_loop().run_in_executor(None, self._select, sql, params + [limit + 1])
+
+        next_cursor = entries[limit - 1]['id'] if len(entries) > limit else None
+        return {
+            'entries': [self._public(entry) for entry in entries[:limit]],
+            'next_cursor': next_cursor
+        }
+
+    def _select(self, sql: str, params: List) -> List[Dict[str, Any]]:
+        with self._db_lock:
+            return [self._row_to_entry(row) for row in self._db.execute(sql, params).fetchall()]
+
+    def _query_memory(self, limit, cursor, tool, success, since, until, search) -> List[Dict[str, Any]]:
+        since = self._to_epoch(since) if since is not None else None
+        until = self._to_epoch(until) if until is not None else None
+        matches = []
+        for entry in reversed(self.recent_entries):
+            if ((cursor is None or entry['id'] < int(cursor)) and
+                    (not tool or entry['tool'] == tool) and
+                    (success is None or entry['success'] == success) and
+                    (since is None or entry['timestamp'] >= since) and
+                    (until is None or entry['timestamp'] <= until) and
+                    (not search or search in entry['command'])):
+                matches.append(entry)
+                if len(matches) >= limit:
+                    break
+        return matches
+
+    @staticmethod
+    def _to_epoch(value: Union[str, float]) -> float:
+        """Accept epoch seconds or an ISO-8601 timestamp"""
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return datetime.fromisoformat(str(value)).timestamp()
+
+    @staticmethod
+    def _row_to_entry(row: sqlite3.Row) -> Dict[str, Any]:
+        return {
+            'id': row['id'],
+            'command': row['command'],
+            'tool': row['tool'],
+            'success': bool(row['success']),
+            'timestamp': row['timestamp'],
+            'execution_time': row['execution_time'],
+            'danger_level': row['danger_level'],
+            'context': json.loads(row['context']) if row['context'] else {}
+        }
+
+    @staticmethod
+    def _public(entry: Dict[str, Any]) -> Dict[str, Any]:
+        return {**entry, 'timestamp': datetime.fromtimestamp(entry['timestamp']).isoformat()}
+
+    async def close(self):
+        await self.flush()
+        if self._db is not None:
+            with self._db_lock:
+                self._db.close()
+            self._db = None
+
+# Process-wide history shared by every command engine instance
+command_history = CommandHistoryStore()
@@ -0,0 +1,316 @@
+"""
+COMMAND MODEL - Online Command Prediction Model
+Prefix trie completion and n-gram next-command ranking learned from history
+"""
+
+import asyncio
+import json
+import os
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+_IP = re.compile(r"\b\d{1,3}(?:\.\d{1,3}){3}(?:/\d{1,2})?\b")
+_URL = re.compile(r"\bhttps?://\S+")
+
+def normalize_command(command: str) -> str:
+    return " ".join(command.split())
+
+def command_template(command: str) -> Tuple[str, Dict[str, str]]:
+    """Replace targets with slots so ``nmap 10.0.0.1`` and ``nmap 10.0.0.2`` share statistics"""
+    slots: Dict[str, str] = {}
+
+    def slot(name: str):
+        def replace(match):
+            slots.setdefault(name, match.group(0))
+            return "{" + name + "}"
+        return replace
+
+    template = _URL.sub(slot("url"), command)
+    template = _IP.sub(slot("ip"), template)
+    return template, slots
+
+class TrieNode:
+    __slots__ = ("children", "top")
+
+    def __init__(self):
+        self.children: Dict[str, Tuple[str, "TrieNode"]] = {}  # first char -> (edge label, child)
+        self.top: List[List] = []  # [count, command], most frequent first
+
+class PrefixTrie:
+    """Radix trie of commands where every node caches its ``top_k`` most frequent completions
+
+    A completion lookup walks at most ``len(prefix)`` characters and returns
+    the cached list, independent of how many commands are stored.
+    """
+
+    def __init__(self, top_k: int = 8):
+        self.top_k = top_k
+        self.root = TrieNode()
+
+    def add(self, command: str, count: int):
+        """Record that ``command`` now has ``count`` total uses"""
+        node = self.root
+        self._update_top(node, command, count)
+        rest = command
+        while rest:
+            edge = node.children.get(rest[0])
+            if edge is None:
+                leaf = TrieNode()
+                node.children[rest[0]] = (rest, leaf)
+                self._update_top(leaf, command, count)
+                return
+            label, child = edge
+            common = self._common_prefix(label, rest)
+            if common < len(label):
+                # Split the edge; the new node covers exactly the child's commands
+                middle = TrieNode()
+                middle.top = [list(entry) for entry in child.top]
+                middle.children[label[common]] = (label[common:], child)
+                node.children[rest[0]] = (label[:common], middle)
+                child = middle
+            node = child
+            rest = rest[common:]
+            self._update_top(node, command, count)
+
+    def complete(self, prefix: str, limit: int) -> List[Tuple[str, int]]:
+        node = self.root
+        rest = prefix
+        while rest:
+            edge = node.children.get(rest[0])
+            if edge is None:
+                return []
+            label, child = edge
+            common = self._common_prefix(label, rest)
+            if common < len(rest) and common < len(label):
+                return []
+            node = child
+            rest = rest[common:]
+        return [(command, count) for count, command in node.top[:limit]]
+
+    def _update_top(self, node: TrieNode, command: str, count: int):
+        top = node.top
+        for entry in top:
+            if entry[1] == command:
+                entry[0] = count
+                break
+        else:
+            if len(top) >= self.top_k and top[-1][0] >= count:
+                return
+            top.append([count, command])
+        top.sort(key=lambda entry: -entry[0])
+        del top[self.top_k:]
+
+    @staticmethod
+    def _common_prefix(a: str, b: str) -> int:
+        length = min(len(a), len(b))
+        index = 0
+        while index < length and a[index] == b[index]:
+            index += 1
+        return index
+
+class CommandModel:
+    """Learns from executed commands online
+
+    * ``command_counts`` feeds a :class:`PrefixTrie` for prefix completion.
+    * Commands are reduced to templates (IPs and URLs become ``{ip}``/``{url}``)
+      and bigram/trigram tables count which template follows which. Each
+      table row keeps at most ``row_limit`` successors, evicting the rarest,
+      so ranking one row is constant time however long the history gets.
+    * The model is snapshotted to ``path`` as JSON and reloaded on start.
+    """
+
+    def __init__(self,
+                 path: Optional[str] = None,
+                 max_commands: Optional[int] = None,
+                 row_limit: int = 32,
+                 save_interval: Optional[float] = None):
+        self.path = path or os.getenv("PREDICTOR_MODEL_PATH", os.path.join("cache", "command_model.json"))
+        self.max_commands = max_commands or int(os.getenv("PREDICTOR_MAX_COMMANDS", "50000"))
+        self.save_interval = save_interval if save_interval is not None else float(os.getenv("PREDICTOR_SAVE_INTERVAL", "30"))
+        self.row_limit = row_limit
+
+        self.command_counts: Dict[str, int] = {}
+        self.template_examples: Dict[str, str] = {}  # template -> last concrete command
+        self.bigrams: Dict[str, Dict[str, int]] = {}
+        self.trigrams: Dict[str, Dict[str, int]] = {}  # "prev2\x1fprev1" -> successors
+        self.recent: List[str] = []  # last two templates
+        self.last_slots: Dict[str, str] = {}
+        self.observations = 0
+
+        self.trie = PrefixTrie()
+        self._dirty = False
+        self._last_save = time.monotonic()
+        self._save_task: Optional[asyncio.Future] = None
+        self.load()
+
+    def observe(self, command: str):
+        """Learn from one executed command"""
+        command = normalize_command(command)
+        if not command:
+            return
+        template, slots = command_template(command)
+
+        count = self.command_counts.get(command, 0) + 1
+        self.command_counts[command] = count
+        self.trie.add(command, count)
+        self.template_examples[template] = command
+        self.last_slots.update(slots)
+
+        if self.recent:
+            self._bump(self.bigrams, self.recent[-1], template)
+        if len(self.recent) == 2:
+            self._bump(self.trigrams, "\x1f".join(self.recent), template)
+        self.recent = (self.recent + [template])[-2:]
+
+        self.observations += 1
+        self._dirty = True
+        if len(self.command_counts) > self.max_commands:
+            self._prune()
+
+    def _bump(self, table: Dict[str, Dict[str, int]], context: str, successor: str):
+        row = table.setdefault(context, {})
+        if successor in row:
+            row[successor] += 1
+        elif len(row) < self.row_limit:
+            row[successor] = 1
+        else:
+            # Space-saving replacement: the newcomer inherits the evicted count
+            rarest = min(row, key=row.get)
+            row[successor] = row.pop(rarest) + 1
+
+    def _prune(self):
+        """Keep the most used half of the commands and rebuild the trie
+
+        Dropping down to half the cap keeps the rebuild cost amortized over
+        the next ``max_commands / 2`` new commands.
+        """
+        keep = sorted(self.command_counts.items(), key=lambda item: -item[1])[:self.max_commands // 2]
+        self.command_counts = dict(keep)
+        self._rebuild_trie()
+
+    def _rebuild_trie(self):
+        self.trie = PrefixTrie()
+        # Most used first, so each node's top list fills once and later inserts skip it
+        for command, count in sorted(self.command_counts.items(), key=lambda item: -item[1]):
+            self.trie.add(command, count)
+
+    def complete(self, prefix: str, limit: int = 5) -> List[str]:
+        """Most used commands starting with ``prefix``"""
+        normalized = normalize_command(prefix)
+        if normalized and prefix[-1:].isspace():
+            normalized += " "  # "nmap " should not complete to "nmapx"
+        return [command for command, _ in self.trie.complete(normalized, limit)]
+
+    def predict(self, current_command: str, limit: int = 5) -> List[Tuple[str, float]]:
+        """Rank likely next commands after ``current_command`` with interpolated trigram/bigram scores"""
+        current = normalize_command(current_command)
+        template, slots = command_template(current)
+        history = self.recent if self.recent[-1:] == [template] else (self.recent + [template])[-2:]
+        trigram_row = self.trigrams.get("\x1f".join(history)) if len(history) == 2 else None
+
+        scores: Dict[str, float] = {}
+        for weight, row in ((2.0, trigram_row), (1.0, self.bigrams.get(template))):
+            if row:
+                total = sum(row.values())
+                for successor, count in row.items():
+                    scores[successor] = scores.get(successor, 0.0) + weight * count / total
+
+        ranked = sorted(scores.items(), key=lambda item: -item[1])
+        predictions = []
+        for successor, score in ranked:
+            command = self.render(successor, slots)
+            if command != current and all(command != existing for existing, _ in predictions):
+                predictions.append((command, score))
+            if len(predictions) >= limit:
+                break
+        return predictions
+
+    def render(self, template: str, slots: Dict[str, str]) -> str:
+        """Fill a template's slots from the current command, then from recent history"""
+        if "{" not in template:
+            return template
+        filled = template
+        for name in ("ip", "url"):
+            placeholder = "{" + name + "}"
+            if placeholder in filled:
+                value = slots.get(name) or self.last_slots.get(name)
+                if value is None:
+                    return self.template_examples.get(template, template)
+                filled = filled.replace(placeholder, value)
+        return filled
+
+    def to_dict(self) -> Dict:
+        return {
+            "version": 1,
+            "command_counts": dict(self.command_counts),
+            "template_examples": dict(self.template_examples),
+            "bigrams": {context: dict(row) for context, row in self.bigrams.items()},
+            "trigrams": {context: dict(row) for context, row in self.trigrams.items()},
+            "recent": list(self.recent),
+            "last_slots": dict(self.last_slots),
+            "observations": self.observations
+        }
+
+    def load(self):
+        try:
+            with open(self.path) as model_file:
+                data = json.load(model_file)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not load command model from {self.path}: {e}")
+            return
+        self.command_counts = data.get("command_counts", {})
+        self.template_examples = data.get("template_examples", {})
+        self.bigrams = data.get("bigrams", {})
+        self.trigrams = data.get("trigrams", {})
+        self.recent = data.get("recent", [])
+        self.last_slots = data.get("last_slots", {})
+        self.observations = data.get("observations", 0)
+        self._rebuild_trie()
+        logger.info(f"Loaded command model: {len(self.command_counts)} commands, {self.observations} observations")
+
+    def save(self, snapshot: Optional[Dict] = None):
+        """Write the model atomically (replace a temp file)"""
+        snapshot = snapshot if snapshot is not None else self.to_dict()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w") as model_file:
+            json.dump(snapshot, model_file, separators=(",", ":"))
+        os.replace(temp_path, self.path)
+
+    def maybe_save(self):
+        """Snapshot in the background if the model changed and the save interval passed"""
+        if not self._dirty or time.monotonic() - self._last_save < self.save_interval:
+            return
+        if self._save_task is not None and not self._save_task.done():
+            return
+        self._dirty = False
+        self._last_save = time.monotonic()
+        # Copy on the loop thread, serialize and write on a worker thread
+        snapshot = self.to_dict()
+        self._save_task = asyncio.get_running_loop().run_in_executor(None, self.save, snapshot)
+        self._save_task.add_done_callback(self._log_save_error)
+
+    @staticmethod
+    def _log_save_error(task: asyncio.Future):
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"Could not save command model: {task.exception()}")
+
+    async def flush(self):
+        """Save pending changes now (application shutdown)"""
+        if self._save_task is not None:
+            await asyncio.gather(self._save_task, return_exceptions=True)
+        if self._dirty:
+            self._dirty = False
+            snapshot = self.to_dict()
+            await asyncio.get_running_loop().run_in_executor(None, self.save, snapshot)
+
+# Process-wide model shared by every command engine instance
+command_model = CommandModel()
@@ -0,0 +1,452 @@
+"""
+COMMAND POLICY - Compiled Command Security Policy
+Shell-aware command splitting and single-pass rule matching with a verdict cache
+"""
+
+import hashlib
+import json
+import os
+import re
+import shlex
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+ALLOWED_SECURITY_TOOLS = frozenset([
+    'nmap', 'ncat', 'netstat', 'ss', 'ping', 'traceroute', 'dig', 'nslookup',
+    'sqlmap', 'dirb', 'gobuster', 'nikto', 'hydra', 'john', 'hashcat',
+    'metasploit', 'msfconsole', 'msfvenom', 'aircrack-ng', 'airodump-ng',
+    'burpsuite', 'zaproxy', 'wireshark', 'tshark', 'tcpdump'
+])
+
+SAFE_COMMANDS = frozenset(['ls', 'cat', 'grep', 'ps', 'top', 'htop', 'history'])
+
+# Words that run the command after them (with their own options first)
+COMMAND_WRAPPERS = frozenset([
+    'sudo', 'doas', 'env', 'nohup', 'time', 'nice', 'ionice', 'exec', 'command',
+    'builtin', 'stdbuf', 'xargs', 'timeout', 'watch'
+])
+
+# Wrapper options that take the next word as their argument. Options not
+# listed take none; an argument attached to the option (``-n10``,
+# ``--user=root``) needs no entry.
+WRAPPER_OPTION_ARGUMENTS = {
+    'sudo': frozenset(['-u', '-g', '-C', '-D', '-h', '-p', '-r', '-t', '-U', '-T',
+                       '--user', '--group', '--close-from', '--chdir', '--host', '--prompt',
+                       '--role', '--type', '--other-user', '--command-timeout']),
+    'doas': frozenset(['-u', '-C']),
+    'env': frozenset(['-u', '-C', '-S', '--unset', '--chdir', '--split-string']),
+    'nice': frozenset(['-n', '--adjustment']),
+    'ionice': frozenset(['-c', '-n', '-p', '-P', '-u', '--class', '--classdata', '--pid', '--pgid', '--uid']),
+    'stdbuf': frozenset(['-i', '-o', '-e', '--input', '--output', '--error']),
+    'timeout': frozenset(['-s', '-k', '--signal', '--kill-after']),
+    'xargs': frozenset(['-I', '-n', '-P', '-d', '-L', '-s', '-E', '-a', '--max-args', '--max-procs',
+                        '--delimiter', '--max-lines', '--max-chars', '--eof', '--arg-file',
+                        '--process-slot-var']),
+    'watch': frozenset(['-n', '--interval']),  # -d takes its optional argument attached only
+    'time': frozenset(['-f', '-o', '--format', '--output']),
+}
+
+SHELLS = frozenset(['sh', 'bash', 'dash', 'zsh', 'ksh'])
+
+# Idempotent lookups whose results may be reused for this many seconds.
+# Tools not listed here are never served from the command result cache.
+DEFAULT_CACHE_TTLS = {
+    'dig': 300.0, 'nslookup': 300.0, 'host': 300.0, 'whois': 3600.0, 'nmap': 600.0
+}
+
+# Operators that end one simple command and start another
+SEPARATORS = frozenset([';', ';;', '&', '&&', '||', '|', '|&', '(', ')', '`'])
+OPERATORS = sorted(SEPARATORS | {'<', '>', '>>', '>&', '<&', '&>', '<<'}, key=len, reverse=True)
+
+PUNCTUATION = ';&|()<>`'
+_SUBSTITUTION = re.compile(r"\$\(([^()]*)\)|`([^`]*)`")
+_REDIRECTIONS = frozenset(['<', '>', '>>', '>&', '<&', '&>', '<<'])
+_ASSIGNMENT = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*=")
+_LEADING_WORD = re.compile(r"[A-Za-z0-9_-]+")
+
+@dataclass
+class PolicyRule:
+    """One policy rule
+
+    ``pattern`` is matched at the start of each normalized segment
+    (``"program arg1 arg2"``, single-spaced, one per line; a segment that
+    pipes into the next one ends with `` |``). Rules with ``scope="raw"``
+    are matched anywhere in the whitespace-normalized command instead.
+    Patterns may not use backreferences.
+    """
+    label: str
+    pattern: str
+    level: int = 10
+    action: str = "block"  # "block" or "warn"
+    scope: str = "segment"  # "segment" or "raw"
+
+# Ordered most specific first: the first rule matching at a position wins
+DEFAULT_RULES = [
+    PolicyRule(':(){ :|: & };:', r":\s*\(\)\s*\{\s*:\s*\|\s*:\s*&\s*\}\s*;\s*:", scope="raw"),
+    PolicyRule('curl | sh', r"(?:curl|wget)(?: [^\n]*)? \|\n(?:ba|da|z|k)?sh(?: |$)"),
+    PolicyRule('rm -rf /', r"rm(?=(?: \S+)* -[a-z]*r)(?=(?: \S+)* -[a-z]*f)(?: \S+)* /"),
+    PolicyRule('del /f /s /q', r"del(?: \S+)* /f(?: \S+)* /s(?: \S+)* /q"),
+    PolicyRule('format', r"format(?:\.com|\.exe)?(?: |$)"),
+    PolicyRule('fdisk', r"fdisk(?: |$)"),
+    PolicyRule('mkfs', r"mkfs(?:\.\w+)?(?: |$)"),
+    PolicyRule('dd if=', r"dd(?: \S+)* if="),
+    PolicyRule('shutdown', r"shutdown(?:\.exe)?(?: |$)"),
+    PolicyRule('reboot', r"reboot(?: |$)"),
+    PolicyRule('powershell.exe', r"(?:powershell|pwsh)(?:\.exe)?(?: |$)"),
+    PolicyRule('wget', r"wget(?: |$)"),
+    PolicyRule('curl', r"curl(?: |$)"),
+]
+
+def _split_operators(token: str) -> List[str]:
+    """Break a run of punctuation such as ``);(`` into individual operators"""
+    parts = []
+    while token:
+        for operator in OPERATORS:
+            if token.startswith(operator):
+                parts.append(operator)
+                token = token[len(operator):]
+                break
+        else:
+            parts.append(token[0])
+            token = token[1:]
+    return parts
+
+def _option_argument(wrapper: str, option: str) -> Optional[str]:
+    """How ``option`` of ``wrapper`` takes an argument: ``'next'`` (the following word), ``'split'`` (``env -S``) or None"""
+    takes = WRAPPER_OPTION_ARGUMENTS.get(wrapper, frozenset())
+    if option.startswith('--'):
+        if '=' in option or option not in takes:
+            return None
+        return 'split' if wrapper == 'env' and option == '--split-string' else 'next'
+    # A cluster such as -Eu: the first option taking an argument gets the rest of
+    # the word, or the next word when nothing follows it
+    for position in range(1, len(option)):
+        if '-' + option[position] in takes:
+            if position + 1 < len(option):
+                return None
+            return 'split' if wrapper == 'env' and option[position] == 'S' else 'next'
+    return None
+
+def _strip_wrappers(words: List[str]) -> List[str]:
+    """Drop leading variable assignments and wrappers like ``sudo``/``env`` with their options
+
+    Option arguments (``sudo -u root``, ``timeout -s KILL``) are skipped
+    with their option, so the word left at the front is the program that
+    actually runs. ``env -S`` splits its argument into the command line.
+    """
+    index = 0
+    while index < len(words):
+        word = words[index]
+        if _ASSIGNMENT.match(word):
+            index += 1
+        elif os.path.basename(word).lower() in COMMAND_WRAPPERS:
+            wrapper = os.path.basename(word).lower()
+            index += 1
+            while index < len(words) and words[index].startswith('-') and words[index] != '-':
+                option = words[index]
+                index += 1
+                if option == '--':
+                    break
+                argument = _option_argument(wrapper, option)
+                if argument == 'split' and index < len(words):
+                    words = words[:index] + words[index].split() + words[index + 1:]
+                elif argument == 'next':
+                    index += 1
+            if wrapper == 'timeout' and index < len(words):
+                index += 1  # duration
+        else:
+            break
+    return words[index:]
+
+def split_command(command: str, depth: int = 0) -> List[Tuple[str, List[str]]]:
+    """Split a command line into simple commands with shell semantics
+
+    Returns ``(operator, words)`` pairs where ``operator`` is the separator
+    that preceded the segment (``''`` for the first). Pipelines, lists,
+    subshells, command substitutions and ``sh -c``/``eval`` payloads all
+    yield separate segments. Unbalanced quoting falls back to whitespace
+    splitting so malformed input is still checked.
+    """
+    lexer = shlex.shlex(command.replace('\n', ';'), posix=True, punctuation_chars=PUNCTUATION)
+    lexer.whitespace_split = True
+    try:
+        tokens = list(lexer)
+    except ValueError:
+        tokens = command.split()
+
+    segments: List[Tuple[str, List[str]]] = []
+    nested: List[str] = []
+    operator = ''
+    words: List[str] = []
+
+    def flush(next_operator: str):
+        nonlocal operator, words
+        if words:
+            segments.append((operator, words))
+        operator, words = next_operator, []
+
+    for token in tokens:
+        if token and all(char in PUNCTUATION for char in token):
+            for part in _split_operators(token):
+                if part in SEPARATORS:
+                    flush(part)
+                else:
+                    words.append(part)
+            continue
+        # Substitutions survive inside double quotes and still execute
+        if '$(' in token or '`' in token:
+            nested.extend(first or second for first, second in _SUBSTITUTION.findall(token))
+        words.append(token)
+    flush('')
+
+    result: List[Tuple[str, List[str]]] = []
+    for operator, words in segments:
+        words = _strip_wrappers(words)
+        if not words:
+            continue
+        result.append((operator, words))
+        if depth < 4:
+            program = os.path.basename(words[0]).lower()
+            if program in SHELLS and '-c' in words[1:-1]:
+                nested.append(words[words.index('-c', 1) + 1])
+            elif program == 'eval':
+                nested.append(' '.join(words[1:]))
+    if depth < 4:
+        for inner in nested:
+            result.extend(split_command(inner, depth + 1))
+    return result
+
+def _top_level_alternatives(pattern: str) -> List[str]:
+    """Split ``pattern`` on the ``|`` not nested in a group or character class"""
+    alternatives = []
+    depth = 0
+    in_class = False
+    start = 0
+    index = 0
+    while index < len(pattern):
+        char = pattern[index]
+        if char == '\\':
+            index += 1  # the escaped character is a literal
+        elif in_class:
+            in_class = char != ']'
+        elif char == '[':
+            in_class = True
+            if pattern[index + 1:index + 2] == '^':
+                index += 1
+            if pattern[index + 1:index + 2] == ']':
+                index += 1  # a leading ] is a literal
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == '|' and depth == 0:
+            alternatives.append(pattern[start:index])
+            start = index + 1
+        index += 1
+    alternatives.append(pattern[start:])
+    return alternatives
+
+class CommandPolicy:
+    """Evaluates commands against a compiled rule set
+
+    Python's ``re`` tries alternatives one after another, so a single
+    alternation of every rule costs time proportional to the rule count.
+    Rules are instead bucketed by the literal program word their pattern
+    starts with and each bucket is compiled into one alternation; a segment
+    only runs the bucket(s) keyed by prefixes of its program name plus the
+    small bucket of rules without a literal prefix. Cost per command then
+    depends on its segments, not on the size of the policy. Verdicts are
+    memoized in an LRU keyed by a hash of the command text.
+
+    Verdicts also carry ``cache_ttl``: how long the command's result may be
+    reused, or None. Only single commands of a tool listed in ``cache_ttls``
+    qualify, and only without redirections or ``-o``/``--output`` arguments,
+    since those write files a cached result would skip.
+    """
+
+    def __init__(self, rules: Optional[Iterable[PolicyRule]] = None, cache_size: Optional[int] = None,
+                 cache_ttls: Optional[Dict[str, float]] = None):
+        if rules is None:
+            rules = DEFAULT_RULES + self._load_extra_rules()
+        self.rules = list(rules)
+        self.cache_ttls = cache_ttls if cache_ttls is not None else self._load_cache_ttls()
+        self.cache_size = cache_size or int(os.getenv("COMMAND_POLICY_CACHE_SIZE", "4096"))
+        self._cache: "OrderedDict[bytes, Dict[str, Any]]" = OrderedDict()
+        self.stats = {"evaluations": 0, "cache_hits": 0}
+        self._compile()
+
+    @staticmethod
+    def _load_extra_rules() -> List[PolicyRule]:
+        """Additional rules from the JSON list named by COMMAND_POLICY_RULES"""
+        path = os.getenv("COMMAND_POLICY_RULES")
+        if not path:
+            return []
+        try:
+            with open(path) as rules_file:
+                return [PolicyRule(**rule) for rule in json.load(rules_file)]
+        except (OSError, ValueError, TypeError) as e:
+            logger.error(f"❌ Could not load command policy rules from {path}: {e}")
+            return []
+
+    @staticmethod
+    def _load_cache_ttls() -> Dict[str, float]:
+        """Cacheable tools from COMMAND_CACHE_TOOLS (``"nmap=600,dig=300"``), else the defaults"""
+        spec = os.getenv("COMMAND_CACHE_TOOLS")
+        if spec is None:
+            return dict(DEFAULT_CACHE_TTLS)
+        ttls = {}
+        for item in filter(None, (part.strip() for part in spec.split(','))):
+            tool, _, ttl = item.partition('=')
+            tool = tool.strip().lower()
+            try:
+                ttls[tool] = float(ttl) if ttl else DEFAULT_CACHE_TTLS.get(tool, 300.0)
+            except ValueError:
+                logger.error(f"❌ Invalid COMMAND_CACHE_TOOLS entry: {item}")
+        return ttls
+
+    def _cache_ttl(self, segments: List[Tuple[str, List[str]]]) -> Optional[float]:
+        if len(segments) != 1:
+            return None
+        words = segments[0][1]
+        ttl = self.cache_ttls.get(os.path.basename(words[0]).lower())
+        if ttl is None:
+            return None
+        for word in words[1:]:
+            if word in _REDIRECTIONS or word.startswith(('-o', '--output')):
+                return None
+        return ttl
+
+    @staticmethod
+    def _rule_key(rule: PolicyRule) -> Optional[str]:
+        """Literal word the rule's pattern must start with, if it has one
+
+        A pattern with a top-level alternation (``nc|netcat ...``) only has
+        a key when every alternative starts with the same word.
+        """
+        keys = set()
+        for alternative in _top_level_alternatives(rule.pattern):
+            match = _LEADING_WORD.match(alternative)
+            if not match:
+                return None
+            word = match.group(0)
+            if alternative[match.end():match.end() + 1] in ('?', '*', '{'):
+                word = word[:-1]  # the last character is optional
+            keys.add(word.lower())
+        if len(keys) != 1:
+            return None
+        return keys.pop() or None
+
+    def _compile(self):
+        buckets: Dict[Optional[str], List[int]] = {}
+        raw: List[int] = []
+        for index, rule in enumerate(self.rules):
+            if rule.scope == "raw":
+                raw.append(index)
+            else:
+                buckets.setdefault(self._rule_key(rule), []).append(index)
+
+        def alternation(indexes: List[int], anchored: bool) -> Optional["re.Pattern"]:
+            if not indexes:
+                return None
+            body = "|".join(f"(?P<r{index}>{self.rules[index].pattern})" for index in indexes)
+            return re.compile(("^" if anchored else "") + f"(?:{body})", re.MULTILINE | re.IGNORECASE)
+
+        self._generic = alternation(buckets.pop(None, []), True)
+        self._raw = alternation(raw, False)
+        self._buckets = {key: alternation(indexes, True) for key, indexes in buckets.items()}
+        self._key_lengths = sorted({len(key) for key in self._buckets})
+
+    @staticmethod
+    def render(segments: List[Tuple[str, List[str]]]) -> Tuple[str, List[int]]:
+        """Normalized document the segment rules run over, with each line's start offset"""
+        lines = []
+        for index, (_, words) in enumerate(segments):
+            line = " ".join([os.path.basename(words[0])] + words[1:])
+            if index + 1 < len(segments) and segments[index + 1][0] in ("|", "|&"):
+                line += " |"
+            lines.append(line)
+        starts = []
+        position = 0
+        for line in lines:
+            starts.append(position)
+            position += len(line) + 1
+        return "\n".join(lines), starts
+
+    def evaluate(self, command: str) -> Dict[str, Any]:
+        """Return the verdict dict for ``command`` (cached per distinct command)"""
+        key = hashlib.blake2b(command.encode('utf-8', errors='surrogatepass'), digest_size=16).digest()
+        verdict = self._cache.get(key)
+        if verdict is not None:
+            self._cache.move_to_end(key)
+            self.stats["cache_hits"] += 1
+        else:
+            verdict = self._evaluate(command)
+            self._cache[key] = verdict
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        self.stats["evaluations"] += 1
+        return {**verdict, 'warnings': list(verdict['warnings']), 'timestamp': datetime.now().isoformat()}
+
+    def _matches(self, command: str, segments: List[Tuple[str, List[str]]]) -> List[PolicyRule]:
+        hits = []
+        if self._raw is not None:
+            match = self._raw.search(" ".join(command.split()))
+            if match:
+                hits.append(self.rules[int(match.lastgroup[1:])])
+
+        document, starts = self.render(segments)
+        for start in starts:
+            word = _LEADING_WORD.match(document, start)
+            word = word.group(0).lower() if word else ""
+            patterns = [self._buckets.get(word[:length]) for length in self._key_lengths if length <= len(word)]
+            patterns.append(self._generic)
+            for pattern in patterns:
+                if pattern is not None:
+                    match = pattern.match(document, start)
+                    if match:
+                        hits.append(self.rules[int(match.lastgroup[1:])])
+        return hits
+
+    def _evaluate(self, command: str) -> Dict[str, Any]:
+        danger_level = 0
+        warnings: List[str] = []
+        is_allowed = True
+
+        segments = split_command(command)
+        for rule in self._matches(command, segments):
+            danger_level = max(danger_level, rule.level)
+            if rule.action == "block":
+                warning = f"Dangerous command detected: {rule.label}"
+                is_allowed = False
+            else:
+                warning = f"Risky command: {rule.label}"
+            if warning not in warnings:
+                warnings.append(warning)
+
+        programs = []
+        for _, words in segments:
+            program = os.path.basename(words[0]).lower()
+            programs.append(program)
+            if program in ALLOWED_SECURITY_TOOLS:
+                danger_level = max(danger_level, 2)  # Security tools have minimal risk
+                warning = f"Security tool: {program}"
+            elif program not in SAFE_COMMANDS:
+                danger_level = max(danger_level, 5)  # Unknown commands have medium risk
+                warning = f"Unknown command: {program}"
+            else:
+                continue
+            if warning not in warnings:
+                warnings.append(warning)
+
+        return {
+            'danger_level': danger_level,
+            'warnings': warnings,
+            'is_allowed': is_allowed,
+            'segments': programs,
+            'cache_ttl': self._cache_ttl(segments) if is_allowed else None
+        }
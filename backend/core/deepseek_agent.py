@@ -3,11 +3,14 @@ KALI AI TERMINAL - Unified AI Interface
 Provides a flexible interface to multiple AI providers for natural language processing.
 """
 
-import aiohttp
+import abc
+import json
 import os
 import logging
 from .firecrawl_integration import FirecrawlIntegration
-from typing import Dict, Any, Protocol
+from .response_cache import LLMResponseCache, response_cache
+from utils.http_pool import HTTPSessionPool, http_pool
+from typing import Dict, Any, AsyncIterator, Optional, Protocol, Tuple
 
 logger = logging.getLogger(__name__)
 
@@ -16,9 +19,65 @@ class AIProvider(Protocol):
     async def process_query(self, prompt: str, config: Dict[str, Any]) -> Dict[str, Any]:
         ...
 
-class DeepSeekProvider:
-    """AI provider for DeepSeek API"""
+class PooledProvider(abc.ABC):
+    """Base for OpenAI-compatible providers posting through the shared keep-alive session pool
+    
+    Subclasses describe their request in ``_build_request``; this class sends it
+    either as a single completion or as a server-sent-event stream.
+    """
+    def __init__(self, pool: Optional[HTTPSessionPool] = None):
+        self.pool = pool or http_pool
+
+    @abc.abstractmethod
+    def _build_request(self, prompt: str, config: Dict[str, Any], stream: bool) -> Tuple[str, Dict[str, Any], Dict[str, str]]:
+        """``(url, json payload, headers)`` of the chat completion request"""
+
     async def process_query(self, prompt: str, config: Dict[str, Any]) -> Dict[str, Any]:
+        url, payload, headers = self._build_request(prompt, config, stream=False)
+        session = self.pool.get_session(url)
+        async with session.post(url, json=payload, headers=headers) as response:
+            response.raise_for_status()
+            return await response.json()
+
+    async def stream_query(self, prompt: str, config: Dict[str, Any]) -> AsyncIterator[str]:
+        """Yield completion text deltas as the provider streams them"""
+        url, payload, headers = self._build_request(prompt, config, stream=True)
+        headers = {**headers, "Accept": "text/event-stream"}
+        session = self.pool.get_session(url)
+        async with session.post(url, json=payload, headers=headers, timeout=self.pool.stream_timeout) as response:
+            response.raise_for_status()
+            async for data in iter_sse_data(response.content):
+                if data == "[DONE]":
+                    break
+                try:
+                    chunk = json.loads(data)
+                except ValueError:
+                    logger.warning(f"Skipping malformed stream chunk: {data[:100]}")
+                    continue
+                for choice in chunk.get("choices") or []:
+                    content = (choice.get("delta") or {}).get("content")
+                    if content:
+                        yield content
+
+async def iter_sse_data(stream) -> AsyncIterator[str]:
+    """Yield the data payload of each server-sent event read from an aiohttp stream"""
+    data_lines = []
+    async for raw_line in stream:
+        line = raw_line.decode("utf-8", errors="ignore").rstrip("\r\n")
+        if not line:
+            # A blank line terminates the event
+            if data_lines:
+                yield "\n".join(data_lines)
+                data_lines = []
+        elif line.startswith("data:"):
+            data_lines.append(line[5:].lstrip(" "))
+        # Comments (":") and other fields (event:, id:, retry:) carry no completion text
+    if data_lines:
+        yield "\n".join(data_lines)
+
+class DeepSeekProvider(PooledProvider):
+    """AI provider for DeepSeek API"""
+    def _build_request(self, prompt: str, config: Dict[str, Any], stream: bool) -> Tuple[str, Dict[str, Any], Dict[str, str]]:
         headers = {
             "Authorization": f"Bearer {config['api_key']}",
             "Content-Type": "application/json"
@@ -29,16 +88,13 @@ class DeepSeekProvider:
                 {"role": "system", "content": "You are a helpful assistant in a cybersecurity terminal."},
                 {"role": "user", "content": prompt}
             ],
-            "stream": False
+            "stream": stream
         }
-        async with aiohttp.ClientSession() as session:
-            async with session.post(f"{config.get('base_url', 'https://api.deepseek.com/v1')}/chat/completions", json=payload, headers=headers) as response:
-                response.raise_for_status()
-                return await response.json()
+        return f"{config.get('base_url', 'https://api.deepseek.com/v1')}/chat/completions", payload, headers
 
-class EmergentProvider:
+class EmergentProvider(PooledProvider):
     """AI provider for Emergent AI API"""
-    async def process_query(self, prompt: str, config: Dict[str, Any]) -> Dict[str, Any]:
+    def _build_request(self, prompt: str, config: Dict[str, Any], stream: bool) -> Tuple[str, Dict[str, Any], Dict[str, str]]:
         headers = {
             "Authorization": f"Bearer {config['api_key']}",
             "Content-Type": "application/json",
@@ -50,19 +106,16 @@ class EmergentProvider:
                 {"role": "system", "content": "You are an expert cybersecurity assistant specializing in Kali Linux and penetration testing. You have deep knowledge of security tools, vulnerability assessment, and ethical hacking techniques. Provide accurate, practical, and safe commands and explanations. Always prioritize security best practices."},
                 {"role": "user", "content": prompt}
             ],
-            "stream": False,
+            "stream": stream,
             "max_tokens": 2000,
             "temperature": 0.2,
             "top_p": 0.9
         }
-        async with aiohttp.ClientSession() as session:
-            async with session.post(f"{config.get('base_url', 'https://api.emergent.ai/v1')}/chat/completions", json=payload, headers=headers) as response:
-                response.raise_for_status()
-                return await response.json()
+        return f"{config.get('base_url', 'https://api.emergent.ai/v1')}/chat/completions", payload, headers
 
-class QwenProvider:
+class QwenProvider(PooledProvider):
     """AI provider for Qwen Coder API via OpenRouter"""
-    async def process_query(self, prompt: str, config: Dict[str, Any]) -> Dict[str, Any]:
+    def _build_request(self, prompt: str, config: Dict[str, Any], stream: bool) -> Tuple[str, Dict[str, Any], Dict[str, str]]:
         headers = {
             "Authorization": f"Bearer {config['api_key']}",
             "Content-Type": "application/json",
@@ -75,14 +128,11 @@ class QwenProvider:
                 {"role": "system", "content": "You are an expert cybersecurity assistant specializing in Kali Linux and penetration testing. Provide clear, accurate commands and explanations."},
                 {"role": "user", "content": prompt}
             ],
-            "stream": False,
+            "stream": stream,
             "max_tokens": 2000,
             "temperature": 0.3
         }
-        async with aiohttp.ClientSession() as session:
-            async with session.post(f"{config.get('base_url', 'https://openrouter.ai/api/v1')}/chat/completions", json=payload, headers=headers) as response:
-                response.raise_for_status()
-                return await response.json()
+        return f"{config.get('base_url', 'https://openrouter.ai/api/v1')}/chat/completions", payload, headers
 
 class PromptEngine:
     """Generates tailored prompts for different tasks."""
@@ -120,6 +170,7 @@ class UnifiedAIAgent:
                 "model": os.getenv("QWEN_MODEL", "qwen/qwen-2.5-coder-32b-instruct")
             }
         }
+        self.response_cache: Optional[LLMResponseCache] = response_cache
         logger.info(f"Unified AI Agent initialized with default provider: {self.default_provider}")
 
     def is_ready(self, provider: str = None) -> bool:
@@ -128,17 +179,67 @@ class UnifiedAIAgent:
             return self.providers[provider].is_ready()
         return bool(self.configs.get(provider, {}).get('api_key'))
 
-    async def process_query(self, prompt: str, provider: str = None) -> Dict[str, Any]:
+    def _cache_key(self, prompt: str, provider: str) -> Optional[str]:
+        if self.response_cache is None:
+            return None
+        return self.response_cache.make_key(provider, self.configs.get(provider, {}).get('model'), prompt)
+
+    async def process_query(self, prompt: str, provider: str = None, use_cache: bool = True) -> Dict[str, Any]:
         provider = provider or self.default_provider
         if not self.is_ready(provider):
             return {"error": f"{provider.capitalize()} API key not configured."}
         
+        cache_key = self._cache_key(prompt, provider) if use_cache else None
+        if cache_key:
+            cached = await self.response_cache.get(cache_key)
+            if cached is not None:
+                return cached
+        
         try:
             config = self.configs[provider] if provider != "firecrawl" else {}
-            return await self.providers[provider].process_query(prompt, config)
+            response = await self.providers[provider].process_query(prompt, config)
         except Exception as e:
             logger.error(f"Error with {provider} API: {e}")
             return {"error": str(e)}
+        
+        if cache_key and 'error' not in response:
+            await self.response_cache.set(cache_key, response)
+        return response
+
+    async def stream_query(self, prompt: str, provider: str = None, use_cache: bool = True) -> AsyncIterator[str]:
+        """Yield the completion for ``prompt`` incrementally, as text deltas
+        
+        Cached answers and providers without a streaming endpoint yield the
+        whole answer as one delta. Provider errors raise ``RuntimeError``.
+        """
+        provider = provider or self.default_provider
+        if not self.is_ready(provider):
+            raise RuntimeError(f"{provider.capitalize()} API key not configured.")
+        
+        config = self.configs[provider] if provider != "firecrawl" else {}
+        provider_impl = self.providers[provider]
+        
+        cache_key = self._cache_key(prompt, provider) if use_cache else None
+        cached = await self.response_cache.get(cache_key) if cache_key else None
+        
+        if cached is not None or not hasattr(provider_impl, "stream_query"):
+            response = cached if cached is not None else await self.process_query(prompt, provider, use_cache)
+            if 'error' in response:
+                raise RuntimeError(response['error'])
+            if 'choices' in response and response['choices']:
+                yield response['choices'][0].get('message', {}).get('content', '')
+            return
+        
+        parts = []
+        async for delta in provider_impl.stream_query(prompt, config):
+            parts.append(delta)
+            yield delta
+        
+        if cache_key:
+            # Store in the non-streaming response shape so either path can serve it
+            await self.response_cache.set(cache_key, {
+                "choices": [{"message": {"role": "assistant", "content": "".join(parts)}}]
+            })
 
     async def translate_command(self, nl_command: str, provider: str = None) -> str:
         prompt = self.prompt_engine.get_command_translation_prompt(nl_command)
@@ -5,17 +5,18 @@ Handles interactions with the Firecrawl API for security tasks.
 
 import logging
 import os
-import aiohttp
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+from utils.http_pool import HTTPSessionPool, http_pool
 
 logger = logging.getLogger(__name__)
 
 class FirecrawlIntegration:
     """Firecrawl API integration for MCP tasks"""
 
-    def __init__(self):
+    def __init__(self, pool: Optional[HTTPSessionPool] = None):
         self.api_key = os.getenv("FIRECRAWL_API_KEY")
         self.base_url = "https://api.firecrawl.com/v1"
+        self.pool = pool or http_pool
 
     async def invoke_mcp_tool(self, task: str, config: Dict[str, Any]) -> Dict[str, Any]:
         """Invoke MCP tool from Firecrawl API"""
@@ -27,10 +28,10 @@ class FirecrawlIntegration:
             "task": task,
             **config
         }
-        async with aiohttp.ClientSession() as session:
-            async with session.post(f"{self.base_url}/mcp-tool", json=payload, headers=headers) as response:
-                response.raise_for_status()
-                return await response.json()
+        session = self.pool.get_session(self.base_url)
+        async with session.post(f"{self.base_url}/mcp-tool", json=payload, headers=headers) as response:
+            response.raise_for_status()
+            return await response.json()
 
     def is_ready(self) -> bool:
         """Check if Firecrawl API is ready"""
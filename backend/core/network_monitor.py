@@ -7,12 +7,13 @@ import asyncio
 import psutil
 import json
 import time
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional
 from datetime import datetime, timedelta
 from dataclasses import dataclass, asdict
 import socket
 import subprocess
 import platform
+import threading
 from utils.logger import setup_logger
 
 logger = setup_logger(__name__)
@@ -53,13 +54,32 @@ class NetworkConnection:
     process_name: Optional[str]
 
 class NetworkMonitor:
-    def __init__(self):
+    """System and network monitor
+    
+    Sampling runs on a dedicated daemon thread so psutil calls never block the
+    event loop; the async getters only read the latest cached snapshot.
+    ``on_sample``, if set, is called with every new status from the sampler
+    thread, so the status can be pushed to viewers instead of polled.
+    """
+    
+    SAMPLE_INTERVAL = 5.0  # seconds between samples
+    HISTORY_SIZE = 720  # 720 * 5 seconds = 1 hour
+    
+    def __init__(self, sample_interval: float = SAMPLE_INTERVAL):
         self._running = False
-        self._monitor_task = None
+        self._sampler_thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self._sample_lock = threading.Lock()  # one sample at a time: they share the throughput counters
+        self._first_sample = threading.Event()
+        self.sample_interval = sample_interval
         self.metrics_history: List[SystemMetrics] = []
         self.active_connections: List[NetworkConnection] = []
         self.network_interfaces: List[NetworkInterface] = []
         self._last_network_io = None
+        self._last_sample_time: Optional[float] = None
+        self._latest_status: Optional[Dict] = None
+        self.on_sample: Optional[Callable[[Dict], None]] = None
         
         logger.info("Network Monitor initialized")
 
@@ -69,40 +89,93 @@ class NetworkMonitor:
 
     async def start_monitoring(self):
         """Start real-time monitoring"""
+        if self._sampler_thread and self._sampler_thread.is_alive():
+            return
         self._running = True
-        self._monitor_task = asyncio.create_task(self._monitoring_loop())
+        self._stop_event.clear()
+        self._sampler_thread = threading.Thread(
+            target=self._sampler_loop,
+            name="network-monitor-sampler",
+            daemon=True
+        )
+        self._sampler_thread.start()
         logger.info("Started real-time network monitoring")
 
-    async def _monitoring_loop(self):
-        """Main monitoring loop"""
-        while self._running:
+    def _sampler_loop(self):
+        """Sampler thread main loop"""
+        # Prime the CPU counters so the first non-blocking reading is a real delta
+        psutil.cpu_percent(interval=None)
+        self._stop_event.wait(min(1.0, self.sample_interval))
+        
+        while not self._stop_event.is_set():
             try:
-                # Collect system metrics
-                metrics = await self._collect_system_metrics()
-                self.metrics_history.append(metrics)
-                
-                # Keep only last hour of metrics (assuming 5 second intervals)
-                if len(self.metrics_history) > 720:  # 720 * 5 seconds = 1 hour
-                    self.metrics_history.pop(0)
-                
-                # Update network interfaces
-                await self._update_network_interfaces()
-                
-                # Update active connections
-                await self._update_active_connections()
-                
-                # Sleep for 5 seconds before next collection
-                await asyncio.sleep(5)
-                
+                self._sample()
             except Exception as e:
                 logger.error(f"❌ Monitoring loop error: {str(e)}")
-                await asyncio.sleep(10)
+            
+            self._stop_event.wait(self.sample_interval)
+
+    def _sample(self) -> Dict:
+        """Collect one sample and publish it as the latest snapshot"""
+        with self._sample_lock:
+            status = self._collect_sample()
+        self._first_sample.set()
+        
+        if self.on_sample is not None:
+            self.on_sample(status)
+        
+        return status
+
+    def _collect_sample(self) -> Dict:
+        """Collect metrics and compute throughput against the previous sample"""
+        net_connections = self._safe_net_connections()
+        metrics = self._collect_system_metrics(net_connections)
+        self._update_network_interfaces()
+        self._update_active_connections(net_connections)
+        
+        # Throughput over the real time elapsed since the previous sample
+        now = time.monotonic()
+        network_throughput = {}
+        if self._last_network_io and self._last_sample_time and metrics.network_io:
+            time_diff = max(now - self._last_sample_time, 1e-6)
+            for interface, current_io in metrics.network_io.items():
+                if interface in self._last_network_io:
+                    last_io = self._last_network_io[interface]
+                    
+                    bytes_sent_per_sec = (current_io['bytes_sent'] - last_io['bytes_sent']) / time_diff
+                    bytes_recv_per_sec = (current_io['bytes_recv'] - last_io['bytes_recv']) / time_diff
+                    
+                    network_throughput[interface] = {
+                        'upload_speed': bytes_sent_per_sec,
+                        'download_speed': bytes_recv_per_sec
+                    }
+        
+        self._last_network_io = metrics.network_io
+        self._last_sample_time = now
+        
+        status = self._build_status(metrics, network_throughput)
+        
+        with self._lock:
+            self.metrics_history.append(metrics)
+            if len(self.metrics_history) > self.HISTORY_SIZE:
+                self.metrics_history.pop(0)
+            self._latest_status = status
+        
+        return status
+
+    def _safe_net_connections(self) -> list:
+        """Fetch inet connections, tolerating platforms that require privileges"""
+        try:
+            return psutil.net_connections(kind='inet')
+        except (psutil.AccessDenied, OSError) as e:
+            logger.error(f"❌ Failed to list network connections: {str(e)}")
+            return []
 
-    async def _collect_system_metrics(self) -> SystemMetrics:
+    def _collect_system_metrics(self, net_connections: list) -> SystemMetrics:
         """Collect current system metrics"""
         try:
-            # CPU usage
-            cpu_percent = psutil.cpu_percent(interval=1)
+            # CPU usage since the previous call (non-blocking)
+            cpu_percent = psutil.cpu_percent(interval=None)
             
             # Memory usage
             memory = psutil.virtual_memory()
@@ -117,8 +190,7 @@ class NetworkMonitor:
             running_processes = len(psutil.pids())
             
             # Active network connections count
-            connections = psutil.net_connections()
-            active_connections = len([c for c in connections if c.status == 'ESTABLISHED'])
+            active_connections = len([c for c in net_connections if c.status == 'ESTABLISHED'])
             
             metrics = SystemMetrics(
                 timestamp=datetime.now(),
@@ -158,7 +230,7 @@ class NetworkMonitor:
                 running_processes=0
             )
 
-    async def _update_network_interfaces(self):
+    def _update_network_interfaces(self):
         """Update network interface information"""
         try:
             interfaces = []
@@ -201,11 +273,10 @@ class NetworkMonitor:
         except Exception as e:
             logger.error(f"❌ Failed to update network interfaces: {str(e)}")
 
-    async def _update_active_connections(self):
+    def _update_active_connections(self, net_connections: list):
         """Update active network connections"""
         try:
             connections = []
-            net_connections = psutil.net_connections(kind='inet')
             
             for conn in net_connections:
                 if conn.status == 'ESTABLISHED':
@@ -233,74 +304,70 @@ class NetworkMonitor:
         except Exception as e:
             logger.error(f"❌ Failed to update active connections: {str(e)}")
 
+    def _build_status(self, current_metrics: SystemMetrics, network_throughput: Dict) -> Dict:
+        """Assemble the system status payload from a metrics sample"""
+        # Get system uptime
+        boot_time = psutil.boot_time()
+        uptime_seconds = time.time() - boot_time
+        uptime = str(timedelta(seconds=int(uptime_seconds)))
+        
+        # Get load average (on Unix systems)
+        load_avg = None
+        try:
+            if hasattr(psutil, 'getloadavg'):
+                load_avg = psutil.getloadavg()
+        except:
+            pass
+        
+        return {
+            "timestamp": current_metrics.timestamp.isoformat(),
+            "system": {
+                "platform": platform.system(),
+                "hostname": socket.gethostname(),
+                "uptime": uptime,
+                "load_average": load_avg
+            },
+            "cpu": {
+                "usage_percent": current_metrics.cpu_percent,
+                "count": psutil.cpu_count(),
+                "count_logical": psutil.cpu_count(logical=True)
+            },
+            "memory": {
+                "usage_percent": current_metrics.memory_percent,
+                "available_gb": round(current_metrics.memory_available / (1024**3), 2),
+                "total_gb": round(current_metrics.memory_total / (1024**3), 2)
+            },
+            "disk": {
+                "usage_percent": current_metrics.disk_usage_percent,
+                "free_gb": round(current_metrics.disk_free / (1024**3), 2),
+                "total_gb": round(current_metrics.disk_total / (1024**3), 2)
+            },
+            "network": {
+                "interfaces": [asdict(interface) for interface in self.network_interfaces],
+                "active_connections": current_metrics.active_connections,
+                "throughput": network_throughput
+            },
+            "processes": {
+                "running": current_metrics.running_processes
+            }
+        }
+
     async def get_system_status(self) -> Dict:
-        """Get current system status"""
+        """Get current system status from the latest cached snapshot"""
         try:
-            current_metrics = await self._collect_system_metrics()
+            with self._lock:
+                status = self._latest_status
             
-            # Calculate network throughput if we have previous data
-            network_throughput = {}
-            if self._last_network_io and current_metrics.network_io:
-                for interface, current_io in current_metrics.network_io.items():
-                    if interface in self._last_network_io:
-                        last_io = self._last_network_io[interface]
-                        time_diff = 5  # 5 seconds between collections
-                        
-                        bytes_sent_per_sec = (current_io['bytes_sent'] - last_io['bytes_sent']) / time_diff
-                        bytes_recv_per_sec = (current_io['bytes_recv'] - last_io['bytes_recv']) / time_diff
-                        
-                        network_throughput[interface] = {
-                            'upload_speed': bytes_sent_per_sec,
-                            'download_speed': bytes_recv_per_sec
-                        }
-            
-            self._last_network_io = current_metrics.network_io
-            
-            # Get system uptime
-            boot_time = psutil.boot_time()
-            uptime_seconds = time.time() - boot_time
-            uptime = str(timedelta(seconds=int(uptime_seconds)))
-            
-            # Get load average (on Unix systems)
-            load_avg = None
-            try:
-                if hasattr(psutil, 'getloadavg'):
-                    load_avg = psutil.getloadavg()
-            except:
-                pass
-            
-            status = {
-                "timestamp": current_metrics.timestamp.isoformat(),
-                "system": {
-                    "platform": platform.system(),
-                    "hostname": socket.gethostname(),
-                    "uptime": uptime,
-                    "load_average": load_avg
-                },
-                "cpu": {
-                    "usage_percent": current_metrics.cpu_percent,
-                    "count": psutil.cpu_count(),
-                    "count_logical": psutil.cpu_count(logical=True)
-                },
-                "memory": {
-                    "usage_percent": current_metrics.memory_percent,
-                    "available_gb": round(current_metrics.memory_available / (1024**3), 2),
-                    "total_gb": round(current_metrics.memory_total / (1024**3), 2)
-                },
-                "disk": {
-                    "usage_percent": current_metrics.disk_usage_percent,
-                    "free_gb": round(current_metrics.disk_free / (1024**3), 2),
-                    "total_gb": round(current_metrics.disk_total / (1024**3), 2)
-                },
-                "network": {
-                    "interfaces": [asdict(interface) for interface in self.network_interfaces],
-                    "active_connections": current_metrics.active_connections,
-                    "throughput": network_throughput
-                },
-                "processes": {
-                    "running": current_metrics.running_processes
-                }
-            }
+            if status is None:
+                loop = asyncio.get_running_loop()
+                if self._sampler_thread and self._sampler_thread.is_alive():
+                    # The sampler is still priming its counters: wait for its first snapshot
+                    await loop.run_in_executor(None, self._first_sample.wait, self.sample_interval + 1.0)
+                    with self._lock:
+                        status = self._latest_status
+                if status is None:
+                    # Sampler not started: take one sample off the event loop
+                    status = await loop.run_in_executor(None, self._sample)
             
             return status
             
@@ -310,12 +377,15 @@ class NetworkMonitor:
 
     async def get_system_stats(self) -> Dict:
         """Get system statistics over time"""
-        if not self.metrics_history:
+        with self._lock:
+            history_size = len(self.metrics_history)
+            recent_metrics = self.metrics_history[-60:]
+        
+        if not recent_metrics:
             return {"error": "No metrics available"}
         
         try:
-            # Calculate averages over the last hour
-            recent_metrics = self.metrics_history[-60:] if len(self.metrics_history) >= 60 else self.metrics_history
+            # Calculate averages over the last samples
             
             avg_cpu = sum(m.cpu_percent for m in recent_metrics) / len(recent_metrics)
             avg_memory = sum(m.memory_percent for m in recent_metrics) / len(recent_metrics)
@@ -330,7 +400,7 @@ class NetworkMonitor:
             avg_connections = total_connections / len(recent_metrics)
             
             stats = {
-                "time_range": f"Last {len(recent_metrics) * 5} seconds",
+                "time_range": f"Last {len(recent_metrics) * self.sample_interval:g} seconds",
                 "cpu": {
                     "average_percent": round(avg_cpu, 2),
                     "peak_percent": round(peak_cpu, 2)
@@ -348,7 +418,7 @@ class NetworkMonitor:
                     "active_interfaces": len([i for i in self.network_interfaces if i.status == "up"])
                 },
                 "data_points": len(recent_metrics),
-                "monitoring_duration": f"{len(self.metrics_history) * 5} seconds"
+                "monitoring_duration": f"{history_size * self.sample_interval:g} seconds"
             }
             
             return stats
@@ -368,19 +438,22 @@ class NetworkMonitor:
     async def stop_monitoring(self):
         """Stop monitoring"""
         self._running = False
-        if self._monitor_task:
-            self._monitor_task.cancel()
+        self._stop_event.set()
+        if self._sampler_thread:
+            await asyncio.get_running_loop().run_in_executor(None, self._sampler_thread.join, self.sample_interval)
+            self._sampler_thread = None
         logger.info("Stopped network monitoring")
 
     async def get_security_alerts(self) -> List[Dict]:
         """Get security-related alerts based on monitoring data"""
         alerts = []
         
-        if not self.metrics_history:
-            return alerts
-        
-        # Check for high resource usage
-        latest_metrics = self.metrics_history[-1]
+        with self._lock:
+            if not self.metrics_history:
+                return alerts
+            
+            # Check for high resource usage
+            latest_metrics = self.metrics_history[-1]
         
         if latest_metrics.cpu_percent > 90:
             alerts.append({
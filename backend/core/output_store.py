@@ -0,0 +1,271 @@
+"""
+OUTPUT STORE - Disk-Spilled Command Output
+Line-indexed per-command output files for results too large to keep in memory
+"""
+
+import asyncio
+import os
+import shutil
+import uuid
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+import psutil
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+class SpillFile:
+    """One output stream written to disk with a table of line start offsets
+
+    ``<path>.log`` holds the UTF-8 text and ``<path>.idx`` the byte offset of
+    every line start as native uint64s, so any line range is two seeks away.
+    """
+
+    OFFSET_SIZE = array('Q').itemsize
+
+    def __init__(self, path: str):
+        self.path = path
+        self.size = 0
+        self.offset_count = 1  # line 0 starts at byte 0
+        self.last_offset = 0
+        self._data = open(f"{path}.log", 'wb', buffering=1024 * 1024)
+        self._index = open(f"{path}.idx", 'wb', buffering=64 * 1024)
+        self._index.write(array('Q', [0]).tobytes())
+        self.closed = False
+
+    def write(self, raw: bytes):
+        """Append bytes, recording where each following line starts"""
+        self._data.write(raw)
+        starts = array('Q')
+        position = raw.find(b'\n')
+        while position != -1:
+            starts.append(self.size + position + 1)
+            position = raw.find(b'\n', position + 1)
+        if starts:
+            self._index.write(starts.tobytes())
+            self.offset_count += len(starts)
+            self.last_offset = starts[-1]
+        self.size += len(raw)
+
+    def close(self):
+        if not self.closed:
+            self._data.close()
+            self._index.close()
+            self.closed = True
+
+    @property
+    def total_lines(self) -> int:
+        # A trailing newline opens a line with no content; it is not counted
+        if self.size == 0:
+            return 0
+        return self.offset_count - 1 if self.last_offset == self.size else self.offset_count
+
+    def read_lines(self, start: int, count: int, max_bytes: int) -> Dict[str, Any]:
+        """Read up to ``count`` lines from line ``start`` without loading the rest of the file"""
+        total = self.total_lines
+        start = max(0, min(start, total))
+        count = max(0, min(count, total - start))
+
+        lines: List[str] = []
+        partial = False
+        if count:
+            # Offsets of the requested lines plus the start of the line after them
+            offsets = array('Q')
+            with open(f"{self.path}.idx", 'rb') as index:
+                index.seek(start * self.OFFSET_SIZE)
+                offsets.frombytes(index.read((count + 1) * self.OFFSET_SIZE))
+            if len(offsets) == count:
+                offsets.append(self.size)
+
+            end = min(offsets[-1], offsets[0] + max_bytes)
+            with open(f"{self.path}.log", 'rb') as data:
+                data.seek(offsets[0])
+                block = data.read(end - offsets[0])
+
+            for line in range(count):
+                line_start = offsets[line] - offsets[0]
+                line_end = offsets[line + 1] - offsets[0]
+                if line_end > len(block):
+                    if not lines:
+                        # A single line longer than the budget is cut short
+                        lines.append(block[line_start:].decode('utf-8', errors='replace'))
+                        partial = True
+                    break
+                lines.append(block[line_start:line_end].rstrip(b'\n').decode('utf-8', errors='replace'))
+
+        return {
+            'start': start,
+            'end': start + len(lines),
+            'lines': lines,
+            'total_lines': total,
+            'total_bytes': self.size,
+            'partial_line': partial,
+            'eof': start + len(lines) >= total
+        }
+
+    def delete(self):
+        self.close()
+        for suffix in ('.log', '.idx'):
+            try:
+                os.remove(f"{self.path}{suffix}")
+            except FileNotFoundError:
+                pass
+
+class StreamBuffer:
+    """Collects one stream in memory until it outgrows the spill threshold"""
+
+    def __init__(self, store: "OutputStore", path: str):
+        self.store = store
+        self.path = path
+        self.parts: List[str] = []
+        self.length = 0
+        self.spill: Optional[SpillFile] = None
+
+    def write(self, text: str):
+        if self.spill is not None:
+            self.spill.write(text.encode('utf-8'))
+            return
+        self.parts.append(text)
+        self.length += len(text)
+        if self.length > self.store.spill_threshold:
+            self.spill = SpillFile(self.path)
+            self.spill.write(''.join(self.parts).encode('utf-8'))
+            self.parts = []
+
+    def text(self) -> str:
+        """Full text, or the first page once spilled"""
+        if self.spill is None:
+            return ''.join(self.parts)
+        page = self.spill.read_lines(0, self.store.page_lines, self.store.page_bytes)
+        return '\n'.join(page['lines'])
+
+class CommandOutput:
+    """stdout/stderr capture for one command run"""
+
+    STREAMS = ('stdout', 'stderr')
+
+    def __init__(self, store: "OutputStore", handle: str):
+        self.store = store
+        self.handle = handle
+        self.streams = {
+            name: StreamBuffer(store, os.path.join(store.directory, f"{handle}.{name}"))
+            for name in self.STREAMS
+        }
+
+    @property
+    def spilled(self) -> bool:
+        return any(buffer.spill is not None for buffer in self.streams.values())
+
+    def write(self, stream: str, text: str):
+        self.streams[stream].write(text)
+
+    def text(self, stream: str) -> str:
+        return self.streams[stream].text()
+
+    def close(self):
+        """Finish writing; spilled streams become readable through the store"""
+        spills = {name: buffer.spill for name, buffer in self.streams.items() if buffer.spill is not None}
+        for spill in spills.values():
+            spill.close()
+        if spills:
+            self.store._register(self.handle, spills)
+
+    def describe(self) -> Optional[Dict[str, Any]]:
+        """Handle metadata for the result payload, or None when nothing spilled"""
+        if not self.spilled:
+            return None
+        return self.store.describe(self.handle)
+
+class OutputStore:
+    """Registry of spilled command outputs
+
+    Outputs larger than ``spill_threshold`` characters are written to
+    ``directory`` instead of being held in memory; results then carry a handle
+    and only the first ``page_lines`` lines. The newest ``max_entries``
+    spilled outputs are kept, older files are deleted.
+
+    Each process spills into its own ``run-<pid>`` subdirectory of the
+    configured root, so backends sharing a root never touch each other's
+    files and nothing else in the root is ever deleted.
+    """
+
+    RUN_PREFIX = "run-"
+
+    def __init__(self,
+                 directory: Optional[str] = None,
+                 spill_threshold: Optional[int] = None,
+                 page_lines: Optional[int] = None,
+                 page_bytes: Optional[int] = None,
+                 max_entries: Optional[int] = None):
+        self.root = directory or os.getenv("OUTPUT_STORE_PATH", os.path.join("cache", "outputs"))
+        self.directory = os.path.join(self.root, f"{self.RUN_PREFIX}{os.getpid()}")
+        self.spill_threshold = spill_threshold or int(os.getenv("OUTPUT_SPILL_THRESHOLD", str(256 * 1024)))
+        self.page_lines = page_lines or int(os.getenv("OUTPUT_PAGE_LINES", "200"))
+        self.page_bytes = page_bytes or int(os.getenv("OUTPUT_PAGE_BYTES", str(256 * 1024)))
+        self.max_entries = max_entries or int(os.getenv("OUTPUT_STORE_MAX_ENTRIES", "50"))
+        self._entries: "OrderedDict[str, Dict[str, SpillFile]]" = OrderedDict()
+        self._prepared = False
+
+    def _prepare(self):
+        # Spill directories of runs that have exited have no handle pointing at them any more
+        for name in os.listdir(self.root) if os.path.isdir(self.root) else []:
+            pid = name[len(self.RUN_PREFIX):]
+            if name.startswith(self.RUN_PREFIX) and pid.isdigit() and (
+                    int(pid) == os.getpid() or not psutil.pid_exists(int(pid))):
+                shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+        os.makedirs(self.directory, exist_ok=True)
+        self._prepared = True
+
+    def capture(self) -> CommandOutput:
+        """Start capturing a new command's output"""
+        if not self._prepared:
+            self._prepare()
+        return CommandOutput(self, uuid.uuid4().hex)
+
+    def _register(self, handle: str, spills: Dict[str, SpillFile]):
+        self._entries[handle] = spills
+        while len(self._entries) > self.max_entries:
+            _, expired = self._entries.popitem(last=False)
+            for spill in expired.values():
+                spill.delete()
+        logger.info(f"Spilled command output {handle} to disk ({', '.join(spills)})")
+
+    def __contains__(self, handle: str) -> bool:
+        return handle in self._entries
+
+    def describe(self, handle: str) -> Dict[str, Any]:
+        spills = self._entries[handle]
+        return {
+            'handle': handle,
+            'page_lines': self.page_lines,
+            'streams': {
+                name: {'total_lines': spill.total_lines, 'total_bytes': spill.size}
+                for name, spill in spills.items()
+            }
+        }
+
+    async def read_lines(self, handle: str, stream: str = 'stdout', start: int = 0,
+                         count: Optional[int] = None) -> Dict[str, Any]:
+        """Fetch a line range of a spilled output; raises KeyError for unknown handles/streams"""
+        spill = self._entries[handle][stream]
+        count = min(count or self.page_lines, 10 * self.page_lines)
+        page = await asyncio.get_running_loop().run_in_executor(
+            None, spill.read_lines, start, count, self.page_bytes
+        )
+        return {'handle': handle, 'stream': stream, **page}
+
+    def discard(self, handle: str):
+        for spill in self._entries.pop(handle, {}).values():
+            spill.delete()
+
+    def close(self):
+        """Delete every spilled output of this process (call on application shutdown)"""
+        for handle in list(self._entries):
+            self.discard(handle)
+        if self._prepared:
+            shutil.rmtree(self.directory, ignore_errors=True)
+            self._prepared = False
+
+# Process-wide store shared by every command engine instance
+output_store = OutputStore()
@@ -0,0 +1,214 @@
+"""
+PROCESS ACCOUNTING - Resource Limits and Usage for Spawned Commands
+rlimit-confined process groups, per-command rusage and per-tool aggregates
+"""
+
+import asyncio
+import os
+import signal
+import subprocess
+import threading
+from typing import Any, Dict, List, Optional
+from utils.logger import setup_logger
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = setup_logger(__name__)
+
+class ResourceLimits:
+    """rlimits applied to every spawned command
+
+    Limits are per process and inherited by everything the command starts:
+    ``cpu`` seconds of CPU time (SIGXCPU, then SIGKILL 5 seconds later),
+    ``address_space`` bytes of virtual memory and ``open_files`` descriptors.
+    A value of 0 disables that limit; limits never exceed the backend's own
+    hard limits.
+
+    They are set by a ``ulimit`` preamble in the spawned shell rather than a
+    ``preexec_fn``: running Python code in the child forces a full fork of
+    the backend instead of vfork and doubles the cost of every spawn.
+    """
+
+    def __init__(self, cpu: Optional[int] = None, address_space: Optional[int] = None,
+                 open_files: Optional[int] = None):
+        self.cpu = cpu if cpu is not None else int(os.getenv("COMMAND_RLIMIT_CPU", "300"))
+        self.address_space = address_space if address_space is not None else int(
+            os.getenv("COMMAND_RLIMIT_AS", str(8 * 1024 ** 3))
+        )
+        self.open_files = open_files if open_files is not None else int(os.getenv("COMMAND_RLIMIT_NOFILE", "4096"))
+        self._settings = self._resolve()
+
+    def _resolve(self) -> List[tuple]:
+        """(ulimit flag, soft, hard) in ulimit units, clamped to the backend's hard limits"""
+        if resource is None:
+            return []
+        settings = []
+        for flag, limit, value, grace, unit in (("-t", resource.RLIMIT_CPU, self.cpu, 5, 1),
+                                                ("-v", resource.RLIMIT_AS, self.address_space, 0, 1024),
+                                                ("-n", resource.RLIMIT_NOFILE, self.open_files, 0, 1)):
+            if value <= 0:
+                continue
+            _, current_hard = resource.getrlimit(limit)
+            hard = value + grace
+            if current_hard != resource.RLIM_INFINITY:
+                hard = min(hard, current_hard)
+            settings.append((flag, min(value, hard) // unit, hard // unit))
+        return settings
+
+    def shell_preamble(self) -> str:
+        """Shell line that applies the limits to the shell and everything it runs"""
+        if not self._settings:
+            return ""
+        hard = " ".join(f"{flag} {value}" for flag, _, value in self._settings)
+        soft = " ".join(f"{flag} {value}" for flag, value, _ in self._settings)
+        # Soft first: a hard limit cannot drop below the current soft limit
+        return f"ulimit -S {soft} 2>/dev/null; ulimit -H {hard} 2>/dev/null\n"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "cpu_seconds": self.cpu or None,
+            "address_space_bytes": self.address_space or None,
+            "open_files": self.open_files or None,
+            "enforced": bool(self._settings)
+        }
+
+def usage_to_dict(usage) -> Dict[str, Any]:
+    """The fields of a ``resource.struct_rusage`` worth reporting"""
+    return {
+        "user_cpu": usage.ru_utime,
+        "system_cpu": usage.ru_stime,
+        "max_rss_kb": usage.ru_maxrss,
+        "block_input": usage.ru_inblock,
+        "block_output": usage.ru_oublock,
+        "voluntary_context_switches": usage.ru_nvcsw,
+        "involuntary_context_switches": usage.ru_nivcsw
+    }
+
+class AccountedProcess:
+    """A spawned command whose exit status is collected with ``os.wait4``
+
+    asyncio's child watcher reaps processes itself and discards their rusage,
+    so commands are started with ``subprocess.Popen`` instead: the pipes are
+    attached to the event loop as stream readers and the process is reaped
+    here once a pidfd (or, where pidfds are unavailable, a waiter thread)
+    reports its exit. Exposes the parts of ``asyncio.subprocess.Process`` the
+    engine uses. The rusage covers the shell and every descendant it waited
+    for.
+    """
+
+    def __init__(self, popen: subprocess.Popen, stdout: asyncio.StreamReader, stderr: asyncio.StreamReader):
+        self._popen = popen
+        self.pid = popen.pid
+        self.stdout = stdout
+        self.stderr = stderr
+        self.returncode: Optional[int] = None
+        self.usage: Optional[Dict[str, Any]] = None
+        self._exited = asyncio.get_running_loop().create_future()
+        self._watch()
+
+    @classmethod
+    async def spawn(cls, command: str, limits: ResourceLimits) -> "AccountedProcess":
+        """Run ``command`` with ``bash -c`` under ``limits``"""
+        popen = subprocess.Popen(
+            ["bash", "-c", limits.shell_preamble() + command],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            # Own process group, so a kill reaches the tool and not just the shell
+            start_new_session=True
+        )
+        loop = asyncio.get_running_loop()
+        readers = []
+        for pipe in (popen.stdout, popen.stderr):
+            reader = asyncio.StreamReader(limit=2 ** 20, loop=loop)
+            await loop.connect_read_pipe(lambda reader=reader: asyncio.StreamReaderProtocol(reader, loop=loop), pipe)
+            readers.append(reader)
+        return cls(popen, *readers)
+
+    def _watch(self):
+        loop = asyncio.get_running_loop()
+        try:
+            pidfd = os.pidfd_open(self.pid)
+        except (AttributeError, OSError):
+            threading.Thread(target=self._wait_blocking, args=(loop,), name=f"wait-{self.pid}", daemon=True).start()
+            return
+
+        def on_exit():
+            loop.remove_reader(pidfd)
+            os.close(pidfd)
+            self._reap(os.wait4(self.pid, 0))
+
+        loop.add_reader(pidfd, on_exit)
+
+    def _wait_blocking(self, loop: asyncio.AbstractEventLoop):
+        status = os.wait4(self.pid, 0)
+        loop.call_soon_threadsafe(self._reap, status)
+
+    def _reap(self, status: tuple):
+        _, wait_status, usage = status
+        self.returncode = os.waitstatus_to_exitcode(wait_status)
+        self.usage = usage_to_dict(usage)
+        # Already reaped: stop Popen from ever waiting on (a possibly reused) pid
+        self._popen.returncode = self.returncode
+        if not self._exited.done():
+            self._exited.set_result(self.returncode)
+
+    async def wait(self) -> int:
+        return await asyncio.shield(self._exited)
+
+    def kill(self):
+        os.killpg(self.pid, signal.SIGKILL)
+
+class ResourceStats:
+    """Resource usage aggregated per tool, for capacity planning"""
+
+    FIELDS = ("user_cpu", "system_cpu", "block_input", "block_output",
+              "voluntary_context_switches", "involuntary_context_switches")
+
+    def __init__(self):
+        self.tools: Dict[str, Dict[str, Any]] = {}
+
+    def record(self, tool: Optional[str], usage: Optional[Dict[str, Any]], wall_time: float, signal_name: Optional[str] = None):
+        if usage is None:
+            return
+        stats = self.tools.get(tool or "unknown")
+        if stats is None:
+            stats = self.tools[tool or "unknown"] = {
+                "commands": 0, "wall_time": 0.0, "max_rss_kb": 0, "mean_max_rss_kb": 0.0,
+                "killed_by_signal": {}, **{field: 0 for field in self.FIELDS}
+            }
+        stats["commands"] += 1
+        stats["wall_time"] += wall_time
+        for field in self.FIELDS:
+            stats[field] += usage[field]
+        stats["max_rss_kb"] = max(stats["max_rss_kb"], usage["max_rss_kb"])
+        stats["mean_max_rss_kb"] += (usage["max_rss_kb"] - stats["mean_max_rss_kb"]) / stats["commands"]
+        if signal_name:
+            stats["killed_by_signal"][signal_name] = stats["killed_by_signal"].get(signal_name, 0) + 1
+
+    def summary(self) -> Dict[str, Any]:
+        tools = {}
+        for tool, stats in self.tools.items():
+            cpu = stats["user_cpu"] + stats["system_cpu"]
+            tools[tool] = {
+                **stats,
+                "killed_by_signal": dict(stats["killed_by_signal"]),
+                "mean_cpu": cpu / stats["commands"],
+                "cpu_utilization": cpu / stats["wall_time"] if stats["wall_time"] else 0.0
+            }
+        return tools
+
+def signal_name(return_code: Optional[int]) -> Optional[str]:
+    """Name of the signal that ended a process (negative return codes), if any"""
+    if return_code is None or return_code >= 0:
+        return None
+    try:
+        return signal.Signals(-return_code).name
+    except ValueError:
+        return f"SIG{-return_code}"
+
+# Process-wide limits and statistics shared by every command engine instance
+resource_limits = ResourceLimits()
+resource_stats = ResourceStats()
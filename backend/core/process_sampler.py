@@ -0,0 +1,185 @@
+"""
+PROCESS SAMPLER - Cached Process Table
+Background sampler keeping psutil handles alive so CPU percentages are real deltas
+"""
+
+import heapq
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+import psutil
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+class ProcessSampler:
+    """Periodically samples the process table on a daemon thread
+
+    ``psutil.Process`` handles are kept from one tick to the next, so each
+    ``cpu_percent()`` reading is the usage since the previous tick instead of
+    the meaningless 0.0 a fresh handle returns. Only the ``top_n`` busiest
+    processes are kept in the snapshot, selected with a heap rather than a
+    full sort. Readers get the cached snapshot; ``kill`` and ``refresh`` work
+    on individual cached handles and never rescan the table.
+    """
+
+    MIN_CPU_WINDOW = 0.5  # seconds
+
+    def __init__(self, interval: Optional[float] = None, top_n: Optional[int] = None):
+        self.interval = interval or float(os.getenv("PROCESS_SAMPLE_INTERVAL", "2"))
+        self.top_n = top_n or int(os.getenv("PROCESS_TOP_N", "20"))
+        self._handles: Dict[int, psutil.Process] = {}
+        self._names: Dict[int, str] = {}
+        self._rows: Dict[int, Dict[str, Any]] = {}  # pid -> row, for the current top N
+        self._top: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {"ticks": 0, "tracked": 0, "last_tick_ms": 0.0, "sampled_at": None}
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.running:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._sampler_loop, name="process-sampler", daemon=True)
+        self._thread.start()
+        logger.info(f"Process sampler started ({self.interval}s interval, top {self.top_n})")
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
+            self._thread = None
+
+    def wait_ready(self, timeout: float) -> bool:
+        """Block until the first real snapshot exists"""
+        return self._ready.wait(timeout)
+
+    def _sampler_loop(self):
+        # The priming pass only establishes CPU baselines; publish from the second tick
+        self._sample()
+        self._stop_event.wait(min(1.0, self.interval))
+        while not self._stop_event.is_set():
+            try:
+                self._sample()
+                self._ready.set()
+            except Exception as e:
+                logger.error(f"Process sampling error: {str(e)}")
+            self._stop_event.wait(self.interval)
+
+    def _sample(self):
+        started = time.perf_counter()
+        pids = set(psutil.pids())
+
+        for pid in self._handles.keys() - pids:
+            self._handles.pop(pid, None)
+            self._names.pop(pid, None)
+        for pid in pids - self._handles.keys():
+            try:
+                handle = psutil.Process(pid)
+                handle.cpu_percent(None)  # baseline for the next tick
+                self._handles[pid] = handle
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                pass
+
+        rows = []
+        for pid, handle in list(self._handles.items()):
+            row = self._read(pid, handle)
+            if row is not None:
+                rows.append(row)
+
+        top = heapq.nlargest(self.top_n, rows, key=lambda row: row['cpu_percent'])
+        with self._lock:
+            self._top = top
+            self._rows = {row['pid']: row for row in top}
+            self.stats["ticks"] += 1
+            self.stats["tracked"] = len(self._handles)
+            self.stats["last_tick_ms"] = (time.perf_counter() - started) * 1000
+            self.stats["sampled_at"] = time.time()
+
+    def _read(self, pid: int, handle: psutil.Process) -> Optional[Dict[str, Any]]:
+        """One process's row from its cached handle; drops handles of vanished processes"""
+        try:
+            with handle.oneshot():
+                name = self._names.get(pid)
+                if name is None:
+                    name = self._names[pid] = handle.name()
+                return {
+                    'pid': pid,
+                    'name': name,
+                    'cpu_percent': handle.cpu_percent(None),
+                    'memory_percent': handle.memory_percent()
+                }
+        except psutil.NoSuchProcess:
+            self._handles.pop(pid, None)
+            self._names.pop(pid, None)
+        except psutil.AccessDenied:
+            pass
+        return None
+
+    def snapshot(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Busiest processes from the last tick, highest CPU first"""
+        with self._lock:
+            return [dict(row) for row in self._top[:limit or self.top_n]]
+
+    def refresh(self, pids: Iterable[int]) -> List[Dict[str, Any]]:
+        """Re-read only the given processes and update their cached rows"""
+        refreshed = []
+        for pid in pids:
+            handle = self._handles.get(pid)
+            if handle is None:
+                try:
+                    handle = psutil.Process(pid)
+                except (psutil.NoSuchProcess, psutil.AccessDenied):
+                    self._forget(pid)
+                    continue
+                handle.cpu_percent(None)
+                self._handles[pid] = handle
+            row = self._read(pid, handle)
+            if row is None:
+                self._forget(pid)
+                continue
+            with self._lock:
+                cached = self._rows.get(pid)
+                if cached is not None:
+                    # Right after a tick the CPU window is too short to mean anything
+                    if time.time() - self.stats["sampled_at"] < self.MIN_CPU_WINDOW:
+                        row['cpu_percent'] = cached['cpu_percent']
+                    cached.update(row)
+                    self._top.sort(key=lambda entry: -entry['cpu_percent'])
+            refreshed.append(row)
+        return refreshed
+
+    def kill(self, pid: int) -> bool:
+        """Terminate a process through its cached handle and drop it from the snapshot
+
+        The cached handle also guards against the pid having been reused by
+        another process since it was sampled.
+        """
+        handle = self._handles.get(pid)
+        try:
+            (handle or psutil.Process(pid)).terminate()
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            return False
+        self._forget(pid)
+        return True
+
+    def _forget(self, pid: int):
+        self._handles.pop(pid, None)
+        self._names.pop(pid, None)
+        with self._lock:
+            if self._rows.pop(pid, None) is not None:
+                self._top = [row for row in self._top if row['pid'] != pid]
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.stats, "interval": self.interval, "top_n": self.top_n, "running": self.running}
+
+# Process-wide sampler shared by every command engine instance
+process_sampler = ProcessSampler()
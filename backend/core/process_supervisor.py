@@ -0,0 +1,180 @@
+"""
+PROCESS SUPERVISOR - Admission Control for Spawned Commands
+Global concurrency budget with priority classes and a bounded wait queue
+"""
+
+import asyncio
+import heapq
+import itertools
+import os
+from enum import Enum
+from typing import Any, Dict, List, Optional, Tuple
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+class CommandPriority(Enum):
+    INTERACTIVE = "interactive"
+    WORKFLOW = "workflow"
+    BACKGROUND = "background"
+
+    @property
+    def rank(self) -> int:
+        """Lower ranks are admitted first"""
+        return _PRIORITY_RANKS[self]
+
+    @classmethod
+    def parse(cls, value: Any, default: "CommandPriority") -> "CommandPriority":
+        """Accept an enum member or its string value, falling back to ``default``"""
+        if isinstance(value, cls):
+            return value
+        try:
+            return cls(str(value).lower())
+        except ValueError:
+            return default
+
+_PRIORITY_RANKS = {
+    CommandPriority.INTERACTIVE: 0,
+    CommandPriority.WORKFLOW: 1,
+    CommandPriority.BACKGROUND: 2
+}
+
+class AdmissionRejected(Exception):
+    """Raised when the wait queue is full or a queued command is displaced"""
+
+    def __init__(self, message: str, queue_depth: int):
+        super().__init__(message)
+        self.queue_depth = queue_depth
+
+class Admission:
+    """One command's claim on a process slot
+
+    Either granted immediately or parked in the supervisor's queue; ``wait()``
+    returns once a slot is held and ``release()`` must always follow.
+    """
+
+    def __init__(self, supervisor: "ProcessSupervisor", priority: CommandPriority, queue_depth: int):
+        self.supervisor = supervisor
+        self.priority = priority
+        self.queue_depth = queue_depth  # commands already waiting when this one arrived
+        self.wait_time = 0.0
+        self._future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._enqueued_at = asyncio.get_running_loop().time()
+        self._released = False
+
+    @property
+    def granted(self) -> bool:
+        return self._future.done() and not self._future.cancelled() and self._future.exception() is None
+
+    async def wait(self):
+        """Block until a slot is granted; raises AdmissionRejected if displaced"""
+        try:
+            await self._future
+        finally:
+            self.wait_time = asyncio.get_running_loop().time() - self._enqueued_at
+
+    def release(self):
+        """Give the slot back (or leave the queue if never admitted)"""
+        if self._released:
+            return
+        self._released = True
+        self.supervisor._release(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "priority": self.priority.value,
+            "queue_depth": self.queue_depth,
+            "queue_wait": self.wait_time
+        }
+
+class ProcessSupervisor:
+    """Bounds how many commands run at once across all engines
+
+    Up to ``max_concurrent`` commands hold a slot; further requests wait in a
+    priority queue (interactive before workflow before background, FIFO
+    within a class) of at most ``max_queue`` entries. When the queue is full
+    a new request is rejected, unless it outranks the lowest-priority waiter,
+    which is then rejected in its place.
+    """
+
+    def __init__(self, max_concurrent: Optional[int] = None, max_queue: Optional[int] = None):
+        self.max_concurrent = max_concurrent or int(
+            os.getenv("COMMAND_MAX_CONCURRENT", str(max(4, 2 * (os.cpu_count() or 2))))
+        )
+        self.max_queue = max_queue if max_queue is not None else int(os.getenv("COMMAND_MAX_QUEUE", "32"))
+        self.running = 0
+        self._queue: List[Tuple[int, int, Admission]] = []
+        self._sequence = itertools.count()
+        self.stats = {"admitted": 0, "queued": 0, "rejected": 0, "displaced": 0, "total_wait": 0.0}
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    def request(self, priority: CommandPriority = CommandPriority.INTERACTIVE) -> Admission:
+        """Claim a slot, queueing if the budget is spent; raises AdmissionRejected when full"""
+        admission = Admission(self, priority, self.queue_depth)
+
+        if self.running < self.max_concurrent and not self._queue:
+            self._grant(admission)
+            return admission
+
+        if self.queue_depth >= self.max_queue:
+            lowest = max(self._queue) if self._queue else None
+            if lowest is None or lowest[0] <= priority.rank:
+                self.stats["rejected"] += 1
+                raise AdmissionRejected(
+                    f"Command queue is full ({self.queue_depth} waiting, {self.running} running)",
+                    self.queue_depth
+                )
+            self._displace(lowest)
+
+        heapq.heappush(self._queue, (priority.rank, next(self._sequence), admission))
+        self.stats["queued"] += 1
+        logger.info(f"Command queued at {priority.value} priority, {self.queue_depth} waiting")
+        return admission
+
+    def _grant(self, admission: Admission):
+        self.running += 1
+        self.stats["admitted"] += 1
+        admission._future.set_result(True)
+
+    def _displace(self, entry: Tuple[int, int, Admission]):
+        self._queue.remove(entry)
+        heapq.heapify(self._queue)
+        self.stats["displaced"] += 1
+        self.stats["rejected"] += 1
+        entry[2]._future.set_exception(AdmissionRejected(
+            "Command displaced from the queue by higher-priority work", self.queue_depth
+        ))
+
+    def _release(self, admission: Admission):
+        if admission.granted:
+            self.running -= 1
+            self.stats["total_wait"] += admission.wait_time
+        else:
+            # Cancelled or rejected while waiting: drop any queue entry
+            self._queue = [entry for entry in self._queue if entry[2] is not admission]
+            heapq.heapify(self._queue)
+            if not admission._future.done():
+                admission._future.cancel()
+
+        while self._queue and self.running < self.max_concurrent:
+            _, _, waiter = heapq.heappop(self._queue)
+            self._grant(waiter)
+
+    def status(self) -> Dict[str, Any]:
+        waiting = {priority.value: 0 for priority in CommandPriority}
+        for _, _, admission in self._queue:
+            waiting[admission.priority.value] += 1
+        return {
+            **self.stats,
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "running": self.running,
+            "queue_depth": self.queue_depth,
+            "waiting": waiting
+        }
+
+# Process-wide budget shared by every command engine instance
+process_supervisor = ProcessSupervisor()
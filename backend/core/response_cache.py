@@ -0,0 +1,183 @@
+"""
+KALI AI TERMINAL - AI Response Cache
+Two-tier (memory LRU + on-disk SQLite) cache for provider completions
+"""
+
+import asyncio
+import copy
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+class LLMResponseCache:
+    """Caches AI provider responses keyed by provider, model and normalized prompt
+
+    Lookups hit an in-process LRU first and fall back to a SQLite store that
+    survives restarts. Both tiers honour the same TTL and are bounded in size;
+    the least recently used entries are evicted first. Callers get their own
+    copy of a cached response, so mutating it never changes the cache.
+    """
+
+    def __init__(self,
+                 path: Optional[str] = None,
+                 ttl: Optional[float] = None,
+                 memory_entries: Optional[int] = None,
+                 disk_entries: Optional[int] = None):
+        self.path = path or os.getenv("AI_CACHE_PATH", os.path.join("cache", "ai_responses.db"))
+        self.ttl = ttl if ttl is not None else float(os.getenv("AI_CACHE_TTL", "86400"))
+        self.memory_entries = memory_entries or int(os.getenv("AI_CACHE_MEMORY_ENTRIES", "1024"))
+        self.disk_entries = disk_entries or int(os.getenv("AI_CACHE_DISK_ENTRIES", "10000"))
+
+        self._memory: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._db_lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._opened = False
+        self.counters = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0
+        }
+
+    def _open_store(self):
+        """Open (and create) the on-disk tier; the cache degrades to memory-only on failure"""
+        self._opened = True
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)")
+            self._db.commit()
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f"AI response cache store unavailable, using memory only: {e}")
+            self._db = None
+
+    @staticmethod
+    def make_key(provider: str, model: Optional[str], prompt: str) -> str:
+        """Hash of provider, model and the prompt with whitespace runs collapsed"""
+        normalized = re.sub(r"\s+", " ", prompt).strip()
+        return hashlib.sha256(f"{provider}\0{model or ''}\0{normalized}".encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return a cached response, or None on a miss or expired entry"""
+        now = time.time()
+        entry = self._memory.get(key)
+        if entry is not None:
+            created_at, response = entry
+            if now - created_at <= self.ttl:
+                self._memory.move_to_end(key)
+                self.counters["memory_hits"] += 1
+                return copy.deepcopy(response)
+            del self._memory[key]
+
+        if not self._opened:
+            self._open_store()
+        if self._db is not None:
+            row = await asyncio.get_running_loop().run_in_executor(None, self._disk_get, key, now)
+            if row is not None:
+                created_at, response = row
+                self._remember(key, created_at, response)
+                self.counters["disk_hits"] += 1
+                return copy.deepcopy(response)
+
+        self.counters["misses"] += 1
+        return None
+
+    async def set(self, key: str, response: Dict[str, Any]):
+        """Store a response in both tiers"""
+        now = time.time()
+        self._remember(key, now, copy.deepcopy(response))
+        self.counters["stores"] += 1
+        if not self._opened:
+            self._open_store()
+        if self._db is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self._disk_set, key, response, now)
+
+    def _remember(self, key: str, created_at: float, response: Dict[str, Any]):
+        self._memory[key] = (created_at, response)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    def _disk_get(self, key: str, now: float) -> Optional[Tuple[float, Dict[str, Any]]]:
+        with self._db_lock:
+            try:
+                row = self._db.execute(
+                    "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    return None
+                if now - row[1] > self.ttl:
+                    self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._db.commit()
+                    return None
+                self._db.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+                self._db.commit()
+                return row[1], json.loads(row[0])
+            except (sqlite3.Error, ValueError) as e:
+                logger.warning(f"AI response cache read failed: {e}")
+                return None
+
+    def _disk_set(self, key: str, response: Dict[str, Any], now: float):
+        with self._db_lock:
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, response, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(response), now, now)
+                )
+                # Drop expired rows, then the least recently used beyond the size bound
+                self._db.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl,))
+                evicted = self._db.execute(
+                    "DELETE FROM responses WHERE key IN ("
+                    "SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                    (self.disk_entries,)
+                ).rowcount
+                self._db.commit()
+                self.counters["evictions"] += max(evicted, 0)
+            except sqlite3.Error as e:
+                logger.warning(f"AI response cache write failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and tier sizes"""
+        lookups = self.counters["memory_hits"] + self.counters["disk_hits"] + self.counters["misses"]
+        hits = self.counters["memory_hits"] + self.counters["disk_hits"]
+        disk_size = None
+        if self._db is not None:
+            with self._db_lock:
+                disk_size = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {
+            **self.counters,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "memory_size": len(self._memory),
+            "disk_size": disk_size,
+            "ttl": self.ttl
+        }
+
+    def close(self):
+        if self._db is not None:
+            with self._db_lock:
+                self._db.close()
+            self._db = None
+
+# Process-wide cache shared by every AI agent (None when AI_CACHE_ENABLED is off)
+response_cache: Optional[LLMResponseCache] = (
+    LLMResponseCache() if os.getenv("AI_CACHE_ENABLED", "true").lower() in ("1", "true", "yes") else None
+)
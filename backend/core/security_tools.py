@@ -7,6 +7,9 @@ import asyncio
 import subprocess
 import json
 import os
+import re
+import shutil
+import signal
 from datetime import datetime
 from typing import Dict, List, Optional, AsyncGenerator
 import logging
@@ -50,6 +53,231 @@ class InteractiveSessionManager:
             await self.process.wait()
 
 
+class PromptFramedSession(InteractiveSessionManager):
+    """Interactive session whose command output is delimited by the tool's prompt"""
+
+    ANSI_ESCAPE = re.compile(rb"\x1b\[[0-9;?]*[A-Za-z]")
+    MAX_ESCAPE_LENGTH = 32
+    MAX_PROMPT_LINE = 4096  # how far back into an unterminated line a prompt is looked for
+
+    def __init__(self, command: List[str], prompt_pattern: "re.Pattern"):
+        super().__init__(command)
+        self.prompt_pattern = prompt_pattern
+        self.commands_run = 0
+        self.started_at: Optional[datetime] = None
+
+    @property
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.returncode is None
+
+    async def start_session(self, timeout: float = 120.0):
+        """Start the tool in its own process group and wait for its first prompt"""
+        self.process = await asyncio.create_subprocess_exec(
+            *self.command,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT,
+            start_new_session=os.name != 'nt'
+        )
+        self.started_at = datetime.now()
+        await self.read_until_prompt(timeout)
+
+    async def close_session(self, timeout: float = 5.0):
+        """Kill the tool and everything it spawned"""
+        if not self.process:
+            return
+        try:
+            if os.name != 'nt':
+                os.killpg(self.process.pid, signal.SIGKILL)
+            else:
+                self.process.kill()
+        except ProcessLookupError:
+            pass
+        try:
+            await asyncio.wait_for(self.process.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Session process {self.process.pid} did not exit after kill")
+
+    async def read_until_prompt(self, timeout: float) -> str:
+        """Read output until the buffer ends with the prompt; returns the text before it
+
+        Each read is stripped of ANSI escapes once, and the prompt is looked
+        for only from the start of the line the read continued, so long
+        outputs are scanned in linear time.
+        """
+        clean = bytearray()
+        pending = b""  # an escape sequence split by the read boundary
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise asyncio.TimeoutError()
+            data = await asyncio.wait_for(self.process.stdout.read(65536), remaining)
+            if not data:
+                raise ConnectionError("Session exited before showing a prompt")
+            data = pending + data
+            escape = data.rfind(b"\x1b")
+            if escape != -1 and len(data) - escape < self.MAX_ESCAPE_LENGTH and not self.ANSI_ESCAPE.match(data, escape):
+                data, pending = data[:escape], data[escape:]
+            else:
+                pending = b""
+            window = max(len(clean) - self.MAX_PROMPT_LINE, 0)
+            scan_from = clean.rfind(b"\n", window) + 1 or window
+            clean += self.ANSI_ESCAPE.sub(b"", data)
+            match = self.prompt_pattern.search(clean, scan_from)
+            if match:
+                return clean[:match.start()].decode("utf-8", errors="ignore")
+
+    async def execute(self, command: str, timeout: float) -> str:
+        """Run one command and return the output framed by the next prompt"""
+        await self.send_command(command)
+        output = await self.read_until_prompt(timeout)
+        self.commands_run += 1
+        return output
+
+
+class MetasploitSessionPool:
+    """Pool of pre-started msfconsole sessions
+
+    Booting the framework takes tens of seconds, so ``size`` consoles are
+    kept warm and commands are dispatched to an idle one. A session is
+    replaced after ``max_commands`` commands, or as soon as it dies or a
+    command times out and leaves it in an unknown state.
+    """
+
+    PROMPT_PATTERN = re.compile(rb"msf\d*(?: [^\n>]*)? > ?$")
+
+    def __init__(self, size: Optional[int] = None, max_commands: Optional[int] = None,
+                 command: Optional[List[str]] = None, prompt_pattern: Optional["re.Pattern"] = None):
+        self.size = size or int(os.getenv("MSF_POOL_SIZE", "2"))
+        self.max_commands = max_commands or int(os.getenv("MSF_SESSION_MAX_COMMANDS", "50"))
+        self.command = command or ["msfconsole", "-q"]
+        self.prompt_pattern = prompt_pattern or self.PROMPT_PATTERN
+        self._idle: Optional[asyncio.Queue] = None
+        self._spawning: set = set()
+        self._sessions: List[PromptFramedSession] = []
+        self.stats = {"commands": 0, "sessions_started": 0, "sessions_recycled": 0, "sessions_failed": 0}
+
+    @property
+    def started(self) -> bool:
+        return self._idle is not None
+
+    def start(self):
+        """Begin warming ``size`` sessions in the background"""
+        if self.started:
+            return
+        self._idle = asyncio.Queue()
+        for _ in range(self.size):
+            self._spawn()
+
+    def _spawn(self):
+        task = asyncio.create_task(self._start_session())
+        self._spawning.add(task)
+        task.add_done_callback(self._spawning.discard)
+
+    async def _start_session(self):
+        session = PromptFramedSession(self.command, self.prompt_pattern)
+        try:
+            await session.start_session()
+        except asyncio.CancelledError:
+            await self._discard(session)
+            raise
+        except Exception as e:
+            self.stats["sessions_failed"] += 1
+            logger.error(f"Failed to start msfconsole session: {str(e) or type(e).__name__}")
+            await self._discard(session)
+            return
+        self.stats["sessions_started"] += 1
+        self._sessions.append(session)
+        await self._idle.put(session)
+
+    async def _discard(self, session: PromptFramedSession):
+        if session in self._sessions:
+            self._sessions.remove(session)
+        if session.process is not None:
+            await session.close_session()
+
+    async def execute(self, command: str, timeout: float = 300.0, acquire_timeout: float = 180.0) -> Dict:
+        """Run a command on an idle warm session"""
+        self.start()
+        if not self._sessions and not self._spawning and self._idle.empty():
+            # Every session failed to boot; try to restore the pool
+            for _ in range(self.size):
+                self._spawn()
+
+        loop = asyncio.get_running_loop()
+        wait_start = loop.time()
+        try:
+            session = await asyncio.wait_for(self._idle.get(), acquire_timeout)
+        except asyncio.TimeoutError:
+            return {
+                "success": False,
+                "output": "",
+                "error": f"No msfconsole session became available within {acquire_timeout:g}s",
+                "dispatch_time": loop.time() - wait_start
+            }
+        dispatch_time = loop.time() - wait_start
+
+        if not session.is_alive:
+            await self._discard(session)
+            self._spawn()
+            return await self.execute(command, timeout, max(acquire_timeout - dispatch_time, 1.0))
+
+        # Only a command that ran to its prompt leaves the console reusable; a
+        # failed or cancelled one may still be running on it
+        healthy = False
+        try:
+            output = await session.execute(command, timeout)
+            healthy = True
+            return {
+                "success": True,
+                "output": output,
+                "error": "",
+                "dispatch_time": dispatch_time,
+                "session_commands": session.commands_run
+            }
+        except Exception as e:
+            return {
+                "success": False,
+                "output": "",
+                "error": f"msfconsole session error: {str(e) or type(e).__name__}",
+                "dispatch_time": dispatch_time
+            }
+        finally:
+            self.stats["commands"] += 1
+            if healthy and session.is_alive and session.commands_run < self.max_commands:
+                self._idle.put_nowait(session)
+            else:
+                if healthy:
+                    self.stats["sessions_recycled"] += 1
+                await self._discard(session)
+                self._spawn()
+
+    def status(self) -> Dict:
+        return {
+            **self.stats,
+            "size": self.size,
+            "max_commands": self.max_commands,
+            "idle": self._idle.qsize() if self._idle else 0,
+            "alive": sum(1 for session in self._sessions if session.is_alive),
+            "starting": len(self._spawning)
+        }
+
+    async def close(self):
+        spawning = list(self._spawning)
+        for task in spawning:
+            task.cancel()
+        await asyncio.gather(*spawning, return_exceptions=True)
+        for session in list(self._sessions):
+            await self._discard(session)
+        self._idle = None
+
+
+# Process-wide pool shared by every SecurityToolManager, so consoles are warmed and closed once
+msf_pool: Optional[MetasploitSessionPool] = MetasploitSessionPool() if shutil.which('msfconsole') else None
+
+
 class MetasploitController:
     """Metasploit framework controller"""
     
@@ -83,6 +311,7 @@ class SecurityToolManager:
             # Other tools can be added here
         }
         self.tool_status = {}
+        self.msf_pool = msf_pool
         self._initialize_tools()
     
     def _initialize_tools(self):
@@ -131,6 +360,18 @@ class SecurityToolManager:
         if tool_name in self.tools and hasattr(self.tools[tool_name], "close_session"):
             await self.tools[tool_name].close_session()
     
+    def warm_up(self):
+        """Start pre-booting pooled tool sessions (call once the event loop is running)"""
+        if self.msf_pool:
+            self.msf_pool.start()
+
+    async def shutdown(self):
+        """Close pooled and interactive tool sessions"""
+        if self.msf_pool:
+            await self.msf_pool.close()
+        for tool_name in self.tools:
+            await self.close_interactive_session(tool_name)
+
     # Legacy compatibility methods for workflow engine
     async def run_nmap_scan(self, target: str, scan_type: str = "basic") -> Dict:
         """Run nmap scan (legacy compatibility)"""
@@ -186,7 +427,10 @@ class SecurityToolManager:
             }
     
     async def run_metasploit_command(self, command: str) -> Dict:
-        """Run metasploit command (legacy compatibility)"""
+        """Run metasploit command on a warm pooled console, or a one-shot msfconsole without one"""
+        if self.msf_pool:
+            return await self.msf_pool.execute(command)
+        
         try:
             full_command = f"msfconsole -q -x '{command}; exit'"
             
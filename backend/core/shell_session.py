@@ -0,0 +1,301 @@
+"""
+SHELL SESSION - Persistent PTY Shell Sessions
+One long-lived shell per client; commands are framed with unique sentinels
+"""
+
+import asyncio
+import codecs
+import os
+import re
+import shlex
+import signal
+import struct
+import tempfile
+import time
+import uuid
+from typing import AsyncGenerator, Dict, Optional, Tuple, Union
+from utils.logger import setup_logger
+from .process_accounting import resource_limits
+
+try:
+    import fcntl
+    import pty
+    import termios
+except ImportError:  # Windows
+    pty = None
+
+logger = setup_logger(__name__)
+
+def _claim_terminal():
+    """Child side: make the PTY (already on stdin) the session's controlling terminal"""
+    fcntl.ioctl(0, termios.TIOCSCTTY, 0)
+
+class ShellSession:
+    """A bash process on a pseudo-terminal that runs commands one after another
+
+    Commands are written to the PTY as ``{ command\\n} </dev/null`` followed by
+    a ``printf`` of a per-command token and ``$?``, so running a command costs
+    one write instead of a fork/exec of a new shell, and cwd, environment and
+    shell variables carry over between commands. The marker is assembled by
+    ``printf`` at run time, so it can only appear in the output once the
+    command has finished. Echo is switched off and the prompts are empty, so
+    the PTY carries nothing but command output (stdout and stderr merged).
+
+    The terminal cuts input lines at 4095 bytes, so a command with a line
+    longer than ``MAX_INPUT_LINE`` is written to a temporary script and
+    sourced instead.
+    """
+
+    MARKER_PREFIX = b"\n__KALI_"
+    MAX_INPUT_LINE = 4000  # the line discipline keeps at most 4095 bytes of a line
+    SETUP = "stty -echo -onlcr 2>/dev/null; PS1=''; PS2=''; unset PROMPT_COMMAND; set +o history"
+
+    def __init__(self, shell: Optional[str] = None, columns: int = 250):
+        self.shell = shell or os.getenv("SHELL_SESSION_SHELL", "/bin/bash")
+        self.columns = columns
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.master_fd: Optional[int] = None
+        self.lock = asyncio.Lock()  # one command at a time per shell
+        self.commands_run = 0
+        self.started_at: Optional[float] = None
+        self.last_used: Optional[float] = None
+        self._buffer = bytearray()
+        self._readable = asyncio.Event()
+        self._eof = False
+        self._dirty = False  # a command was interrupted; resync before the next one
+
+    @property
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.returncode is None and not self._eof
+
+    async def start(self, timeout: float = 10.0):
+        master_fd, slave_fd = pty.openpty()
+        # Wide terminal so tools do not wrap their output
+        fcntl.ioctl(slave_fd, termios.TIOCSWINSZ, struct.pack("HHHH", 50, self.columns, 0, 0))
+        try:
+            self.process = await asyncio.create_subprocess_exec(
+                self.shell, "--noprofile", "--norc", "--noediting", "-i",
+                stdin=slave_fd, stdout=slave_fd, stderr=slave_fd,
+                start_new_session=True,
+                preexec_fn=_claim_terminal,
+                env={**os.environ, "TERM": "dumb", "PS1": "", "PS2": ""}
+            )
+        finally:
+            os.close(slave_fd)
+        self.master_fd = master_fd
+        os.set_blocking(master_fd, False)
+        asyncio.get_running_loop().add_reader(master_fd, self._on_readable)
+        self.started_at = time.time()
+        await self._sync(timeout, resource_limits.shell_preamble() + self.SETUP)
+        logger.info(f"Started shell session (pid {self.process.pid})")
+
+    def _on_readable(self):
+        try:
+            data = os.read(self.master_fd, 65536)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""  # EIO once the shell has exited
+        if data:
+            self._buffer += data
+        else:
+            self._eof = True
+            asyncio.get_running_loop().remove_reader(self.master_fd)
+        self._readable.set()
+
+    async def _read(self, deadline: float) -> bytes:
+        """Next block of output; b"" at end of file, TimeoutError past ``deadline``"""
+        loop = asyncio.get_running_loop()
+        while not self._buffer and not self._eof:
+            self._readable.clear()
+            await asyncio.wait_for(self._readable.wait(), max(deadline - loop.time(), 0))
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+    async def _write(self, text: str):
+        data = memoryview(text.encode("utf-8"))
+        loop = asyncio.get_running_loop()
+        while data:
+            try:
+                written = os.write(self.master_fd, data)
+            except BlockingIOError:
+                # The PTY input queue is full until the shell reads some of it
+                writable = loop.create_future()
+                loop.add_writer(self.master_fd, lambda: writable.done() or writable.set_result(None))
+                try:
+                    await writable
+                finally:
+                    loop.remove_writer(self.master_fd)
+                continue
+            data = data[written:]
+
+    @staticmethod
+    def _frame(token: str) -> str:
+        return f"printf '\\n__KALI_%s__%s\\n' {token} \"$?\"\n"
+
+    def _marker(self, token: str) -> "re.Pattern":
+        return re.compile(re.escape(self.MARKER_PREFIX + token.encode()) + rb"__(\d+)\n")
+
+    async def _sync(self, timeout: float, prefix: str = ""):
+        """Discard output until a fresh marker comes back, realigning the stream"""
+        token = uuid.uuid4().hex
+        marker = self._marker(token)
+        deadline = asyncio.get_running_loop().time() + timeout
+        await asyncio.wait_for(self._write(f"{prefix}\n{self._frame(token)}"), timeout)
+        pending = b""
+        while not marker.search(pending):
+            data = await self._read(deadline)
+            if not data:
+                raise ConnectionError("Shell session exited")
+            pending = pending[-256:] + data
+        self._dirty = False
+
+    async def run(self, command: str, timeout: float) -> AsyncGenerator[Tuple[str, Union[str, int]], None]:
+        """Run ``command``, yielding ``("output", text)`` chunks then ``("exit", return_code)``
+
+        Raises ``asyncio.TimeoutError`` past ``timeout``; the command is then
+        interrupted with Ctrl-C and the shell resynchronized (or restarted)
+        before the next command runs.
+        """
+        if self._dirty:
+            await self._recover()
+        self._dirty = True
+        self.last_used = time.time()
+
+        token = uuid.uuid4().hex
+        marker = self._marker(token)
+        hold = len(self.MARKER_PREFIX) + len(token) + 24  # bytes that could be the start of the marker
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+        script = None
+        if max(len(line.encode("utf-8")) for line in command.split("\n")) + 2 > self.MAX_INPUT_LINE:
+            fd, script = tempfile.mkstemp(prefix="kali-command-", suffix=".sh")
+            with os.fdopen(fd, "w", encoding="utf-8") as script_file:
+                script_file.write(command + "\n")
+            command = f". {shlex.quote(script)}"
+
+        try:
+            deadline = asyncio.get_running_loop().time() + timeout
+            await asyncio.wait_for(self._write(f"{{ {command}\n}} </dev/null\n{self._frame(token)}"), timeout)
+            pending = b""
+            while True:
+                match = marker.search(pending)
+                if match:
+                    text = decoder.decode(pending[:match.start()], final=True)
+                    if text:
+                        yield "output", text
+                    break
+                if len(pending) > hold:
+                    text = decoder.decode(pending[:-hold])
+                    pending = pending[-hold:]
+                    if text:
+                        yield "output", text
+                data = await self._read(deadline)
+                if not data:
+                    raise ConnectionError("Shell session exited")
+                pending += data
+        finally:
+            if script is not None:
+                os.unlink(script)
+
+        self._dirty = False
+        self.commands_run += 1
+        yield "exit", int(match.group(1))
+
+    async def _recover(self, timeout: float = 5.0):
+        """Interrupt whatever is still running and realign, restarting the shell if that fails"""
+        try:
+            await asyncio.wait_for(self._write("\x03"), timeout)
+            await self._sync(timeout)
+        except (asyncio.TimeoutError, ConnectionError, OSError):
+            logger.warning("Shell session did not recover from an interrupted command, restarting it")
+            await self.close()
+            self._reset_state()
+            await self.start()
+
+    def _reset_state(self):
+        self._buffer.clear()
+        self._eof = False
+        self._dirty = False
+        self.commands_run = 0
+
+    async def close(self, timeout: float = 5.0):
+        if self.master_fd is not None:
+            if not self._eof:
+                asyncio.get_running_loop().remove_reader(self.master_fd)
+            os.close(self.master_fd)
+            self.master_fd = None
+        if self.process is not None and self.process.returncode is None:
+            try:
+                os.killpg(self.process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            try:
+                await asyncio.wait_for(self.process.wait(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Shell session {self.process.pid} did not exit after kill")
+
+    def status(self) -> Dict:
+        return {
+            "alive": self.is_alive,
+            "pid": self.process.pid if self.process else None,
+            "commands_run": self.commands_run,
+            "started_at": self.started_at,
+            "last_used": self.last_used
+        }
+
+class ShellSessionManager:
+    """Persistent shell sessions keyed by client id, started on first use"""
+
+    def __init__(self, max_sessions: Optional[int] = None):
+        self.max_sessions = max_sessions or int(os.getenv("SHELL_SESSION_MAX", "32"))
+        self.sessions: Dict[str, ShellSession] = {}
+
+    @property
+    def supported(self) -> bool:
+        return pty is not None
+
+    async def acquire(self, client_id: str) -> ShellSession:
+        """The client's shell, (re)started if needed; raises RuntimeError if none can be had"""
+        if not self.supported:
+            raise RuntimeError("Shell sessions require a POSIX pseudo-terminal")
+        session = self.sessions.get(client_id)
+        if session is not None and session.is_alive:
+            return session
+        if session is None and len(self.sessions) >= self.max_sessions:
+            raise RuntimeError(f"Too many shell sessions (limit {self.max_sessions})")
+        if session is not None:
+            await session.close()
+        session = ShellSession()
+        self.sessions[client_id] = session
+        try:
+            await session.start()
+        except BaseException:
+            self.sessions.pop(client_id, None)
+            await session.close()
+            raise
+        return session
+
+    async def reset(self, client_id: str) -> Dict:
+        """Replace the client's shell with a fresh one (cwd, variables and jobs are lost)"""
+        await self.close(client_id)
+        return (await self.acquire(client_id)).status()
+
+    async def close(self, client_id: str):
+        session = self.sessions.pop(client_id, None)
+        if session is not None:
+            await session.close()
+
+    async def close_all(self):
+        for client_id in list(self.sessions):
+            await self.close(client_id)
+
+    def status(self) -> Dict:
+        return {
+            "supported": self.supported,
+            "max_sessions": self.max_sessions,
+            "sessions": {client_id: session.status() for client_id, session in self.sessions.items()}
+        }
+
+# Process-wide sessions shared by every command engine instance
+shell_sessions = ShellSessionManager()
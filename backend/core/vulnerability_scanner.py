@@ -7,9 +7,9 @@ import asyncio
 import json
 import uuid
 import subprocess
-from typing import Dict, List, Optional, AsyncGenerator
+from typing import Callable, Dict, List, Optional, AsyncGenerator
 from datetime import datetime, timedelta
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from enum import Enum
 try:
     import nmap
@@ -19,6 +19,7 @@ except ImportError:
 import socket
 import requests
 from utils.logger import setup_logger
+from .port_scanner import AsyncPortScanner, parse_port_spec
 
 logger = setup_logger(__name__)
 
@@ -61,6 +62,18 @@ class ScanResult:
     start_time: datetime
     end_time: Optional[datetime]
     duration: Optional[float]
+    ports: List[int] = field(default_factory=list)
+    open_ports: List[int] = field(default_factory=list)
+    ports_probed: int = 0
+
+# Ports probed per scan type when the caller does not pass an explicit list
+SCAN_TYPE_PORTS = {
+    ScanType.BASIC: "top-20",
+    ScanType.STEALTH: "top-20",
+    ScanType.COMPREHENSIVE: "top-100",
+    ScanType.AGGRESSIVE: "all",
+    ScanType.CUSTOM: "top-20",
+}
 
 class VulnerabilityScanner:
     def __init__(self):
@@ -76,8 +89,11 @@ class VulnerabilityScanner:
         else:
             self.nm = None
             logger.warning("Nmap module not installed, using basic port scanning")
+        self.port_scanner = AsyncPortScanner()
         self._running = False
         self._continuous_scan_task = None
+        # Called with (scan_id, progress snapshot) whenever a scan moves forward
+        self.on_progress: Optional[Callable[[str, Dict], None]] = None
         
         logger.info("Vulnerability Scanner initialized")
 
@@ -85,10 +101,15 @@ class VulnerabilityScanner:
         """Check if scanner is ready"""
         return True
 
-    async def start_scan(self, target: str, scan_type: str = "basic") -> str:
-        """Start a vulnerability scan"""
+    async def start_scan(self, target: str, scan_type: str = "basic", ports=None) -> str:
+        """Start a vulnerability scan
+        
+        ``ports`` accepts anything ``parse_port_spec`` does ("top-100", "all",
+        "1-1024,8080", a list of ints); by default it follows the scan type.
+        """
         scan_id = str(uuid.uuid4())
         scan_type_enum = ScanType(scan_type)
+        port_list = parse_port_spec(ports if ports is not None else SCAN_TYPE_PORTS[scan_type_enum])
         
         # Create scan result
         scan_result = ScanResult(
@@ -100,7 +121,8 @@ class VulnerabilityScanner:
             vulnerabilities=[],
             start_time=datetime.now(),
             end_time=None,
-            duration=None
+            duration=None,
+            ports=port_list
         )
         
         self.active_scans[scan_id] = scan_result
@@ -118,21 +140,25 @@ class VulnerabilityScanner:
         try:
             # Phase 1: Port Discovery
             scan_result.progress = 10
+            self._publish_progress(scan_result)
             logger.info(f"🔍 Phase 1: Port discovery for {scan_result.target}")
-            open_ports = await self._discover_ports(scan_result.target)
+            open_ports = await self._discover_ports(scan_result.target, scan_result)
             
             # Phase 2: Service Detection
             scan_result.progress = 30
+            self._publish_progress(scan_result)
             logger.info(f"🔍 Phase 2: Service detection")
             services = await self._detect_services(scan_result.target, open_ports)
             
             # Phase 3: Vulnerability Detection
             scan_result.progress = 60
+            self._publish_progress(scan_result)
             logger.info(f"🔍 Phase 3: Vulnerability detection")
             vulnerabilities = await self._detect_vulnerabilities(scan_result.target, services)
             
             # Phase 4: Analysis & Reporting
             scan_result.progress = 90
+            self._publish_progress(scan_result)
             logger.info(f"🔍 Phase 4: Analysis and reporting")
             scan_result.vulnerabilities = vulnerabilities
             
@@ -145,6 +171,7 @@ class VulnerabilityScanner:
             # Move to history
             self.scan_history.append(scan_result)
             del self.active_scans[scan_id]
+            self._publish_progress(scan_result)
             
             logger.info(f"✅ Scan {scan_id} completed - Found {len(vulnerabilities)} vulnerabilities")
             
@@ -152,27 +179,35 @@ class VulnerabilityScanner:
             logger.error(f"❌ Scan {scan_id} failed: {str(e)}")
             scan_result.status = "failed"
             scan_result.end_time = datetime.now()
+            self._publish_progress(scan_result)
 
-    async def _discover_ports(self, target: str) -> List[int]:
-        """Discover open ports on target"""
+    async def _discover_ports(self, target: str, scan_result: Optional[ScanResult] = None,
+                              on_result=None) -> List[int]:
+        """Discover open ports on target
+        
+        Progress through the port list is reflected on ``scan_result`` (within
+        the 10-30% port discovery phase) and each port's state is passed to
+        ``on_result(port, state)`` as it is determined.
+        """
+        ports = scan_result.ports if scan_result and scan_result.ports else parse_port_spec(None)
+        
+        def record(port: int, state: str):
+            if scan_result is not None:
+                scan_result.ports_probed += 1
+                if state == "open":
+                    scan_result.open_ports.append(port)
+                progress = 10 + (20 * scan_result.ports_probed) // len(ports)
+                # Publish on visible change only, not once per probed port
+                if progress != scan_result.progress or state == "open":
+                    scan_result.progress = progress
+                    self._publish_progress(scan_result)
+            if on_result is not None:
+                return on_result(port, state)
+        
         try:
-            # Common ports to scan
-            common_ports = [21, 22, 23, 25, 53, 80, 110, 111, 135, 139, 143, 443, 993, 995, 1723, 3306, 3389, 5432, 5900, 8080]
-            open_ports = []
-            
-            for port in common_ports:
-                try:
-                    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                    sock.settimeout(1)
-                    result = sock.connect_ex((target, port))
-                    if result == 0:
-                        open_ports.append(port)
-                    sock.close()
-                except:
-                    continue
-                    
-            logger.info(f"🔍 Found {len(open_ports)} open ports: {open_ports}")
-            return open_ports
+            report = await self.port_scanner.scan(target, ports, on_result=record)
+            logger.info(f"🔍 Found {len(report.open_ports)} open ports: {report.open_ports}")
+            return report.open_ports
             
         except Exception as e:
             logger.error(f"❌ Port discovery failed: {str(e)}")
@@ -272,27 +307,40 @@ class VulnerabilityScanner:
     async def get_scan_results(self, scan_id: str) -> AsyncGenerator[Dict, None]:
         """Stream scan results as they become available"""
         while scan_id in self.active_scans:
-            scan_result = self.active_scans[scan_id]
-            yield {
-                "scan_id": scan_id,
-                "status": scan_result.status,
-                "progress": scan_result.progress,
-                "vulnerabilities_found": len(scan_result.vulnerabilities),
-                "current_phase": self._get_current_phase(scan_result.progress)
-            }
+            yield self._scan_snapshot(self.active_scans[scan_id])
             await asyncio.sleep(1)
             
         # Send final results
         if scan_id in [s.scan_id for s in self.scan_history]:
             final_result = next(s for s in self.scan_history if s.scan_id == scan_id)
-            yield {
-                "scan_id": scan_id,
-                "status": final_result.status,
+            yield self._scan_snapshot(final_result)
+
+    def _scan_snapshot(self, scan_result: ScanResult) -> Dict:
+        """Progress of a running scan, or the full results of a completed one"""
+        if scan_result.status == "completed":
+            return {
+                "scan_id": scan_result.scan_id,
+                "status": scan_result.status,
                 "progress": 100,
-                "vulnerabilities": [self._vulnerability_to_dict(v) for v in final_result.vulnerabilities],
-                "duration": final_result.duration,
+                "vulnerabilities": [self._vulnerability_to_dict(v) for v in scan_result.vulnerabilities],
+                "open_ports": sorted(scan_result.open_ports),
+                "duration": scan_result.duration,
                 "completed": True
             }
+        return {
+            "scan_id": scan_result.scan_id,
+            "status": scan_result.status,
+            "progress": scan_result.progress,
+            "vulnerabilities_found": len(scan_result.vulnerabilities),
+            "ports_probed": scan_result.ports_probed,
+            "ports_total": len(scan_result.ports),
+            "open_ports": sorted(scan_result.open_ports),
+            "current_phase": self._get_current_phase(scan_result.progress)
+        }
+
+    def _publish_progress(self, scan_result: ScanResult):
+        if self.on_progress is not None:
+            self.on_progress(scan_result.scan_id, self._scan_snapshot(scan_result))
 
     def _get_current_phase(self, progress: int) -> str:
         """Get current scan phase based on progress"""
@@ -6,11 +6,14 @@ Implements AI-driven thinking → planning → execution pipeline for security o
 import asyncio
 import json
 import logging
+import os
 import re
+import uuid
+from collections import OrderedDict, deque
 from datetime import datetime
-from typing import Dict, List, Optional, Tuple, Any
+from typing import Callable, Dict, List, Optional, Tuple, Any
 from enum import Enum
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, field
 
 from .deepseek_agent import UnifiedAIAgent
 from .command_engine import IntelligentCommandEngine
@@ -27,6 +30,7 @@ class WorkflowState(Enum):
     EXECUTING = "executing"
     COMPLETED = "completed"
     ERROR = "error"
+    CANCELLED = "cancelled"
 
 class OperationType(Enum):
     RECONNAISSANCE = "reconnaissance"
@@ -68,6 +72,23 @@ class ExecutionResult:
     error_message: Optional[str]
     execution_time: float
     artifacts: List[str]  # Files, reports generated
+    skipped: bool = False  # never started: a dependency failed critically or is unresolvable
+
+@dataclass
+class WorkflowRun:
+    """Isolated state of one natural language request moving through the pipeline"""
+    id: str
+    request: str
+    state: WorkflowState = WorkflowState.IDLE
+    workflow: Optional[WorkflowPlan] = None
+    execution_results: List[ExecutionResult] = field(default_factory=list)
+    error: Optional[str] = None
+    created_at: str = field(default_factory=lambda: datetime.now().isoformat())
+    finished_at: Optional[str] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.state in (WorkflowState.COMPLETED, WorkflowState.ERROR, WorkflowState.CANCELLED)
 
 class AdvancedWorkflowEngine:
     """
@@ -75,18 +96,28 @@ class AdvancedWorkflowEngine:
     Implements thinking → planning → execution pipeline
     """
     
-    def __init__(self):
+    MAX_FINISHED_RUNS = 100  # finished runs kept for status queries
+    
+    def __init__(self, max_parallel_steps: Optional[int] = None,
+                 vuln_scanner: Optional[VulnerabilityScanner] = None,
+                 network_monitor: Optional[NetworkMonitor] = None):
         self.deepseek_agent = UnifiedAIAgent()
         self.command_engine = IntelligentCommandEngine()
         self.security_tools = SecurityToolManager()
-        self.vuln_scanner = VulnerabilityScanner()
-        self.network_monitor = NetworkMonitor()
+        # Pass the application's instances so workflow scans publish through the same callbacks
+        self.vuln_scanner = vuln_scanner or VulnerabilityScanner()
+        self.network_monitor = network_monitor or NetworkMonitor()
         
-        self.state = WorkflowState.IDLE
-        self.current_workflow: Optional[WorkflowPlan] = None
-        self.execution_results: List[ExecutionResult] = []
+        # Every request gets its own run so concurrent workflows never share state
+        self.runs: "OrderedDict[str, WorkflowRun]" = OrderedDict()
         self.workflow_history: List[WorkflowPlan] = []
         
+        # Called with (run id, run summary) whenever a run changes state or finishes a step
+        self.on_update: Optional[Callable[[str, Dict[str, Any]], None]] = None
+        
+        # Upper bound on workflow steps executing at the same time
+        self.max_parallel_steps = max_parallel_steps or int(os.getenv("WORKFLOW_MAX_PARALLEL_STEPS", "4"))
+        
         # Knowledge base for security operations
         self.security_knowledge_base = self._initialize_knowledge_base()
         
@@ -118,47 +149,92 @@ class AdvancedWorkflowEngine:
             }
         }
 
-    async def process_natural_language_request(self, request: str, context: Dict[str, Any]) -> Dict[str, Any]:
+    async def process_natural_language_request(self, request: str, context: Dict[str, Any],
+                                               run_id: Optional[str] = None) -> Dict[str, Any]:
         """
         Main entry point for processing natural language security requests
         Implements the thinking → planning → execution pipeline
+        
+        ``run_id`` (from ``new_run_id``) lets the caller announce the run before it starts.
         """
+        run = self._create_run(request, run_id)
+        
         try:
-            self.state = WorkflowState.THINKING
-            logger.info(f"Processing natural language request: {request}")
+            run.state = WorkflowState.THINKING
+            self._notify(run)
+            logger.info(f"Processing natural language request ({run.id}): {request}")
             
             # Step 1: THINKING - Understand the request
             thinking_result = await self._thinking_phase(request, context)
             
             # Step 2: PLANNING - Create execution plan
-            self.state = WorkflowState.PLANNING
-            planning_result = await self._planning_phase(thinking_result, context)
+            run.state = WorkflowState.PLANNING
+            self._notify(run)
+            planning_result = await self._planning_phase(thinking_result, context, run)
             
             # Step 3: EXECUTION - Execute the plan
-            self.state = WorkflowState.EXECUTING
-            execution_result = await self._execution_phase(planning_result)
+            run.state = WorkflowState.EXECUTING
+            self._notify(run)
+            execution_result = await self._execution_phase(planning_result, run)
             
-            self.state = WorkflowState.COMPLETED
+            self._finish_run(run, WorkflowState.COMPLETED)
+            self.workflow_history.append(run.workflow)
+            del self.workflow_history[:-self.MAX_FINISHED_RUNS]
             
             return {
                 "status": "success",
                 "thinking": thinking_result,
                 "planning": planning_result,
                 "execution": execution_result,
-                "workflow_id": self.current_workflow.id if self.current_workflow else None
+                "workflow_id": run.id
             }
             
+        except asyncio.CancelledError:
+            self._finish_run(run, WorkflowState.CANCELLED)
+            logger.info(f"Workflow {run.id} cancelled")
+            raise
         except Exception as e:
-            self.state = WorkflowState.ERROR
-            logger.error(f"Workflow engine error: {str(e)}")
             error_message = str(e)
+            self._finish_run(run, WorkflowState.ERROR, error_message)
+            logger.error(f"Workflow engine error: {error_message}")
             logger.error(f"Detailed error: {error_message}")
             return {
                 "status": "error",
                 "error": error_message,
-                "state": self.state.value
+                "state": run.state.value,
+                "workflow_id": run.id
             }
 
+    @staticmethod
+    def new_run_id() -> str:
+        return f"workflow_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+
+    def _create_run(self, request: str, run_id: Optional[str] = None) -> WorkflowRun:
+        """Register a new run, pruning the oldest finished runs past the retention limit"""
+        run_id = run_id or self.new_run_id()
+        if run_id in self.runs:
+            raise ValueError(f"Workflow run already exists: {run_id}")
+        run = WorkflowRun(id=run_id, request=request)
+        self.runs[run_id] = run
+        
+        finished = [r.id for r in self.runs.values() if r.finished]
+        for stale_id in finished[:max(len(finished) - self.MAX_FINISHED_RUNS, 0)]:
+            del self.runs[stale_id]
+        
+        return run
+
+    def _finish_run(self, run: WorkflowRun, state: WorkflowState, error: Optional[str] = None):
+        """Move a run into a terminal state"""
+        run.state = state
+        run.error = error
+        run.finished_at = datetime.now().isoformat()
+        self._notify(run)
+
+    def _notify(self, run: WorkflowRun):
+        """Push a run's summary to ``on_update``, if anyone listens"""
+        if self.on_update is not None:
+            self.on_update(run.id, self._run_summary(run))
+
     async def _thinking_phase(self, request: str, context: Dict[str, Any]) -> Dict[str, Any]:
         """
         THINKING PHASE: Analyze and understand the security request
@@ -207,7 +283,7 @@ class AdvancedWorkflowEngine:
             logger.warning(f"AI thinking failed, using fallback analysis: {e}")
             return self._fallback_thinking_analysis(request, context)
 
-    async def _planning_phase(self, thinking_result: Dict[str, Any], context: Dict[str, Any]) -> Dict[str, Any]:
+    async def _planning_phase(self, thinking_result: Dict[str, Any], context: Dict[str, Any], run: WorkflowRun) -> Dict[str, Any]:
         """
         PLANNING PHASE: Create detailed execution plan
         """
@@ -222,7 +298,7 @@ class AdvancedWorkflowEngine:
         
         # Create workflow plan
         workflow_plan = WorkflowPlan(
-            id=f"workflow_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
+            id=run.id,
             title=f"{intent.title()} Operation on {target}",
             description=f"Automated {intent} workflow targeting {target}",
             target=target,
@@ -232,10 +308,10 @@ class AdvancedWorkflowEngine:
             created_at=datetime.now().isoformat()
         )
         
-        self.current_workflow = workflow_plan
+        run.workflow = workflow_plan
         
         planning_result = {
-            "workflow_plan": asdict(workflow_plan),
+            "workflow_plan": self._plan_to_dict(workflow_plan),
             "step_count": len(workflow_steps),
             "estimated_duration": workflow_plan.estimated_total_time,
             "risk_assessment": risk_level,
@@ -245,75 +321,205 @@ class AdvancedWorkflowEngine:
         logger.info(f"Planning phase completed: {len(workflow_steps)} steps planned")
         return planning_result
 
-    async def _execution_phase(self, planning_result: Dict[str, Any]) -> Dict[str, Any]:
+    async def _execution_phase(self, planning_result: Dict[str, Any], run: WorkflowRun) -> Dict[str, Any]:
         """
         EXECUTION PHASE: Execute the planned workflow
+        
+        Steps run as soon as all of their dependencies have finished, up to
+        ``max_parallel_steps`` at a time. A failed critical step cancels every
+        step that (transitively) depends on it; independent branches continue.
         """
         logger.info("Entering execution phase...")
         
-        if not self.current_workflow:
+        if not run.workflow:
             raise Exception("No workflow plan available for execution")
         
-        execution_results = []
-        total_steps = len(self.current_workflow.steps)
+        steps = run.workflow.steps
+        total_steps = len(steps)
+        step_map = {step.id: step for step in steps}
+        results: Dict[str, ExecutionResult] = {}
+        
+        dependents: Dict[str, List[str]] = {step.id: [] for step in steps}
+        pending_dependencies: Dict[str, set] = {}
+        for step in steps:
+            pending_dependencies[step.id] = set()
+            for dependency in step.dependencies:
+                if dependency in step_map:
+                    pending_dependencies[step.id].add(dependency)
+                    dependents[dependency].append(step.id)
+                elif step.id not in results:
+                    results[step.id] = self._skipped_result(step, f"Unknown dependency: {dependency}")
+                    run.execution_results.append(results[step.id])
+        
+        ready = deque(step.id for step in steps if step.id not in results and not pending_dependencies[step.id])
+        running: Dict[asyncio.Task, WorkflowStep] = {}
+        loop = asyncio.get_running_loop()
+        phase_start = loop.time()
+        started = 0
         
-        for i, step in enumerate(self.current_workflow.steps):
-            logger.info(f"Executing step {i+1}/{total_steps}: {step.name}")
-            
-            try:
-                start_time = datetime.now()
-                
-                # Execute the step
-                result = await self._execute_workflow_step(step)
-                
-                execution_time = (datetime.now() - start_time).total_seconds()
-                
-                exec_result = ExecutionResult(
-                    step_id=step.id,
-                    success=result.get("success", False),
-                    output=result.get("output", ""),
-                    error_message=result.get("error"),
-                    execution_time=execution_time,
-                    artifacts=result.get("artifacts", [])
-                )
+        try:
+            while ready or running:
+                while ready and len(running) < self.max_parallel_steps:
+                    step = step_map[ready.popleft()]
+                    started += 1
+                    logger.info(f"Executing step {started}/{total_steps}: {step.name}")
+                    running[asyncio.create_task(self._run_workflow_step(step))] = step
                 
-                execution_results.append(exec_result)
-                self.execution_results.append(exec_result)
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
                 
-                # Stop on failure if step is critical
-                if not exec_result.success and step.risk_level == "critical":
-                    logger.error(f"Critical step failed: {step.name}")
-                    break
+                for task in done:
+                    step = running.pop(task)
+                    exec_result = task.result()
+                    results[step.id] = exec_result
+                    run.execution_results.append(exec_result)
+                    self._notify(run)
                     
-            except Exception as e:
-                logger.error(f"Step execution failed: {step.name} - {e}")
-                exec_result = ExecutionResult(
-                    step_id=step.id,
-                    success=False,
-                    output="",
-                    error_message=str(e),
-                    execution_time=0,
-                    artifacts=[]
-                )
-                execution_results.append(exec_result)
+                    # Cancel dependents on failure if step is critical
+                    if not exec_result.success and step.risk_level == "critical":
+                        logger.error(f"Critical step failed: {step.name}")
+                        run.execution_results.extend(self._skip_dependents(step, step_map, dependents, results))
+                    
+                    for dependent_id in dependents[step.id]:
+                        if dependent_id in results:
+                            continue
+                        pending_dependencies[dependent_id].discard(step.id)
+                        if not pending_dependencies[dependent_id]:
+                            ready.append(dependent_id)
+        finally:
+            for task in running:
+                task.cancel()
+        
+        wall_clock_time = loop.time() - phase_start
+        
+        # Anything never reached sits on a dependency cycle
+        for step in steps:
+            if step.id not in results:
+                results[step.id] = self._skipped_result(step, "Dependency cycle detected")
+                run.execution_results.append(results[step.id])
+        self._notify(run)
+        
+        execution_results = [results[step.id] for step in steps]
+        critical_path, critical_path_time = self._critical_path(steps, results)
         
         # Generate summary report
         success_count = sum(1 for r in execution_results if r.success)
+        skipped_count = sum(1 for r in execution_results if r.skipped)
         total_time = sum(r.execution_time for r in execution_results)
         
         execution_summary = {
             "total_steps": total_steps,
             "successful_steps": success_count,
             "failed_steps": total_steps - success_count,
+            "skipped_steps": skipped_count,
             "total_execution_time": total_time,
+            "wall_clock_time": wall_clock_time,
+            "critical_path": critical_path,
+            "critical_path_time": critical_path_time,
+            "max_parallel_steps": self.max_parallel_steps,
             "success_rate": (success_count / total_steps) * 100 if total_steps > 0 else 0,
             "results": [asdict(r) for r in execution_results],
             "artifacts_generated": sum(len(r.artifacts) for r in execution_results)
         }
         
-        logger.info(f"Execution completed: {success_count}/{total_steps} steps successful")
+        logger.info(
+            f"Execution completed: {success_count}/{total_steps} steps successful "
+            f"in {wall_clock_time:.2f}s (critical path {critical_path_time:.2f}s)"
+        )
         return execution_summary
 
+    async def _run_workflow_step(self, step: WorkflowStep) -> ExecutionResult:
+        """Execute one step and wrap the outcome in an ExecutionResult"""
+        try:
+            start_time = datetime.now()
+            
+            # Execute the step
+            result = await self._execute_workflow_step(step)
+            
+            execution_time = (datetime.now() - start_time).total_seconds()
+            
+            return ExecutionResult(
+                step_id=step.id,
+                success=result.get("success", False),
+                output=result.get("output", ""),
+                error_message=result.get("error"),
+                execution_time=execution_time,
+                artifacts=result.get("artifacts", [])
+            )
+                
+        except Exception as e:
+            logger.error(f"Step execution failed: {step.name} - {e}")
+            return ExecutionResult(
+                step_id=step.id,
+                success=False,
+                output="",
+                error_message=str(e),
+                execution_time=0,
+                artifacts=[]
+            )
+
+    def _skipped_result(self, step: WorkflowStep, reason: str) -> ExecutionResult:
+        """Result recorded for a step that was never started"""
+        logger.warning(f"Skipping step {step.name}: {reason}")
+        return ExecutionResult(
+            step_id=step.id,
+            success=False,
+            output="",
+            error_message=reason,
+            execution_time=0,
+            artifacts=[],
+            skipped=True
+        )
+
+    def _skip_dependents(self, failed_step: WorkflowStep, step_map: Dict[str, WorkflowStep],
+                         dependents: Dict[str, List[str]], results: Dict[str, ExecutionResult]) -> List[ExecutionResult]:
+        """Mark every step downstream of a failed critical step as skipped; returns the new results"""
+        skipped = []
+        stack = list(dependents[failed_step.id])
+        while stack:
+            dependent_id = stack.pop()
+            if dependent_id in results:
+                continue
+            results[dependent_id] = self._skipped_result(
+                step_map[dependent_id], f"Cancelled: critical dependency {failed_step.id} failed"
+            )
+            skipped.append(results[dependent_id])
+            stack.extend(dependents[dependent_id])
+        return skipped
+
+    def _critical_path(self, steps: List[WorkflowStep], results: Dict[str, ExecutionResult]) -> Tuple[List[str], float]:
+        """Longest chain of dependent steps by measured execution time"""
+        finish: Dict[str, float] = {}
+        previous: Dict[str, Optional[str]] = {}
+        
+        def visit(step_id: str, trail: set) -> float:
+            if step_id in finish:
+                return finish[step_id]
+            step = step_map[step_id]
+            best, best_dependency = 0.0, None
+            for dependency in step.dependencies:
+                if dependency in step_map and dependency not in trail:
+                    candidate = visit(dependency, trail | {step_id})
+                    if candidate > best:
+                        best, best_dependency = candidate, dependency
+            finish[step_id] = best + results[step_id].execution_time
+            previous[step_id] = best_dependency
+            return finish[step_id]
+        
+        step_map = {step.id: step for step in steps}
+        for step in steps:
+            visit(step.id, set())
+        
+        if not finish:
+            return [], 0.0
+        
+        end = max(finish, key=finish.get)
+        path = []
+        while end is not None:
+            path.append(end)
+            end = previous[end]
+        path.reverse()
+        return path, finish[path[-1]]
+
     async def _execute_workflow_step(self, step: WorkflowStep) -> Dict[str, Any]:
         """Execute a single workflow step"""
         try:
@@ -556,19 +762,55 @@ class AdvancedWorkflowEngine:
             "timestamp": datetime.now().isoformat()
         }
 
-    def get_workflow_status(self) -> Dict[str, Any]:
-        """Get current workflow status"""
+    def get_workflow_status(self, run_id: Optional[str] = None) -> Dict[str, Any]:
+        """Get the status of one workflow run, or an overview when no run id is given"""
+        if run_id is not None:
+            run = self.runs.get(run_id)
+            if run is None:
+                return {"error": f"Unknown workflow run: {run_id}", "workflow_id": run_id}
+            return self._run_to_dict(run)
+        
+        latest = next(reversed(self.runs.values()), None)
         return {
-            "state": self.state.value,
-            "current_workflow": asdict(self.current_workflow) if self.current_workflow else None,
-            "execution_results_count": len(self.execution_results),
-            "workflow_history_count": len(self.workflow_history)
+            "state": latest.state.value if latest else WorkflowState.IDLE.value,
+            "current_workflow": self._plan_to_dict(latest.workflow) if latest and latest.workflow else None,
+            "execution_results_count": sum(len(run.execution_results) for run in self.runs.values()),
+            "workflow_history_count": len(self.workflow_history),
+            "active_runs": [run.id for run in self.runs.values() if not run.finished],
+            "runs": [self._run_summary(run) for run in self.runs.values()]
         }
 
+    def _run_summary(self, run: WorkflowRun) -> Dict[str, Any]:
+        """Compact per-run status used in overviews"""
+        return {
+            "workflow_id": run.id,
+            "request": run.request,
+            "state": run.state.value,
+            "steps_completed": sum(1 for result in run.execution_results if not result.skipped),
+            "steps_skipped": sum(1 for result in run.execution_results if result.skipped),
+            "steps_total": len(run.workflow.steps) if run.workflow else 0,
+            "created_at": run.created_at,
+            "finished_at": run.finished_at,
+            "error": run.error
+        }
+
+    def _run_to_dict(self, run: WorkflowRun) -> Dict[str, Any]:
+        """Full status of a single run"""
+        status = self._run_summary(run)
+        status["workflow"] = self._plan_to_dict(run.workflow) if run.workflow else None
+        status["execution_results"] = [asdict(result) for result in run.execution_results]
+        return status
+
+    def _plan_to_dict(self, plan: WorkflowPlan) -> Dict[str, Any]:
+        """Serialize a plan with enum members replaced by their values"""
+        plan_dict = asdict(plan)
+        for step in plan_dict["steps"]:
+            step["operation_type"] = step["operation_type"].value
+        return plan_dict
+
     def is_ready(self) -> bool:
         """Check if workflow engine is ready"""
         return (
             self.command_engine.is_ready() and
-            self.security_tools.is_ready() and
-            self.state != WorkflowState.ERROR
+            self.security_tools.is_ready()
         )
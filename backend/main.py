@@ -6,11 +6,10 @@ Advanced Security Terminal with AI Intelligence
 import asyncio
 import logging
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 import uvicorn
-import json
 from datetime import datetime
 from typing import Dict, List, Optional
 from dotenv import load_dotenv
@@ -20,17 +19,31 @@ import os
 load_dotenv()
 
 from core.ai_assistant import KaliAIAssistant
+from core.command_cache import command_cache
 from core.command_engine import IntelligentCommandEngine
+from core.command_history import command_history
+from core.command_model import command_model
+from core.output_store import output_store
+from core.process_accounting import resource_limits, resource_stats
+from core.process_sampler import process_sampler
+from core.process_supervisor import CommandPriority, process_supervisor
+from core.response_cache import response_cache
 from core.security_tools import SecurityToolManager
+from core.shell_session import shell_sessions
 from core.vulnerability_scanner import VulnerabilityScanner
 from core.network_monitor import NetworkMonitor
 from core.workflow_engine import AdvancedWorkflowEngine
-from utils.websocket_manager import ConnectionManager
+from utils.delta import DeltaStream
+from utils.websocket_manager import ConnectionManager, RequestDispatcher, TopicHub
+from utils.http_pool import http_pool
 from utils.logger import setup_logger
 
 # Setup logging
 logger = setup_logger(__name__)
 
+# Maximum number of concurrently running requests per WebSocket connection
+MAX_INFLIGHT_TASKS = int(os.getenv("WS_MAX_INFLIGHT_TASKS", "16"))
+
 # Global instances
 ai_assistant = None
 command_engine = None
@@ -39,6 +52,9 @@ vulnerability_scanner = None
 network_monitor = None
 workflow_engine = None
 connection_manager = ConnectionManager()
+topic_hub = TopicHub(connection_manager)
+# Versions of the system status, so pollers holding a recent one get only what changed
+system_status_stream = DeltaStream()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -53,11 +69,18 @@ async def lifespan(app: FastAPI):
     security_tools = SecurityToolManager()
     vulnerability_scanner = VulnerabilityScanner()
     network_monitor = NetworkMonitor()
-    workflow_engine = AdvancedWorkflowEngine()
+    workflow_engine = AdvancedWorkflowEngine(vuln_scanner=vulnerability_scanner, network_monitor=network_monitor)
+    
+    # Producers publish each update once; the hub fans it out to subscribers
+    topic_hub.bind(asyncio.get_running_loop())
+    network_monitor.on_sample = lambda status: topic_hub.publish_threadsafe("system.metrics", status)
+    vulnerability_scanner.on_progress = lambda scan_id, progress: topic_hub.publish(f"scan.{scan_id}", progress)
+    workflow_engine.on_update = lambda run_id, summary: topic_hub.publish(f"workflow.{run_id}", summary)
     
     # Start background tasks
     asyncio.create_task(network_monitor.start_monitoring())
     asyncio.create_task(vulnerability_scanner.start_continuous_scan())
+    security_tools.warm_up()
     
     logger.info("All systems initialized successfully")
     
@@ -67,6 +90,14 @@ async def lifespan(app: FastAPI):
     # Cleanup resources
     await network_monitor.stop_monitoring()
     await vulnerability_scanner.stop_scan()
+    await security_tools.shutdown()
+    await command_model.flush()
+    await command_history.close()
+    output_store.close()
+    process_sampler.stop()
+    await shell_sessions.close_all()
+    await connection_manager.close()
+    await http_pool.close()
 
 # Create FastAPI app
 app = FastAPI(
@@ -113,44 +144,61 @@ async def health_check():
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    """Main WebSocket endpoint for real-time communication"""
+    """Main WebSocket endpoint for real-time communication
+    
+    Every inbound message runs as its own task so a long scan or workflow does
+    not hold up the rest of the socket. Replies echo the message's request_id.
+    The wire encoding is negotiated through the subprotocol: "kali.msgpack"
+    for MessagePack binary frames, "kali.json" (or none) for JSON text. Either
+    with a "+deflate" suffix also opts in to compression of large frames.
+    """
     await connection_manager.connect(websocket)
+    client_id = connection_manager.client_id(websocket)
+    dispatcher = RequestDispatcher(max_in_flight=MAX_INFLIGHT_TASKS)
     logger.info("New WebSocket connection established")
     
     try:
         while True:
             # Receive message from client
-            data = await websocket.receive_text()
-            message = json.loads(data)
+            message = await connection_manager.receive(websocket)
             
             message_type = message.get("type")
             payload = message.get("payload", {})
+            request_id = str(message.get("request_id") or dispatcher.new_request_id())
+            
+            logger.info(f"Received message: {message_type} ({request_id})")
             
-            logger.info(f"Received message: {message_type}")
+            if message_type == "pong":
+                continue
+            if message_type == "cancel":
+                await handle_cancel(websocket, dispatcher, request_id, payload)
+                continue
             
             # Route message to appropriate handler
-            if message_type == "execute_command":
-                await handle_command_execution(websocket, payload)
-            elif message_type == "ai_query":
-                await handle_ai_query(websocket, payload)
-            elif message_type == "scan_target":
-                await handle_target_scan(websocket, payload)
-            elif message_type == "get_system_status":
-                await handle_system_status(websocket, payload)
-            elif message_type == "tool_operation":
-                await handle_tool_operation(websocket, payload)
-            elif message_type == "natural_language_request":
-                await handle_natural_language_request(websocket, payload)
-            elif message_type == "workflow_status":
-                await handle_workflow_status(websocket, payload)
-            else:
-                await websocket.send_text(json.dumps({
+            handler = MESSAGE_HANDLERS.get(message_type)
+            if handler is None:
+                await connection_manager.send_message(websocket, {
                     "type": "error",
+                    "request_id": request_id,
                     "payload": {"message": f"Unknown message type: {message_type}"}
-                }))
+                })
+            elif request_id in dispatcher.tasks:
+                await connection_manager.send_message(websocket, {
+                    "type": "error",
+                    "request_id": request_id,
+                    "payload": {"message": f"Request id already in use: {request_id}"}
+                })
+            elif not dispatcher.submit(request_id, handler(websocket, payload)):
+                await connection_manager.send_message(websocket, {
+                    "type": "error",
+                    "request_id": request_id,
+                    "payload": {
+                        "message": f"Too many in-flight requests (limit {dispatcher.max_in_flight})",
+                        "in_flight": dispatcher.in_flight
+                    }
+                })
                 
     except WebSocketDisconnect:
-        connection_manager.disconnect(websocket)
         logger.info("WebSocket connection closed")
     except Exception as e:
         logger.error(f"WebSocket error: {str(e)}")
@@ -158,17 +206,43 @@ async def websocket_endpoint(websocket: WebSocket):
             "type": "error",
             "payload": {"message": str(e)}
         })
+    finally:
+        # Also reached on errors, so failed sockets do not linger in the manager
+        connection_manager.disconnect(websocket)
+        topic_hub.unsubscribe(websocket)
+        dispatcher.cancel_all()
+        await command_engine.close_session(client_id)
+
+async def handle_cancel(websocket: WebSocket, dispatcher: RequestDispatcher, request_id: str, payload: Dict):
+    """Handle cancellation of a running request on this connection"""
+    target_id = str(payload.get("request_id", ""))
+    cancelled = dispatcher.cancel(target_id)
+    
+    logger.info(f"Cancel request for {target_id}: {'cancelled' if cancelled else 'not running'}")
+    
+    await connection_manager.send_message(websocket, {
+        "type": "cancelled",
+        "request_id": request_id,
+        "payload": {"request_id": target_id, "cancelled": cancelled}
+    })
 
 async def handle_command_execution(websocket: WebSocket, payload: Dict):
     """Handle command execution requests"""
     try:
         command = payload.get("command", "")
         context = payload.get("context", {})
+        priority = CommandPriority.parse(payload.get("priority"), CommandPriority.INTERACTIVE)
+        # Session mode runs the command in this client's persistent shell
+        session_id = connection_manager.client_id(websocket) if payload.get("session", False) else None
         
         logger.info(f"Executing command: {command}")
         
+        if payload.get("stream", False):
+            await stream_command_execution(websocket, command, context, priority, session_id)
+            return
+        
         # Process command through AI engine
-        result = await command_engine.process_command(command, context)
+        result = await command_engine.process_command(command, context, priority, session_id)
         
         logger.info(f"Command result: success={result['success']}, output_len={len(result['output'])}, error='{result['error']}'")
         
@@ -191,6 +265,38 @@ async def handle_command_execution(websocket: WebSocket, payload: Dict):
             "payload": {"message": f"Command execution failed: {str(e)}"}
         })
 
+async def stream_command_execution(websocket: WebSocket, command: str, context: Dict,
+                                   priority: CommandPriority = CommandPriority.INTERACTIVE,
+                                   session_id: Optional[str] = None):
+    """Relay command output as numbered chunks, followed by a command_result summary"""
+    async for event in command_engine.process_command_stream(command, context, priority, session_id):
+        if event["type"] == "queued":
+            await connection_manager.send_message(websocket, {
+                "type": "command_queued",
+                "payload": {
+                    "command": command,
+                    "priority": event["priority"],
+                    "queue_depth": event["queue_depth"]
+                }
+            })
+        elif event["type"] == "chunk":
+            await connection_manager.send_message(websocket, {
+                "type": "command_output_chunk",
+                "payload": {
+                    "command": command,
+                    "sequence": event["sequence"],
+                    "stream": event["stream"],
+                    "data": event["data"]
+                }
+            })
+        else:
+            result = event["result"]
+            logger.info(f"Streamed command finished: success={result['success']}, chunks={result.get('chunk_count', 0)}")
+            await connection_manager.send_message(websocket, {
+                "type": "command_result",
+                "payload": result
+            })
+
 async def handle_ai_query(websocket: WebSocket, payload: Dict):
     """Handle AI assistant queries"""
     try:
@@ -199,6 +305,10 @@ async def handle_ai_query(websocket: WebSocket, payload: Dict):
         
         logger.info(f"AI query: {query}")
         
+        if payload.get("stream", False):
+            await stream_ai_query(websocket, query, context, payload.get("provider"))
+            return
+        
         # Process through AI assistant
         response = await ai_assistant.process_query(query, context)
         
@@ -214,27 +324,65 @@ async def handle_ai_query(websocket: WebSocket, payload: Dict):
             "payload": {"message": f"AI query failed: {str(e)}"}
         })
 
+async def stream_ai_query(websocket: WebSocket, query: str, context: Dict, provider: Optional[str]):
+    """Relay AI completion tokens as ai_response_chunk frames, followed by the full ai_response"""
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    time_to_first_token = None
+    parts = []
+    
+    async for delta in ai_assistant.stream_query(query, context, provider):
+        if time_to_first_token is None:
+            time_to_first_token = loop.time() - start
+        parts.append(delta)
+        await connection_manager.send_message(websocket, {
+            "type": "ai_response_chunk",
+            "payload": {"sequence": len(parts), "content": delta}
+        })
+    
+    await connection_manager.send_message(websocket, {
+        "type": "ai_response",
+        "payload": {
+            "response": "".join(parts),
+            "streamed": True,
+            "chunk_count": len(parts),
+            "time_to_first_token": time_to_first_token,
+            "total_time": loop.time() - start
+        }
+    })
+
 async def handle_target_scan(websocket: WebSocket, payload: Dict):
     """Handle target scanning requests"""
     try:
         target = payload.get("target", "")
         scan_type = payload.get("scan_type", "basic")
+        ports = payload.get("ports")
         
         logger.info(f"Scanning target: {target}")
         
         # Start vulnerability scan
-        scan_id = await vulnerability_scanner.start_scan(target, scan_type)
+        scan_id = await vulnerability_scanner.start_scan(target, scan_type, ports)
         
         await connection_manager.send_message(websocket, {
             "type": "scan_started",
             "payload": {"scan_id": scan_id, "target": target}
         })
         
-        # Stream scan results
+        # Stream scan results, skipping frames that repeat the previous one;
+        # with "delta" set, frames after the first carry only changed fields
+        stream = DeltaStream() if payload.get("delta") else None
+        previous = None
         async for result in vulnerability_scanner.get_scan_results(scan_id):
+            if stream is not None:
+                frame = stream.encode(result)
+            else:
+                frame = result if result != previous else None
+                previous = result
+            if frame is None:
+                continue
             await connection_manager.send_message(websocket, {
                 "type": "scan_result",
-                "payload": result
+                "payload": frame
             })
             
     except Exception as e:
@@ -245,10 +393,18 @@ async def handle_target_scan(websocket: WebSocket, payload: Dict):
         })
 
 async def handle_system_status(websocket: WebSocket, payload: Dict):
-    """Handle system status requests"""
+    """Handle system status requests
+    
+    With "delta" set the reply is versioned: a full snapshot, or only the
+    changes since the "version" the client already holds.
+    """
     try:
         status = await network_monitor.get_system_status()
         
+        if payload.get("delta"):
+            system_status_stream.update(status)
+            status = system_status_stream.frame(payload.get("version"))
+        
         await connection_manager.send_message(websocket, {
             "type": "system_status",
             "payload": status
@@ -292,8 +448,15 @@ async def handle_natural_language_request(websocket: WebSocket, payload: Dict):
 
         logger.info(f"Processing natural language request: {request_text}")
 
+        # Announce the run id first, so the client can subscribe to its progress
+        run_id = workflow_engine.new_run_id()
+        await connection_manager.send_message(websocket, {
+            "type": "workflow_started",
+            "payload": {"workflow_id": run_id, "topic": f"workflow.{run_id}", "request": request_text}
+        })
+
         # Process through workflow engine
-        response = await workflow_engine.process_natural_language_request(request_text, context)
+        response = await workflow_engine.process_natural_language_request(request_text, context, run_id)
 
         await connection_manager.send_message(websocket, {
             "type": "workflow_response",
@@ -310,7 +473,7 @@ async def handle_natural_language_request(websocket: WebSocket, payload: Dict):
 async def handle_workflow_status(websocket: WebSocket, payload: Dict):
     """Handle workflow status requests"""
     try:
-        status = workflow_engine.get_workflow_status()
+        status = workflow_engine.get_workflow_status(payload.get("workflow_id"))
 
         await connection_manager.send_message(websocket, {
             "type": "workflow_status",
@@ -324,6 +487,163 @@ async def handle_workflow_status(websocket: WebSocket, payload: Dict):
             "payload": {"message": f"Workflow status request failed: {str(e)}"}
         })
 
+async def handle_fetch_output(websocket: WebSocket, payload: Dict):
+    """Handle line range requests against a spilled command output"""
+    try:
+        page = await output_store.read_lines(
+            payload.get("handle", ""),
+            payload.get("stream", "stdout"),
+            int(payload.get("start", 0)),
+            payload.get("count")
+        )
+
+        await connection_manager.send_message(websocket, {
+            "type": "command_output_page",
+            "payload": page
+        })
+
+    except KeyError:
+        await connection_manager.send_message(websocket, {
+            "type": "error",
+            "payload": {"message": f"Unknown output handle: {payload.get('handle')}"}
+        })
+    except Exception as e:
+        logger.error(f"Output fetch error: {str(e)}")
+        await connection_manager.send_message(websocket, {
+            "type": "error",
+            "payload": {"message": f"Output fetch failed: {str(e)}"}
+        })
+
+async def handle_command_completion(websocket: WebSocket, payload: Dict):
+    """Handle command prefix completion requests"""
+    try:
+        prefix = payload.get("prefix", "")
+        completions = command_engine.command_predictor.complete(prefix, int(payload.get("limit", 5)))
+
+        await connection_manager.send_message(websocket, {
+            "type": "command_completions",
+            "payload": {"prefix": prefix, "completions": completions}
+        })
+
+    except Exception as e:
+        logger.error(f"Command completion error: {str(e)}")
+        await connection_manager.send_message(websocket, {
+            "type": "error",
+            "payload": {"message": f"Command completion failed: {str(e)}"}
+        })
+
+async def handle_command_history(websocket: WebSocket, payload: Dict):
+    """Handle filtered command history queries"""
+    try:
+        page = await command_engine.query_command_history(
+            limit=int(payload.get("limit", 50)),
+            cursor=payload.get("cursor"),
+            tool=payload.get("tool"),
+            success=payload.get("success"),
+            since=payload.get("since"),
+            until=payload.get("until"),
+            search=payload.get("search")
+        )
+
+        await connection_manager.send_message(websocket, {
+            "type": "command_history",
+            "payload": page
+        })
+
+    except Exception as e:
+        logger.error(f"Command history query error: {str(e)}")
+        await connection_manager.send_message(websocket, {
+            "type": "error",
+            "payload": {"message": f"Command history query failed: {str(e)}"}
+        })
+
+async def handle_session_reset(websocket: WebSocket, payload: Dict):
+    """Handle requests to replace this client's persistent shell with a fresh one"""
+    try:
+        session = await command_engine.reset_session(connection_manager.client_id(websocket))
+
+        await connection_manager.send_message(websocket, {
+            "type": "session_reset",
+            "payload": session
+        })
+
+    except Exception as e:
+        logger.error(f"Shell session reset error: {str(e)}")
+        await connection_manager.send_message(websocket, {
+            "type": "error",
+            "payload": {"message": f"Shell session reset failed: {str(e)}"}
+        })
+
+async def handle_subscribe(websocket: WebSocket, payload: Dict):
+    """Handle subscriptions to pushed updates (system.metrics, scan.<id>, workflow.<id>)"""
+    try:
+        max_rate = payload.get("max_rate")
+        subscription = topic_hub.subscribe(
+            websocket,
+            str(payload.get("topic", "")),
+            float(max_rate) if max_rate is not None else None
+        )
+
+        await connection_manager.send_message(websocket, {
+            "type": "subscribed",
+            "payload": subscription
+        })
+
+    except Exception as e:
+        logger.error(f"Subscribe error: {str(e)}")
+        await connection_manager.send_message(websocket, {
+            "type": "error",
+            "payload": {"message": f"Subscribe failed: {str(e)}"}
+        })
+
+async def handle_unsubscribe(websocket: WebSocket, payload: Dict):
+    """Handle unsubscribing from one topic, or from all of them when no topic is given"""
+    try:
+        topics = topic_hub.unsubscribe(websocket, payload.get("topic"))
+
+        await connection_manager.send_message(websocket, {
+            "type": "unsubscribed",
+            "payload": {"topics": topics}
+        })
+
+    except Exception as e:
+        logger.error(f"Unsubscribe error: {str(e)}")
+        await connection_manager.send_message(websocket, {
+            "type": "error",
+            "payload": {"message": f"Unsubscribe failed: {str(e)}"}
+        })
+
+async def handle_resync(websocket: WebSocket, payload: Dict):
+    """Handle requests for a fresh snapshot of a subscribed topic after a missed update"""
+    try:
+        topic = str(payload.get("topic", ""))
+        if not topic_hub.resync(websocket, topic):
+            raise ValueError(f"Not subscribed to {topic}")
+
+    except Exception as e:
+        logger.error(f"Resync error: {str(e)}")
+        await connection_manager.send_message(websocket, {
+            "type": "error",
+            "payload": {"message": f"Resync failed: {str(e)}"}
+        })
+
+MESSAGE_HANDLERS = {
+    "execute_command": handle_command_execution,
+    "ai_query": handle_ai_query,
+    "scan_target": handle_target_scan,
+    "get_system_status": handle_system_status,
+    "tool_operation": handle_tool_operation,
+    "natural_language_request": handle_natural_language_request,
+    "workflow_status": handle_workflow_status,
+    "fetch_output": handle_fetch_output,
+    "complete_command": handle_command_completion,
+    "command_history": handle_command_history,
+    "reset_session": handle_session_reset,
+    "subscribe": handle_subscribe,
+    "unsubscribe": handle_unsubscribe,
+    "resync": handle_resync,
+}
+
 @app.get("/api/targets")
 async def get_targets():
     """Get list of targets"""
@@ -339,6 +659,69 @@ async def get_available_tools():
     """Get list of available security tools"""
     return await security_tools.get_available_tools()
 
+@app.get("/api/ai/cache")
+async def get_ai_cache_stats():
+    """Get AI response cache hit/miss statistics"""
+    return response_cache.stats() if response_cache else {"enabled": False}
+
+@app.get("/api/outputs/{handle}")
+async def get_command_output(handle: str, stream: str = "stdout", start: int = 0, count: Optional[int] = None):
+    """Get a line range of a command output that was spilled to disk"""
+    try:
+        return await output_store.read_lines(handle, stream, start, count)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown output handle or stream: {handle}/{stream}")
+
+@app.get("/api/commands/complete")
+async def complete_command(prefix: str = "", limit: int = 5):
+    """Get the most used past commands starting with a prefix"""
+    return {"prefix": prefix, "completions": command_engine.command_predictor.complete(prefix, limit)}
+
+@app.get("/api/commands/history")
+async def get_command_history(limit: int = 50, cursor: Optional[int] = None, tool: Optional[str] = None,
+                              success: Optional[bool] = None, since: Optional[str] = None,
+                              until: Optional[str] = None, search: Optional[str] = None):
+    """Get executed commands, newest first; pass next_cursor back as cursor for the next page"""
+    try:
+        return await command_engine.query_command_history(
+            limit=limit, cursor=cursor, tool=tool, success=success, since=since, until=until, search=search
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid history filter: {str(e)}")
+
+@app.get("/api/processes")
+async def get_processes(limit: int = 20):
+    """Get the busiest processes from the cached process table"""
+    return {
+        "processes": await command_engine.get_active_processes(limit),
+        "sampler": process_sampler.status()
+    }
+
+@app.get("/api/commands/cache")
+async def get_command_cache_stats():
+    """Get command result cache hit/miss statistics"""
+    return command_cache.stats()
+
+@app.get("/api/sessions")
+async def get_shell_sessions():
+    """Get persistent shell session status per connected client"""
+    return shell_sessions.status()
+
+@app.get("/api/commands/resources")
+async def get_command_resources():
+    """Get the command resource limits and CPU/memory/IO usage aggregated per tool"""
+    return {"limits": resource_limits.to_dict(), "tools": resource_stats.summary()}
+
+@app.get("/api/connections")
+async def get_connections():
+    """Get WebSocket clients (queue depth, drops, idle time), compression ratios and topic subscriptions"""
+    return {**connection_manager.status(), "topics": topic_hub.status()}
+
+@app.get("/api/commands/queue")
+async def get_command_queue():
+    """Get command admission control status (running, queued, rejected)"""
+    return process_supervisor.status()
+
 @app.get("/api/system/stats")
 async def get_system_stats():
     """Get system statistics"""
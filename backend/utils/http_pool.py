@@ -0,0 +1,86 @@
+import asyncio
+import os
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import aiohttp
+
+class HTTPSessionPool:
+    """Shared keep-alive aiohttp sessions, one per upstream origin
+
+    Every AI provider and integration posting to the same scheme://host:port
+    reuses one connection pool, so DNS lookups, TCP handshakes and TLS
+    negotiation are paid once rather than on every request.
+
+    Requests are bounded by ``connect_timeout`` to connect and
+    ``read_timeout`` between reads, and ordinary requests by
+    ``request_timeout`` overall. Streaming responses have no overall limit
+    (pass ``stream_timeout``), so a long completion is not cut off while
+    it is still arriving.
+    """
+
+    def __init__(self,
+                 limit: Optional[int] = None,
+                 limit_per_host: Optional[int] = None,
+                 dns_cache_ttl: Optional[int] = None,
+                 keepalive_timeout: Optional[float] = None,
+                 request_timeout: Optional[float] = None,
+                 connect_timeout: Optional[float] = None,
+                 read_timeout: Optional[float] = None):
+        self.limit = limit or int(os.getenv("HTTP_POOL_LIMIT", "100"))
+        self.limit_per_host = limit_per_host or int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", "20"))
+        self.dns_cache_ttl = dns_cache_ttl or int(os.getenv("HTTP_DNS_CACHE_TTL", "300"))
+        self.keepalive_timeout = keepalive_timeout or float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "60"))
+        self.request_timeout = request_timeout or float(os.getenv("HTTP_REQUEST_TIMEOUT", "300"))
+        self.connect_timeout = connect_timeout or float(os.getenv("HTTP_CONNECT_TIMEOUT", "30"))
+        self.read_timeout = read_timeout or float(os.getenv("HTTP_READ_TIMEOUT", "120"))
+        self._sessions: Dict[str, Tuple[aiohttp.ClientSession, asyncio.AbstractEventLoop]] = {}
+
+    @property
+    def stream_timeout(self) -> aiohttp.ClientTimeout:
+        """Per-request timeout for streaming responses: no overall limit, only the socket ones"""
+        return aiohttp.ClientTimeout(total=None, sock_connect=self.connect_timeout, sock_read=self.read_timeout)
+
+    @staticmethod
+    def _origin(base_url: str) -> str:
+        parts = urlsplit(base_url)
+        return f"{parts.scheme}://{parts.netloc}"
+
+    def get_session(self, base_url: str) -> aiohttp.ClientSession:
+        """Return the pooled session for ``base_url``'s origin, creating it on first use"""
+        origin = self._origin(base_url)
+        loop = asyncio.get_running_loop()
+        entry = self._sessions.get(origin)
+        if entry is not None:
+            session, session_loop = entry
+            # Sessions are bound to the loop that created them
+            if not session.closed and session_loop is loop:
+                return session
+
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            ttl_dns_cache=self.dns_cache_ttl,
+            keepalive_timeout=self.keepalive_timeout
+        )
+        session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(
+                total=self.request_timeout,
+                sock_connect=self.connect_timeout,
+                sock_read=self.read_timeout
+            )
+        )
+        self._sessions[origin] = (session, loop)
+        return session
+
+    async def close(self):
+        """Close every pooled session (call on application shutdown)"""
+        sessions = [session for session, _ in self._sessions.values()]
+        self._sessions.clear()
+        for session in sessions:
+            if not session.closed:
+                await session.close()
+
+# Process-wide pool shared by all providers
+http_pool = HTTPSessionPool()
@@ -1,20 +1,648 @@
-from fastapi import WebSocket
-from typing import List
+import asyncio
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+from fastapi import WebSocket, WebSocketDisconnect
+from typing import Any, Coroutine, Deque, Dict, List, Optional, Tuple, Union
+from utils.compression import FrameCompressor
+from utils.delta import DeltaStream
+from utils.wire_protocol import JSON_CODEC, negotiate
+
+# An encoded outbound message: text for JSON, bytes for MessagePack
+Frame = Union[str, bytes]
+
+logger = logging.getLogger(__name__)
+
+# Request id of the inbound message currently being handled; echoed on every reply
+current_request_id: ContextVar[Optional[str]] = ContextVar("current_request_id", default=None)
+
+# Outbound message class per message type; unlisted types are "result"
+MESSAGE_CLASSES = {
+    "system_status": "metrics",
+    "system_metrics": "metrics",
+    "ping": "control",
+}
+
+# What to do when a client's send queue is full, per message class:
+# "drop_oldest" evicts the oldest queued message of that class (or the new
+# one, if none is queued); "block" waits for room, up to the block timeout.
+DEFAULT_OVERFLOW_POLICIES = {
+    "metrics": "drop_oldest",
+    "control": "drop_oldest",
+    "result": "block",
+}
+
+def encode_message(message: dict) -> str:
+    """JSON text frame, encoded the way Starlette's send_json does"""
+    return JSON_CODEC.encode(message)
+
+class ClientConnection:
+    """One client's bounded outbound queue, drained by its own writer task
+
+    Producers only append pre-encoded frames to the queue, so a slow or dead
+    peer delays nobody but itself; the writer is the only task that touches
+    the socket, which also keeps frames from interleaving. For clients that
+    negotiated compression, the writer also compresses large frames, so
+    producers never wait for that either.
+    """
+
+    def __init__(self, manager: "ConnectionManager", websocket: WebSocket, client_id: str,
+                 codec=JSON_CODEC, compression: bool = False):
+        self.manager = manager
+        self.websocket = websocket
+        self.client_id = client_id
+        self.codec = codec  # wire encoding negotiated at connect time
+        self.compression = compression
+        self.queue: Deque[Tuple[str, Frame, Optional[str]]] = deque()  # (message class, frame, message type)
+        self.class_counts: Dict[str, int] = {}
+        self.connected_at = time.time()
+        self.last_seen = time.monotonic()
+        self.closed = False
+        self._timed_out = False
+        self.stats = {"sent": 0, "dropped": 0, "blocked": 0}
+        self._ready = asyncio.Event()
+        self._space = asyncio.Event()
+        self._writer = asyncio.create_task(self._write_loop())
+
+    def try_put(self, message_class: str, frame: Frame, message_type: Optional[str] = None) -> Optional[bool]:
+        """Enqueue without waiting: True if queued, False if dropped, None if the caller must block"""
+        if self.closed:
+            return False
+        if len(self.queue) >= self.manager.queue_size:
+            if self.manager.policy(message_class) != "drop_oldest":
+                return None
+            if not self._drop_oldest(message_class):
+                self.stats["dropped"] += 1
+                return False
+        self._append(message_class, frame, message_type)
+        return True
+
+    async def put(self, message_class: str, frame: Frame, message_type: Optional[str] = None) -> bool:
+        """Enqueue, waiting for room if the message's class blocks on overflow
+
+        A client that stays full for ``block_timeout`` is treated as dead and
+        disconnected.
+        """
+        queued = self.try_put(message_class, frame, message_type)
+        if queued is not None:
+            return queued
+        self.stats["blocked"] += 1
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.manager.block_timeout
+        while len(self.queue) >= self.manager.queue_size and not self.closed:
+            self._space.clear()
+            try:
+                await asyncio.wait_for(self._space.wait(), max(deadline - loop.time(), 0))
+            except asyncio.TimeoutError:
+                await self.close("send queue stalled")
+                return False
+        if self.closed:
+            return False
+        self._append(message_class, frame, message_type)
+        return True
+
+    def _append(self, message_class: str, frame: Frame, message_type: Optional[str]):
+        self.queue.append((message_class, frame, message_type))
+        self.class_counts[message_class] = self.class_counts.get(message_class, 0) + 1
+        self._ready.set()
+
+    def _drop_oldest(self, message_class: str) -> bool:
+        """Evict the oldest queued message of ``message_class``, else of any drop-oldest class"""
+        victim = None
+        if self.class_counts.get(message_class):
+            victim = next(index for index, (queued, _, _) in enumerate(self.queue) if queued == message_class)
+        else:
+            for index, (queued, _, _) in enumerate(self.queue):
+                if self.manager.policy(queued) == "drop_oldest":
+                    victim = index
+                    break
+        if victim is None:
+            return False
+        dropped_class = self.queue[victim][0]
+        del self.queue[victim]
+        self.class_counts[dropped_class] -= 1
+        self.stats["dropped"] += 1
+        return True
+
+    async def _write_loop(self):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                while not self.queue:
+                    self._ready.clear()
+                    await self._ready.wait()
+                message_class, frame, message_type = self.queue.popleft()
+                self.class_counts[message_class] -= 1
+                self._space.set()
+                if self.compression:
+                    frame = await self.manager.compressor.compress(frame, message_type) or frame
+                # A timer rather than wait_for, which would start a task per frame
+                watchdog = loop.call_later(self.manager.send_timeout, self._send_timed_out)
+                try:
+                    if isinstance(frame, bytes):
+                        await self.websocket.send_bytes(frame)
+                    else:
+                        await self.websocket.send_text(frame)
+                finally:
+                    watchdog.cancel()
+                self.stats["sent"] += 1
+        except asyncio.CancelledError:
+            if not self._timed_out:
+                raise
+            reason = f"send timed out after {self.manager.send_timeout}s"
+        except Exception as e:
+            reason = f"send failed: {str(e) or type(e).__name__}"
+        # Closing cancels the writer, so hand it to a separate task
+        asyncio.create_task(self.close(reason))
+
+    def _send_timed_out(self):
+        self._timed_out = True
+        self._writer.cancel()
+
+    async def close(self, reason: str = "closed", quiet: bool = False, code: int = 1011):
+        """Stop writing and drop the connection (idempotent)"""
+        if self.closed:
+            return
+        self.closed = True
+        self._space.set()  # wake blocked producers
+        self.manager._forget(self)
+        if asyncio.current_task() is not self._writer:
+            self._writer.cancel()
+        if reason != "disconnected":
+            if not quiet:
+                logger.warning(f"Closing WebSocket client {self.client_id}: {reason}")
+            try:
+                await asyncio.wait_for(self.websocket.close(code=code, reason=reason[:120]), self.manager.send_timeout)
+            except Exception:
+                pass
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "protocol": self.codec.name,
+            "compression": self.compression,
+            "queue_depth": len(self.queue),
+            "idle": time.monotonic() - self.last_seen,
+            "connected_at": self.connected_at
+        }
 
 class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
+    """Tracks WebSocket clients and delivers outbound messages through per-client queues
+
+    Every client gets a bounded queue (``WS_SEND_QUEUE_SIZE``) and a writer
+    task. What happens when a queue is full depends on the message's class
+    (``MESSAGE_CLASSES``): metrics drop their oldest queued message, command
+    results and everything else wait for room. ``broadcast`` encodes a
+    message once and enqueues it for every client without waiting on any of
+    them, except for clients whose full queue must block, which are waited
+    on concurrently. A heartbeat pings every client and disconnects those
+    that have not sent anything (a message or a ``pong``) for
+    ``WS_HEARTBEAT_TIMEOUT`` seconds. Large frames to clients that opted in
+    are compressed by ``compressor``.
+    """
+
+    def __init__(self,
+                 queue_size: Optional[int] = None,
+                 send_timeout: Optional[float] = None,
+                 block_timeout: Optional[float] = None,
+                 heartbeat_interval: Optional[float] = None,
+                 heartbeat_timeout: Optional[float] = None,
+                 overflow_policies: Optional[Dict[str, str]] = None,
+                 compressor: Optional[FrameCompressor] = None):
+        self.queue_size = queue_size or int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))
+        self.send_timeout = send_timeout or float(os.getenv("WS_SEND_TIMEOUT", "10"))
+        self.block_timeout = block_timeout or float(os.getenv("WS_BLOCK_TIMEOUT", "30"))
+        self.heartbeat_interval = heartbeat_interval or float(os.getenv("WS_HEARTBEAT_INTERVAL", "20"))
+        self.heartbeat_timeout = heartbeat_timeout or float(os.getenv("WS_HEARTBEAT_TIMEOUT", "60"))
+        self.overflow_policies = {**DEFAULT_OVERFLOW_POLICIES, **self._load_policies(), **(overflow_policies or {})}
+        self.compressor = compressor or FrameCompressor()
+        self.clients: Dict[WebSocket, ClientConnection] = {}
+        self._heartbeat: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _load_policies() -> Dict[str, str]:
+        """Overrides from WS_OVERFLOW_POLICY, e.g. ``"metrics=drop_oldest,result=block"``"""
+        policies = {}
+        for item in filter(None, (part.strip() for part in os.getenv("WS_OVERFLOW_POLICY", "").split(","))):
+            message_class, _, policy = item.partition("=")
+            if policy in ("drop_oldest", "block"):
+                policies[message_class.strip()] = policy
+        return policies
+
+    @property
+    def active_connections(self) -> List[WebSocket]:
+        return list(self.clients)
+
+    def policy(self, message_class: str) -> str:
+        return self.overflow_policies.get(message_class, "block")
 
     async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
+        """Accept a client, agreeing on its wire encoding through the WebSocket subprotocol
+
+        Clients offering ``kali.msgpack`` (when msgpack is installed) get
+        MessagePack binary frames; ``kali.json`` or no subprotocol at all
+        means JSON text frames. A ``+deflate`` suffix (``kali.json+deflate``)
+        opts in to compression: large frames are then sent as binary frames
+        of ``COMPRESSED_FRAME_PREFIX`` followed by a zlib stream.
+        """
+        negotiated = negotiate(getattr(websocket, "scope", {}).get("subprotocols", []))
+        subprotocol, codec, compression = negotiated or (None, JSON_CODEC, False)
+        await websocket.accept(subprotocol=subprotocol)
+        self.clients[websocket] = ClientConnection(self, websocket, uuid.uuid4().hex, codec, compression)
+        if self._heartbeat is None or self._heartbeat.done():
+            self._heartbeat = asyncio.create_task(self._heartbeat_loop())
 
     def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+        """Forget a client whose socket is gone; safe to call more than once"""
+        client = self.clients.get(websocket)
+        if client is not None:
+            asyncio.create_task(client.close("disconnected"))
+
+    def _forget(self, client: ClientConnection):
+        if self.clients.get(client.websocket) is client:
+            del self.clients[client.websocket]
+
+    def client_id(self, websocket: WebSocket) -> Optional[str]:
+        """Stable id of a connected client, used to key its per-connection state"""
+        client = self.clients.get(websocket)
+        return client.client_id if client else None
+
+    def codec(self, websocket: WebSocket):
+        client = self.clients.get(websocket)
+        return client.codec if client else None
+
+    async def receive(self, websocket: WebSocket) -> Any:
+        """Next inbound message, decoded with the client's codec (text frames are always JSON)"""
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", 1000))
+        self.touch(websocket)
+        data = message.get("bytes")
+        if data is None:
+            return JSON_CODEC.decode(message.get("text") or "")
+        return (self.codec(websocket) or JSON_CODEC).decode(data)
+
+    def touch(self, websocket: WebSocket):
+        """Record inbound activity (any message, including ``pong``) for the heartbeat"""
+        client = self.clients.get(websocket)
+        if client is not None:
+            client.last_seen = time.monotonic()
 
     async def send_message(self, websocket: WebSocket, message: dict):
-        await websocket.send_json(message)
+        request_id = current_request_id.get()
+        if request_id is not None and "request_id" not in message:
+            message = {**message, "request_id": request_id}
+        client = self.clients.get(websocket)
+        if client is None:
+            return  # disconnected or reaped; handlers may still be finishing up
+        message_type = message.get("type")
+        await client.put(MESSAGE_CLASSES.get(message_type, "result"), client.codec.encode(message), message_type)
+
+    def post(self, websocket: WebSocket, message_class: str, frame: Frame, message_type: Optional[str] = None) -> bool:
+        """Enqueue a pre-encoded frame without waiting; False if the client is gone
+
+        If the frame's class blocks and the queue is full, the wait happens in
+        a task of its own.
+        """
+        client = self.clients.get(websocket)
+        if client is None:
+            return False
+        if client.try_put(message_class, frame, message_type) is None:
+            asyncio.create_task(client.put(message_class, frame, message_type))
+        return True
 
     async def broadcast(self, message: dict):
-        for connection in self.active_connections:
-            await connection.send_json(message)
+        message_type = message.get("type")
+        message_class = MESSAGE_CLASSES.get(message_type, "result")
+        frames: Dict[str, Frame] = {}  # encoded once per codec
+        blocked = []
+        for client in list(self.clients.values()):
+            frame = frames.get(client.codec.name)
+            if frame is None:
+                frame = frames[client.codec.name] = client.codec.encode(message)
+            if client.try_put(message_class, frame, message_type) is None:
+                blocked.append((client, frame))
+        if blocked:
+            await asyncio.gather(*(client.put(message_class, frame, message_type) for client, frame in blocked))
+
+    async def _heartbeat_loop(self):
+        while self.clients:
+            await asyncio.sleep(self.heartbeat_interval)
+            now = time.monotonic()
+            ping = {"type": "ping", "payload": {"timestamp": time.time()}}
+            for client in list(self.clients.values()):
+                if now - client.last_seen > self.heartbeat_timeout:
+                    await client.close(f"no activity for {now - client.last_seen:.0f}s")
+                else:
+                    client.try_put("control", client.codec.encode(ping))
+
+    async def close(self):
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+        if self.clients:
+            logger.info(f"Closing {len(self.clients)} WebSocket clients")
+        await asyncio.gather(*(client.close("server shutting down", quiet=True, code=1001) for client in list(self.clients.values())))
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "clients": len(self.clients),
+            "queue_size": self.queue_size,
+            "overflow_policies": dict(self.overflow_policies),
+            "compression": self.compressor.status(),
+            "connections": {client.client_id: client.status() for client in self.clients.values()}
+        }
+
+class Subscription:
+    """One client's subscription to one topic, optionally rate limited"""
+
+    def __init__(self, websocket: WebSocket, topic: str, max_rate: Optional[float]):
+        self.websocket = websocket
+        self.topic = topic
+        self.max_rate = max_rate
+        self.min_interval = 1.0 / max_rate if max_rate else 0.0
+        self.version: Optional[int] = None  # topic version the client holds
+        self.last_sent = 0.0
+        self.pending = False  # an update is being held back by the rate limit
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.delivered = 0
+        self.coalesced = 0
+        self.active = True
+
+    def cancel(self):
+        self.active = False
+        self.pending = False
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+class Topic:
+    """Versioned state of one topic and the frames that bring subscribers up to date"""
+
+    def __init__(self, name: str, message_type: str, keyframe_interval: Optional[int] = None):
+        self.name = name
+        self.message_type = message_type
+        self.message_class = MESSAGE_CLASSES.get(message_type, "result")
+        self.stream = DeltaStream(keyframe_interval)
+        self.subscribers: Dict[WebSocket, Subscription] = {}
+        self.last_published = 0.0
+        self.pending: Optional[Dict[str, Any]] = None  # latest update inside the coalescing window
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self._frames: Dict[Tuple[str, Optional[int]], Frame] = {}  # (codec, base version) -> frame for the current version
+
+    def update(self, payload: Dict[str, Any]) -> bool:
+        if not self.stream.update(payload):
+            return False
+        self._frames.clear()
+        return True
+
+    def frame(self, base: Optional[int], codec=JSON_CODEC) -> Frame:
+        """Encoded frame from ``base`` to the current version, shared by every subscriber at ``base``"""
+        frame = self._frames.get((codec.name, base))
+        if frame is None:
+            frame = self._frames[(codec.name, base)] = codec.encode({
+                "type": self.message_type, "topic": self.name, **self.stream.frame(base)
+            })
+        return frame
+
+class TopicHub:
+    """Publish/subscribe fan-out of live updates over the WebSocket connections
+
+    Producers publish each update once. Updates are sent change-only (see
+    ``DeltaStream``): a subscriber first gets the topic's full ``snapshot``,
+    then only the keys that changed against the ``version`` it holds. Every
+    subscriber at the same version shares one encoded frame, so the cost of
+    an update does not grow with the number of viewers. Updates that do not
+    change anything are not sent at all, and updates published within
+    ``coalesce_window`` seconds of the previous one are merged into a single
+    frame carrying the latest state.
+
+    A subscriber may also ask for at most ``max_rate`` updates per second;
+    it then gets one frame spanning everything that changed in between, so
+    the final state of a scan or workflow is never lost. A client that
+    missed a frame (its version is not the frame's ``base``) sends
+    ``resync`` to get a fresh snapshot. The latest state of each topic is
+    retained for new subscribers.
+
+    Topics are ``system.metrics``, ``scan.<scan id>`` and ``workflow.<run id>``.
+    """
+
+    # Topic prefix -> outbound message type
+    TOPIC_TYPES = {
+        "system.metrics": "system_metrics",
+        "scan.": "scan_update",
+        "workflow.": "workflow_update",
+    }
+
+    def __init__(self, manager: ConnectionManager,
+                 max_subscriptions: Optional[int] = None,
+                 max_retained: Optional[int] = None,
+                 coalesce_window: Optional[float] = None):
+        self.manager = manager
+        self.max_subscriptions = max_subscriptions or int(os.getenv("WS_MAX_SUBSCRIPTIONS", "64"))
+        self.max_retained = max_retained or int(os.getenv("WS_MAX_RETAINED_TOPICS", "512"))
+        self.coalesce_window = coalesce_window if coalesce_window is not None else float(
+            os.getenv("WS_COALESCE_WINDOW", "0.1")
+        )
+        self.topics: "OrderedDict[str, Topic]" = OrderedDict()
+        self.by_client: Dict[WebSocket, Dict[str, Subscription]] = {}
+        self.counters = {"published": 0, "unchanged": 0, "coalesced": 0, "delivered": 0, "bytes_sent": 0}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @classmethod
+    def message_type(cls, topic: str) -> Optional[str]:
+        for prefix, message_type in cls.TOPIC_TYPES.items():
+            if topic == prefix or (prefix.endswith(".") and topic.startswith(prefix) and len(topic) > len(prefix)):
+                return message_type
+        return None
+
+    def _topic(self, name: str) -> Topic:
+        topic = self.topics.get(name)
+        if topic is None:
+            topic = self.topics[name] = Topic(name, self.message_type(name))
+            # Forget the least recently published topics nobody is watching
+            idle = [other for other, state in self.topics.items() if not state.subscribers]
+            for other in idle[:max(len(self.topics) - self.max_retained, 0)]:
+                self._discard(self.topics.pop(other))
+        return topic
+
+    @staticmethod
+    def _discard(topic: Topic):
+        if topic.timer is not None:
+            topic.timer.cancel()
+
+    def subscribe(self, websocket: WebSocket, topic: str, max_rate: Optional[float] = None) -> Dict[str, Any]:
+        """Subscribe (or change the rate of an existing subscription); raises ValueError on bad input"""
+        if self.message_type(topic) is None:
+            raise ValueError(f"Unknown topic: {topic}")
+        if max_rate is not None and max_rate <= 0:
+            raise ValueError("max_rate must be positive")
+        subscriptions = self.by_client.setdefault(websocket, {})
+        if topic not in subscriptions and len(subscriptions) >= self.max_subscriptions:
+            raise ValueError(f"Too many subscriptions (limit {self.max_subscriptions})")
+        previous = subscriptions.get(topic)
+        if previous is not None:
+            previous.cancel()
+        state = self._topic(topic)
+        subscription = subscriptions[topic] = state.subscribers[websocket] = Subscription(websocket, topic, max_rate)
+        if state.stream.state is not None:
+            # After the caller has had a chance to acknowledge the subscription
+            asyncio.get_running_loop().call_soon(self._deliver, subscription)
+        return {"topic": topic, "max_rate": max_rate, "version": state.stream.version or None}
+
+    def resync(self, websocket: WebSocket, topic: str) -> bool:
+        """Send a client a fresh snapshot of a topic it is subscribed to"""
+        subscription = self.by_client.get(websocket, {}).get(topic)
+        if subscription is None:
+            return False
+        subscription.version = None
+        self._deliver(subscription)
+        return True
+
+    def unsubscribe(self, websocket: WebSocket, topic: Optional[str] = None) -> List[str]:
+        """Drop one subscription, or all of a client's; returns the topics dropped"""
+        subscriptions = self.by_client.get(websocket, {})
+        topics = [topic] if topic is not None else list(subscriptions)
+        dropped = []
+        for name in topics:
+            subscription = subscriptions.pop(name, None)
+            if subscription is None:
+                continue
+            subscription.cancel()
+            state = self.topics.get(name)
+            if state is not None:
+                state.subscribers.pop(websocket, None)
+            dropped.append(name)
+        if not subscriptions:
+            self.by_client.pop(websocket, None)
+        return dropped
+
+    def publish(self, topic: str, payload: Dict[str, Any]):
+        """Record a topic's new state and push it to subscribers (event loop thread only)
+
+        ``payload`` is kept as the topic's state and must not be mutated
+        afterwards.
+        """
+        state = self._topic(topic)
+        self.topics.move_to_end(topic)
+        wait = state.last_published + self.coalesce_window - time.monotonic()
+        if wait > 0:
+            if state.pending is not None:
+                self.counters["coalesced"] += 1
+            state.pending = payload
+            if state.timer is None:
+                state.timer = asyncio.get_running_loop().call_later(wait, self._flush_topic, state)
+            return
+        self._commit(state, payload)
+
+    def _flush_topic(self, state: Topic):
+        state.timer = None
+        payload, state.pending = state.pending, None
+        if payload is not None:
+            self._commit(state, payload)
+
+    def _commit(self, state: Topic, payload: Dict[str, Any]):
+        state.last_published = time.monotonic()
+        if not state.update(payload):
+            self.counters["unchanged"] += 1
+            return
+        self.counters["published"] += 1
+        for subscription in list(state.subscribers.values()):
+            self._deliver(subscription)
+
+    def publish_threadsafe(self, topic: str, payload: Dict[str, Any]):
+        """``publish`` from a producer thread, such as the system monitor's sampler"""
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self.publish, topic, payload)
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        """Event loop that ``publish_threadsafe`` hands updates to"""
+        self._loop = loop
+
+    def _deliver(self, subscription: Subscription):
+        """Bring one subscriber up to the topic's current version, within its rate limit"""
+        state = self.topics.get(subscription.topic)
+        if not subscription.active or state is None or subscription.version == state.stream.version:
+            return
+        now = time.monotonic()
+        wait = subscription.last_sent + subscription.min_interval - now
+        if wait > 0:
+            if subscription.pending:
+                subscription.coalesced += 1
+                self.counters["coalesced"] += 1
+            subscription.pending = True
+            if subscription.timer is None:
+                subscription.timer = asyncio.get_running_loop().call_later(wait, self._flush, subscription)
+            return
+        codec = self.manager.codec(subscription.websocket)
+        if codec is None:
+            self.unsubscribe(subscription.websocket)  # the client is gone
+            return
+        frame = state.frame(subscription.version, codec)
+        if not self.manager.post(subscription.websocket, state.message_class, frame, state.message_type):
+            self.unsubscribe(subscription.websocket)  # the client is gone
+            return
+        subscription.version = state.stream.version
+        subscription.last_sent = now
+        subscription.delivered += 1
+        self.counters["delivered"] += 1
+        self.counters["bytes_sent"] += len(frame)
+
+    def _flush(self, subscription: Subscription):
+        subscription.timer = None
+        if subscription.pending:
+            subscription.pending = False
+            self._deliver(subscription)
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "topics": {name: {"subscribers": len(state.subscribers), "version": state.stream.version}
+                       for name, state in self.topics.items() if state.subscribers},
+            "subscribers": len(self.by_client),
+            "retained": len(self.topics)
+        }
+
+class RequestDispatcher:
+    """Runs one connection's inbound messages as concurrent, cancellable tasks"""
+
+    def __init__(self, max_in_flight: int = 16):
+        self.max_in_flight = max_in_flight
+        self.tasks: Dict[str, asyncio.Task] = {}
+
+    @property
+    def in_flight(self) -> int:
+        return len(self.tasks)
+
+    @staticmethod
+    def new_request_id() -> str:
+        return str(uuid.uuid4())
+
+    def submit(self, request_id: str, handler: Coroutine) -> bool:
+        """Schedule a handler coroutine; returns False if the in-flight cap is reached"""
+        if request_id in self.tasks or self.in_flight >= self.max_in_flight:
+            handler.close()
+            return False
+        task = asyncio.create_task(self._run(request_id, handler))
+        self.tasks[request_id] = task
+        task.add_done_callback(lambda _: self.tasks.pop(request_id, None))
+        return True
+
+    async def _run(self, request_id: str, handler: Coroutine):
+        current_request_id.set(request_id)
+        await handler
+
+    def cancel(self, request_id: str) -> bool:
+        """Cancel a running request; returns False if it is unknown or already finished"""
+        task = self.tasks.get(request_id)
+        if task is None or task.done():
+            return False
+        task.cancel()
+        return True
+
+    def cancel_all(self):
+        for task in list(self.tasks.values()):
+            task.cancel()
@@ -0,0 +1,98 @@
+import dataclasses
+import json
+from datetime import date, datetime
+from enum import Enum
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+def _to_builtin(value: Any) -> Any:
+    """Fallback for values the encoders have no native mapping for"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    if dataclasses.is_dataclass(value) and not isinstance(value, type):
+        return dataclasses.asdict(value)
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return bytes(value).decode("utf-8", errors="replace")
+    raise TypeError(f"Object of type {type(value).__name__} is not serializable")
+
+class JSONCodec:
+    """JSON text frames, encoded with orjson when it is installed
+
+    Output matches the stdlib encoder Starlette's ``send_json`` uses
+    (compact separators, non-ASCII kept as is), so clients cannot tell the
+    difference. Anything orjson refuses (integers beyond 64 bits, say)
+    falls back to the stdlib encoder.
+    """
+
+    name = "kali.json"
+    binary = False
+
+    def encode(self, message: Dict[str, Any]) -> str:
+        if ORJSON_AVAILABLE:
+            try:
+                return orjson.dumps(message, default=_to_builtin, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+            except TypeError:
+                pass
+        return json.dumps(message, separators=(",", ":"), ensure_ascii=False, default=_to_builtin)
+
+    def decode(self, data: Union[str, bytes]) -> Any:
+        if ORJSON_AVAILABLE:
+            return orjson.loads(data)
+        return json.loads(data)
+
+class MessagePackCodec:
+    """MessagePack binary frames
+
+    Strings travel as length-prefixed UTF-8 with no escaping, so large
+    command outputs (newlines, quotes, ANSI escapes) cost a copy rather than
+    a character-by-character escape and unescape, and ``bytes`` values are
+    sent as raw binary instead of being decoded into text.
+    """
+
+    name = "kali.msgpack"
+    binary = True
+
+    def encode(self, message: Dict[str, Any]) -> bytes:
+        return msgpack.packb(message, use_bin_type=True, default=_to_builtin)
+
+    def decode(self, data: Union[str, bytes]) -> Any:
+        if isinstance(data, str):
+            return JSON_CODEC.decode(data)  # a text frame is always JSON
+        return msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+JSON_CODEC = JSONCodec()
+
+# Subprotocols the server can speak, in order of preference
+CODECS: Dict[str, Any] = {JSON_CODEC.name: JSON_CODEC}
+if MSGPACK_AVAILABLE:
+    CODECS = {MessagePackCodec.name: MessagePackCodec(), **CODECS}
+
+# Subprotocol suffix opting in to compression of large frames, e.g. "kali.json+deflate"
+COMPRESSION_SUFFIX = "+deflate"
+
+def negotiate(offered: List[str]) -> Optional[Tuple[str, Any, bool]]:
+    """``(subprotocol, codec, compression)`` for the first subprotocol offered that we support
+
+    ``offered`` is the client's ``Sec-WebSocket-Protocol`` list.
+    """
+    for name in (name.strip() for name in offered):
+        compression = name.endswith(COMPRESSION_SUFFIX)
+        codec = CODECS.get(name[:-len(COMPRESSION_SUFFIX)] if compression else name)
+        if codec is not None:
+            return name, codec, compression
+    return None
@@ -72,6 +72,11 @@ const TerminalComponent = ({ isAIActive }) => {
         ws.onmessage = (event) => {
           try {
             const message = JSON.parse(event.data);
+            if (message.type === 'ping') {
+              // Heartbeat: the backend drops clients that stay silent
+              ws.send(JSON.stringify({ type: 'pong' }));
+              return;
+            }
             handleWebSocketMessage(message);
           } catch (e) {
             console.error('Failed to parse WebSocket message:', e);